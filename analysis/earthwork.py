@@ -0,0 +1,173 @@
+"""Exact flat-pad earthwork solver built on sorted elevations and prefix sums.
+
+The masked elevations are sorted once.  With prefix sums over the sorted
+array, cut and fill for any target elevation ``t`` are::
+
+    k    = #cells with z <= t             (binary search)
+    fill = t * k - sum(z[:k])
+    cut  = sum(z[k:]) - t * (n - k)
+
+so each what-if query costs O(log n), and a whole volume-vs-elevation curve
+is one vectorized ``searchsorted``.
+
+Earthwork balance uses the config soil factors: one bank CY of cut yields
+``SOIL_SHRINK_FACTOR`` compacted CY of fill, and hauled surplus cut bulks up
+by ``SOIL_SWELL_FACTOR``.
+"""
+
+import logging
+from typing import Dict, Optional
+
+import numpy as np
+
+from config import config
+
+logger = logging.getLogger(__name__)
+
+M3_TO_CY = 1.30795  # 1 m³ ≈ 1.308 yd³
+FT_PER_M = 3.28084
+
+
+class PadElevationSolver:
+    """Answer cut/fill questions for a flat pad over a fixed set of cells."""
+
+    def __init__(
+        self,
+        elevations: np.ndarray,
+        cell_size: float = 1.0,
+        swell_factor: Optional[float] = None,
+        shrink_factor: Optional[float] = None,
+        vertical_units: str = "m",
+    ):
+        """
+        Args:
+            elevations: Elevations of the cells in the pad area (any shape; NaN ignored).
+            cell_size: Ground distance per pixel in metres.
+            swell_factor: Loose/bank ratio for hauled cut (default ``config.SOIL_SWELL_FACTOR``).
+            shrink_factor: Compacted-fill/bank-cut ratio (default ``config.SOIL_SHRINK_FACTOR``).
+            vertical_units: "m" or "ft"; used to apply the config depth limits (in feet).
+        """
+        z = np.asarray(elevations).ravel()
+        z = z[~np.isnan(z)] if np.issubdtype(z.dtype, np.floating) else z
+        if z.size == 0:
+            raise ValueError("No valid elevation data in the buildable area")
+
+        self.sorted = np.sort(z).astype(np.float64, copy=False)
+        self.prefix = np.concatenate(([0.0], np.cumsum(self.sorted)))
+        self.n = int(self.sorted.size)
+        self.total = float(self.prefix[-1])
+        self.cell_cy = (cell_size ** 2) * M3_TO_CY
+        self.swell = float(swell_factor if swell_factor is not None else config.SOIL_SWELL_FACTOR)
+        self.shrink = float(shrink_factor if shrink_factor is not None else config.SOIL_SHRINK_FACTOR)
+        self.ft_per_unit = FT_PER_M if vertical_units == "m" else 1.0
+
+    # ------------------------------------------------------------------
+    # Volumes
+    # ------------------------------------------------------------------
+
+    def volumes(self, target_elevation):
+        """Return (cut_cy, fill_cy) for a scalar or array of target elevations."""
+        t = np.asarray(target_elevation, dtype=np.float64)
+        k = np.searchsorted(self.sorted, t, side="right")
+        below = self.prefix[k]
+        fill = (t * k - below) * self.cell_cy
+        cut = ((self.total - below) - t * (self.n - k)) * self.cell_cy
+        return cut, fill
+
+    def evaluate(self, target_elevation: float) -> Dict[str, float]:
+        """Cut, fill and balance figures for one pad elevation."""
+        cut, fill = (float(v) for v in self.volumes(target_elevation))
+        net = cut * self.shrink - fill  # compacted CY surplus (+) or shortfall (-)
+        return {
+            "pad_elevation": float(target_elevation),
+            "cut_cy": round(cut, 1),
+            "fill_cy": round(fill, 1),
+            "net_cy": round(net, 1),
+            "export_cy": round(max(net, 0.0) / self.shrink * self.swell, 1),  # loose truck volume
+            "import_cy": round(max(-net, 0.0), 1),  # compacted fill to bring in
+            "max_cut_depth": round(max(float(self.sorted[-1]) - target_elevation, 0.0), 2),
+            "max_fill_depth": round(max(target_elevation - float(self.sorted[0]), 0.0), 2),
+        }
+
+    # ------------------------------------------------------------------
+    # Solvers
+    # ------------------------------------------------------------------
+
+    def min_earthwork_elevation(self) -> float:
+        """Elevation minimising cut + fill (the median)."""
+        return float(np.median(self.sorted))
+
+    def balanced_elevation(self) -> float:
+        """Elevation where shrunk cut exactly supplies the fill (net import/export = 0).
+
+        ``shrink * cut(t) - fill(t)`` is piecewise linear and decreasing, so
+        for each candidate count ``k`` of cells below the pad the root is
+        solved in closed form and the one lying inside its own interval is
+        returned.
+        """
+        k = np.arange(self.n + 1, dtype=np.float64)
+        p = self.prefix
+        t = (self.shrink * (self.total - p) + p) / (self.shrink * (self.n - k) + k)
+        lo = np.concatenate(([-np.inf], self.sorted))
+        hi = np.concatenate((self.sorted, [np.inf]))
+        ok = np.nonzero((t >= lo) & (t <= hi))[0]
+        return float(t[ok[0]]) if ok.size else float(np.median(self.sorted))
+
+    def depth_limits(self, max_cut_ft: Optional[float] = None, max_fill_ft: Optional[float] = None):
+        """Return the (low, high) pad elevations allowed by the cut/fill depth limits."""
+        max_cut = (max_cut_ft if max_cut_ft is not None else config.MAX_CUT_DEPTH_FT) / self.ft_per_unit
+        max_fill = (max_fill_ft if max_fill_ft is not None else config.MAX_FILL_DEPTH_FT) / self.ft_per_unit
+        return float(self.sorted[-1]) - max_cut, float(self.sorted[0]) + max_fill
+
+    def solve(
+        self,
+        mode: str = "balanced",
+        max_cut_ft: Optional[float] = None,
+        max_fill_ft: Optional[float] = None,
+    ) -> Dict[str, float]:
+        """Find the pad elevation for *mode* within the depth limits.
+
+        Args:
+            mode: "balanced" (net import/export = 0) or "min_earthwork" (median).
+            max_cut_ft: Maximum cut depth (default ``config.MAX_CUT_DEPTH_FT``).
+            max_fill_ft: Maximum fill depth (default ``config.MAX_FILL_DEPTH_FT``).
+
+        Returns:
+            :meth:`evaluate` output plus ``mode``, ``unconstrained_elevation``
+            and ``within_depth_limits``.  When the limits cannot both be met
+            the pad splits the violation evenly between them.
+        """
+        if mode == "balanced":
+            target = self.balanced_elevation()
+        elif mode == "min_earthwork":
+            target = self.min_earthwork_elevation()
+        else:
+            raise ValueError(f"Unknown pad solver mode: {mode}")
+
+        low, high = self.depth_limits(max_cut_ft, max_fill_ft)
+        feasible = low <= high
+        constrained = min(max(target, low), high) if feasible else (low + high) / 2.0
+
+        result = self.evaluate(constrained)
+        result.update({
+            "mode": mode,
+            "unconstrained_elevation": round(target, 3),
+            "within_depth_limits": bool(feasible),
+        })
+        logger.info(
+            "Pad solver (%s): %.2f (unconstrained %.2f), cut=%.1f CY, fill=%.1f CY, net=%.1f CY",
+            mode, constrained, target, result["cut_cy"], result["fill_cy"], result["net_cy"],
+        )
+        return result
+
+    def volume_curve(self, n_points: int = 50) -> Dict[str, list]:
+        """Cut, fill and net volume across the elevation range in one pass."""
+        elev = np.linspace(self.sorted[0], self.sorted[-1], max(2, int(n_points)))
+        cut, fill = self.volumes(elev)
+        net = cut * self.shrink - fill
+        return {
+            "elevation": np.round(elev, 3).tolist(),
+            "cut_cy": np.round(cut, 1).tolist(),
+            "fill_cy": np.round(fill, 1).tolist(),
+            "net_cy": np.round(net, 1).tolist(),
+        }
@@ -0,0 +1,193 @@
+"""Batched sloped-pad grading over a DEM.
+
+Each pad (building pad or lot) is a label in an integer raster.  For every
+pad a best-fit plane is solved by least squares over its cells, the plane's
+gradient is clamped to the allowed drainage range (at least
+``config.OPTIMAL_PAD_SLOPE``), and the plane is shifted vertically so shrunk
+cut balances fill on that pad.  All pads are processed together: per-pad
+sums come from ``np.bincount`` over the labelled cells, so grading 100 lots
+costs a handful of passes over the raster rather than 100 analyses.
+"""
+
+import logging
+from typing import Dict, Optional, Sequence
+
+import numpy as np
+
+from analysis.earthwork import M3_TO_CY
+from config import config
+
+logger = logging.getLogger(__name__)
+
+
+class PadGradingEngine:
+    """Fit drainage planes and compute earthwork for many pads at once."""
+
+    def __init__(
+        self,
+        elevation: np.ndarray,
+        cell_size: float = 1.0,
+        min_slope_pct: Optional[float] = None,
+        max_slope_pct: float = 8.0,
+        shrink_factor: Optional[float] = None,
+    ):
+        """
+        Args:
+            elevation: 2-D array of elevations (NaN = no data).
+            cell_size: Ground distance per pixel (same units as elevation).
+            min_slope_pct: Minimum pad slope for drainage (default ``config.OPTIMAL_PAD_SLOPE``).
+            max_slope_pct: Maximum pad slope; steeper best-fit planes are flattened to this.
+            shrink_factor: Compacted-fill/bank-cut ratio (default ``config.SOIL_SHRINK_FACTOR``).
+        """
+        self.elevation = elevation
+        self.cell_size = cell_size
+        self.min_slope = (min_slope_pct if min_slope_pct is not None else config.OPTIMAL_PAD_SLOPE) / 100.0
+        self.max_slope = max_slope_pct / 100.0
+        self.shrink = float(shrink_factor if shrink_factor is not None else config.SOIL_SHRINK_FACTOR)
+
+    def grade(self, labels: np.ndarray, balance: bool = True, iterations: int = 48) -> Dict:
+        """Grade every labelled pad.
+
+        Args:
+            labels: Integer raster, same shape as the DEM; 0 = not a pad.
+            balance: Shift each plane so shrunk cut equals fill on the pad.
+                When False the least-squares plane is used (raw cut = fill).
+            iterations: Bisection steps for the balancing shift.
+
+        Returns:
+            Dict with a ``pads`` list (one entry per pad id) and ``total`` earthwork.
+        """
+        if labels.shape != self.elevation.shape:
+            raise ValueError(f"labels shape {labels.shape} != elevation shape {self.elevation.shape}")
+
+        height, width = self.elevation.shape
+        lab = labels.ravel()
+        z_all = self.elevation.ravel()
+        idx = np.flatnonzero((lab > 0) & ~np.isnan(z_all))
+        if idx.size == 0:
+            raise ValueError("No valid elevation data inside any pad")
+
+        pad_ids, inv = np.unique(lab[idx], return_inverse=True)
+        n_pads = pad_ids.size
+        z = z_all[idx].astype(np.float64)
+        rows, cols = np.divmod(idx, width)
+        x = cols * float(self.cell_size)   # east
+        y = -rows * float(self.cell_size)  # north
+
+        def per_pad(weights: np.ndarray) -> np.ndarray:
+            return np.bincount(inv, weights=weights, minlength=n_pads)
+
+        n = np.bincount(inv, minlength=n_pads).astype(np.float64)
+        mx, my, mz = per_pad(x) / n, per_pad(y) / n, per_pad(z) / n
+        dx, dy, dz = x - mx[inv], y - my[inv], z - mz[inv]
+
+        # Normal equations for dz = a*dx + b*dy, solved for all pads at once
+        sxx, sxy, syy = per_pad(dx * dx), per_pad(dx * dy), per_pad(dy * dy)
+        sxz, syz = per_pad(dx * dz), per_pad(dy * dz)
+        det = sxx * syy - sxy ** 2
+        safe = det > 1e-12
+        a = np.where(safe, (sxz * syy - syz * sxy) / np.where(safe, det, 1.0), 0.0)
+        b = np.where(safe, (syz * sxx - sxz * sxy) / np.where(safe, det, 1.0), 0.0)
+
+        # Clamp the gradient magnitude into [min_slope, max_slope], keeping its direction
+        g = np.hypot(a, b)
+        target = np.clip(g, self.min_slope, self.max_slope)
+        flat = g < 1e-12
+        scale = np.where(flat, 0.0, target / np.where(flat, 1.0, g))
+        a, b = a * scale, b * scale
+        b = np.where(flat, target, b)  # no preferred direction: drain to the south
+
+        resid = dz - a[inv] * dx - b[inv] * dy  # existing minus design; + = cut
+        shift = np.zeros(n_pads)
+        if balance:
+            shift = self._balance_shift(resid, inv, n_pads, iterations)
+        resid -= shift[inv]
+
+        cell_cy = (self.cell_size ** 2) * M3_TO_CY
+        cut = per_pad(np.maximum(resid, 0.0)) * cell_cy
+        fill = per_pad(np.maximum(-resid, 0.0)) * cell_cy
+        max_cut = np.zeros(n_pads)
+        max_fill = np.zeros(n_pads)
+        np.maximum.at(max_cut, inv, resid)
+        np.maximum.at(max_fill, inv, -resid)
+
+        slope_pct = np.hypot(a, b) * 100.0
+        # Downhill direction is -grad = (-a east, -b north)
+        drain_bearing = np.degrees(np.arctan2(-a, -b)) % 360.0
+        pad_elev = mz + shift
+
+        pads = [
+            {
+                "pad_id": int(pad_ids[i]),
+                "cells": int(n[i]),
+                "pad_elevation": round(float(pad_elev[i]), 3),
+                "slope_pct": round(float(slope_pct[i]), 2),
+                "drain_bearing_deg": round(float(drain_bearing[i]), 1),
+                "cut_cy": round(float(cut[i]), 1),
+                "fill_cy": round(float(fill[i]), 1),
+                "net_cy": round(float(cut[i] * self.shrink - fill[i]), 1) + 0.0,
+                "max_cut_depth": round(float(max_cut[i]), 2),
+                "max_fill_depth": round(float(max_fill[i]), 2),
+            }
+            for i in range(n_pads)
+        ]
+        total_cut, total_fill = float(cut.sum()), float(fill.sum())
+        total = {
+            "pads": int(n_pads),
+            "cut_cy": round(total_cut, 1),
+            "fill_cy": round(total_fill, 1),
+            "net_cy": round(total_cut * self.shrink - total_fill, 1) + 0.0,
+        }
+        logger.info(
+            "Graded %d pads: cut=%.1f CY, fill=%.1f CY", n_pads, total["cut_cy"], total["fill_cy"],
+        )
+        return {"pads": pads, "total": total}
+
+    def _balance_shift(self, resid: np.ndarray, inv: np.ndarray, n_pads: int, iterations: int) -> np.ndarray:
+        """Vectorized bisection for each pad's vertical shift where shrink*cut == fill."""
+        lo = np.full(n_pads, np.inf)
+        hi = np.full(n_pads, -np.inf)
+        np.minimum.at(lo, inv, resid)
+        np.maximum.at(hi, inv, resid)
+        for _ in range(iterations):
+            mid = (lo + hi) / 2.0
+            r = resid - mid[inv]
+            cut = np.bincount(inv, weights=np.maximum(r, 0.0), minlength=n_pads)
+            fill = np.bincount(inv, weights=np.maximum(-r, 0.0), minlength=n_pads)
+            too_much_cut = cut * self.shrink > fill
+            lo = np.where(too_much_cut, mid, lo)
+            hi = np.where(too_much_cut, hi, mid)
+        return (lo + hi) / 2.0
+
+
+def labels_from_polygons(polygons: Sequence, transform: Sequence[float], shape) -> np.ndarray:
+    """Burn polygons into a pad-label raster (1-based, in input order).
+
+    Args:
+        polygons: Shapely polygons in the raster's CRS.
+        transform: Affine ``[a, b, c, d, e, f]`` of a north-up raster.
+        shape: (height, width) of the raster.
+
+    Returns:
+        int32 array where each cell whose centre lies in polygon *i* is ``i + 1``.
+        Later polygons win where they overlap.
+    """
+    import shapely
+
+    a, _, c, _, e, f = [float(v) for v in tuple(transform)[:6]]
+    height, width = shape
+    labels = np.zeros((height, width), dtype=np.int32)
+    for i, poly in enumerate(polygons):
+        minx, miny, maxx, maxy = poly.bounds
+        c0 = max(0, int(np.floor((minx - c) / a)))
+        c1 = min(width, int(np.ceil((maxx - c) / a)))
+        r0 = max(0, int(np.floor((maxy - f) / e)))
+        r1 = min(height, int(np.ceil((miny - f) / e)))
+        if c1 <= c0 or r1 <= r0:
+            continue
+        xs = c + (np.arange(c0, c1) + 0.5) * a
+        ys = f + (np.arange(r0, r1) + 0.5) * e
+        gx, gy = np.meshgrid(xs, ys)
+        inside = shapely.contains_xy(poly, gx, gy)
+        labels[r0:r1, c0:c1][inside] = i + 1
+    return labels
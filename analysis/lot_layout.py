@@ -2,14 +2,17 @@
 
 import logging
 from dataclasses import dataclass
-from typing import List, Optional
+from typing import Dict, List, Optional, Sequence, Union
 
 import numpy as np
-from shapely.geometry import box, Point
+import shapely
+
+from config import config
 
 logger = logging.getLogger(__name__)
 
 SQFT_PER_ACRE = 43_560.0
+MAX_GRID_POINTS = 2_000_000  # candidate points tested per contains_xy batch
 
 
 @dataclass
@@ -18,6 +21,39 @@ class LotCenter:
     x: float
     y: float
     id: int = 0
+    rotation: float = 0.0  # grid rotation in degrees (counter-clockwise)
+
+
+@dataclass
+class LotBoundaries:
+    """Clipped lot polygons as parallel arrays (one entry per kept lot)."""
+    ids: np.ndarray    # int64 lot ids (LotCenter.id)
+    areas: np.ndarray  # float64 clipped areas, sq ft
+    wkb: np.ndarray    # object array of WKB bytes
+
+    def __len__(self) -> int:
+        return int(self.ids.size)
+
+    def geometries(self) -> np.ndarray:
+        """Decode the WKB into a shapely geometry array."""
+        return shapely.from_wkb(self.wkb)
+
+    def to_geojson(self) -> Dict:
+        """FeatureCollection with ``lot_id`` and ``area_sqft`` properties."""
+        import json
+
+        geoms = shapely.to_geojson(self.geometries())
+        return {
+            "type": "FeatureCollection",
+            "features": [
+                {
+                    "type": "Feature",
+                    "geometry": json.loads(g),
+                    "properties": {"lot_id": int(i), "area_sqft": round(float(a), 1)},
+                }
+                for i, a, g in zip(self.ids, self.areas, geoms)
+            ],
+        }
 
 
 class LotLayoutGenerator:
@@ -44,6 +80,7 @@ class LotLayoutGenerator:
         self.buildable_mask = buildable_mask
         self.cell_size = cell_size
         self.origin = origin
+        shapely.prepare(self.boundary)  # speeds up every bulk predicate below
 
     # ------------------------------------------------------------------
     # Lot Centre Generation
@@ -53,40 +90,122 @@ class LotLayoutGenerator:
         self,
         target_lot_size_acres: float = 0.5,
         min_spacing: float = 100.0,
+        rotations: Union[int, Sequence[float], None] = None,
+        offset_steps: int = 1,
     ) -> List[LotCenter]:
         """Create a regular grid of lot centres inside the boundary.
 
+        With the defaults this is the axis-aligned grid starting half a
+        spacing in from the boundary's lower-left corner.  Passing
+        *rotations* and/or *offset_steps* searches grid orientations and
+        shifts and keeps the one yielding the most centres (see :meth:`best_grid`).
+
         Args:
             target_lot_size_acres: Desired individual lot area (acres).
             min_spacing: Minimum spacing between centres (feet).
+            rotations: Grid angles to try, in degrees, or a count of angles
+                evenly spaced over 0-90°.  None = axis-aligned only.
+            offset_steps: Shifts tried per axis, as fractions of the spacing.
 
         Returns:
             List of LotCenter objects that fall within the boundary.
         """
+        grid = self.best_grid(target_lot_size_acres, min_spacing, rotations, offset_steps)
+        centers = [
+            LotCenter(x=float(x), y=float(y), id=i, rotation=grid["rotation_deg"])
+            for i, (x, y) in enumerate(zip(grid["x"], grid["y"]))
+        ]
+        logger.info(
+            "Generated %d lot centres (target %.2f ac, spacing %.1f ft, rotation %.1f°)",
+            len(centers), target_lot_size_acres, grid["spacing"], grid["rotation_deg"],
+        )
+        return centers
+
+    def best_grid(
+        self,
+        target_lot_size_acres: float = 0.5,
+        min_spacing: float = 100.0,
+        rotations: Union[int, Sequence[float], None] = None,
+        offset_steps: int = 1,
+    ) -> Dict:
+        """Evaluate every (rotation, x-offset, y-offset) grid in bulk and keep the best.
+
+        All candidate points of all configurations are generated with numpy
+        and tested against the prepared boundary with ``shapely.contains_xy``
+        (in batches of at most ``MAX_GRID_POINTS``); per-configuration counts
+        come from one ``bincount``.  Ties keep the earliest configuration, so
+        the axis-aligned default grid wins unless another one is strictly better.
+
+        Returns:
+            Dict with ``x``/``y`` arrays of the chosen centres, ``rotation_deg``,
+            ``offset`` (fractions of spacing), ``spacing``, ``count`` and
+            ``configurations`` evaluated.
+        """
         lot_sqft = target_lot_size_acres * SQFT_PER_ACRE
         # Use spacing derived from a square lot, but at least min_spacing
-        spacing = max(min_spacing, np.sqrt(lot_sqft))
+        spacing = float(max(min_spacing, np.sqrt(lot_sqft)))
+
+        if rotations is None:
+            angles = np.array([0.0])
+        elif np.isscalar(rotations):
+            angles = np.linspace(0.0, 90.0, max(1, int(rotations)), endpoint=False)
+        else:
+            angles = np.asarray(rotations, dtype=np.float64)
+        steps = max(1, int(offset_steps))
+        shifts = (0.5 + np.arange(steps) / steps) % 1.0  # 0.5 (the default grid) first
+
+        cfg_angle, cfg_ox, cfg_oy = (
+            a.ravel() for a in np.meshgrid(angles, shifts, shifts, indexing="ij")
+        )
 
         minx, miny, maxx, maxy = self.boundary.bounds
-        centers: List[LotCenter] = []
-        idx = 0
-
-        y = miny + spacing / 2
-        while y < maxy:
-            x = minx + spacing / 2
-            while x < maxx:
-                pt = Point(x, y)
-                if self.boundary.contains(pt):
-                    centers.append(LotCenter(x=x, y=y, id=idx))
-                    idx += 1
-                x += spacing
-            y += spacing
+        cx, cy = (minx + maxx) / 2.0, (miny + maxy) / 2.0
+        radius = float(np.hypot(maxx - minx, maxy - miny)) / 2.0
 
-        logger.info(
-            "Generated %d lot centres (target %.2f ac, spacing %.1f ft)",
-            len(centers), target_lot_size_acres, spacing,
+        # Local grid anchored at the lower-left corner, extended to cover the
+        # bounding circle so any rotation still spans the whole site
+        i_lo = int(np.floor((cx - radius - minx) / spacing)) - 1
+        i_hi = int(np.ceil((cx + radius - minx) / spacing)) + 1
+        j_lo = int(np.floor((cy - radius - miny) / spacing)) - 1
+        j_hi = int(np.ceil((cy + radius - miny) / spacing)) + 1
+        jj, ii = np.meshgrid(np.arange(j_lo, j_hi), np.arange(i_lo, i_hi), indexing="ij")
+        ii, jj = ii.ravel().astype(np.float64), jj.ravel().astype(np.float64)  # row-major: y, then x
+        per_cfg = ii.size
+
+        counts = np.zeros(cfg_angle.size, dtype=np.int64)
+        chunk = max(1, MAX_GRID_POINTS // per_cfg)
+        for start in range(0, cfg_angle.size, chunk):
+            sl = slice(start, start + chunk)
+            x, y = self._grid_points(ii, jj, cfg_angle[sl], cfg_ox[sl], cfg_oy[sl], spacing, cx, cy, minx, miny)
+            inside = shapely.contains_xy(self.boundary, x, y)
+            counts[sl] = inside.reshape(-1, per_cfg).sum(axis=1)
+
+        best = int(np.argmax(counts))
+        x, y = self._grid_points(
+            ii, jj, cfg_angle[best:best + 1], cfg_ox[best:best + 1], cfg_oy[best:best + 1],
+            spacing, cx, cy, minx, miny,
         )
-        return centers
+        inside = shapely.contains_xy(self.boundary, x, y)
+        return {
+            "x": x[inside],
+            "y": y[inside],
+            "rotation_deg": float(cfg_angle[best]),
+            "offset": (float(cfg_ox[best]), float(cfg_oy[best])),
+            "spacing": spacing,
+            "count": int(counts[best]),
+            "configurations": int(cfg_angle.size),
+        }
+
+    @staticmethod
+    def _grid_points(ii, jj, angles, ox, oy, spacing, cx, cy, minx, miny):
+        """World coordinates of grid (ii, jj) for each configuration, flattened config-major."""
+        u = (minx - cx) + (ii[None, :] + ox[:, None]) * spacing
+        v = (miny - cy) + (jj[None, :] + oy[:, None]) * spacing
+        theta = np.radians(angles)[:, None]
+        cos, sin = np.cos(theta), np.sin(theta)
+        x = cx + u * cos - v * sin
+        y = cy + u * sin + v * cos
+        return x.ravel(), y.ravel()
 
     # ------------------------------------------------------------------
     # Lot Boundaries
@@ -97,31 +216,55 @@ class LotLayoutGenerator:
         lot_centers: List[LotCenter],
         lot_width: float = 100.0,
         lot_depth: float = 150.0,
-    ) -> list:
+        min_area_sqft: Optional[float] = None,
+    ) -> LotBoundaries:
         """Create rectangular lot polygons centred on each lot centre.
 
-        Lots that extend outside the site boundary are clipped.
+        All lot rectangles (rotated with their centre's grid) are built as
+        one shapely array.  Lots wholly inside the prepared boundary are kept
+        as-is; only the rest are clipped, in one vectorized ``intersection``.
+        Clipped pieces smaller than *min_area_sqft* are dropped as slivers.
 
         Args:
             lot_centers: List of LotCenter points.
             lot_width: Width of each lot in feet.
             lot_depth: Depth of each lot in feet.
+            min_area_sqft: Sliver threshold (default ``config.LOT_SLIVER_SQFT``).
 
         Returns:
-            List of (lot_id, shapely Polygon) tuples.
+            :class:`LotBoundaries` with ids, areas and WKB of the kept lots.
         """
-        half_w = lot_width / 2.0
-        half_d = lot_depth / 2.0
-        lots = []
+        min_area = config.LOT_SLIVER_SQFT if min_area_sqft is None else min_area_sqft
+        n = len(lot_centers)
+        if n == 0:
+            return LotBoundaries(np.zeros(0, np.int64), np.zeros(0), np.array([], dtype=object))
+
+        ids = np.fromiter((lc.id for lc in lot_centers), dtype=np.int64, count=n)
+        cx = np.fromiter((lc.x for lc in lot_centers), dtype=np.float64, count=n)
+        cy = np.fromiter((lc.y for lc in lot_centers), dtype=np.float64, count=n)
+        theta = np.radians(np.fromiter((lc.rotation for lc in lot_centers), dtype=np.float64, count=n))
 
-        for lc in lot_centers:
-            lot_poly = box(lc.x - half_w, lc.y - half_d, lc.x + half_w, lc.y + half_d)
-            clipped = lot_poly.intersection(self.boundary)
-            if not clipped.is_empty:
-                lots.append((lc.id, clipped))
+        # Corner offsets of a width x depth rectangle, rotated per lot: (n, 5, 2) closed rings
+        half = np.array([[-1, -1], [1, -1], [1, 1], [-1, 1], [-1, -1]], dtype=np.float64)
+        half *= (lot_width / 2.0, lot_depth / 2.0)
+        cos, sin = np.cos(theta)[:, None], np.sin(theta)[:, None]
+        ring = np.empty((n, 5, 2))
+        ring[..., 0] = cx[:, None] + half[:, 0] * cos - half[:, 1] * sin
+        ring[..., 1] = cy[:, None] + half[:, 0] * sin + half[:, 1] * cos
+        lots = shapely.polygons(ring)
 
-        logger.info("Created %d lot boundaries from %d centres", len(lots), len(lot_centers))
-        return lots
+        inside = shapely.contains(self.boundary, lots)
+        if (~inside).any():
+            lots[~inside] = shapely.intersection(lots[~inside], self.boundary)
+        areas = shapely.area(lots)
+        keep = areas >= max(min_area, 1e-9)
+
+        result = LotBoundaries(ids[keep], areas[keep], shapely.to_wkb(lots[keep]))
+        logger.info(
+            "Created %d lot boundaries from %d centres (%d clipped, %d slivers dropped)",
+            len(result), n, int((~inside).sum()), int((~keep).sum()),
+        )
+        return result
 
     # ------------------------------------------------------------------
     # Optimisation
@@ -133,33 +276,65 @@ class LotLayoutGenerator:
         target_lot_size_acres: float = 0.5,
         road_reserve_pct: float = 0.20,
         open_space_pct: float = 0.15,
+        time_budget_s: float = 3.0,
+        exclusions: Optional[Sequence] = None,
     ) -> dict:
-        """Estimate maximum lot yield for the site.
+        """Maximum lot yield from an actual street-and-lot layout.
+
+        Runs :class:`~analysis.lot_packing.LotPackingOptimizer` over street
+        bearings and frontage/depth combinations within the config lot-size
+        range and setbacks.  If the leftover area (not lots, not street
+        right-of-way) is below *open_space_pct*, the smallest lots are given
+        up to open space until it is met.
 
         Args:
-            pad_size_sqft: Building pad area per lot (sq ft).
+            pad_size_sqft: Building pad area each lot's setback envelope must hold (sq ft).
             target_lot_size_acres: Target lot size (acres).
-            road_reserve_pct: Fraction of gross area reserved for roads.
-            open_space_pct: Fraction of gross area reserved for open space.
+            road_reserve_pct: Flat road share used only for ``area_ratio_estimate``.
+            open_space_pct: Minimum fraction of gross area left as open space.
+            time_budget_s: Layout search time limit in seconds.
+            exclusions: Optional polygons lots may not build on.
 
         Returns:
-            Dictionary with gross_area, net_area, max_lots, road_area, open_space_area (all sq ft).
+            Dictionary with gross/road/open-space/net areas (sq ft), ``max_lots``
+            from the layout, the old ``area_ratio_estimate`` and a ``layout`` summary.
         """
-        gross_sqft = self.boundary.area  # assumes projected CRS in feet
-        road_sqft = gross_sqft * road_reserve_pct
-        open_sqft = gross_sqft * open_space_pct
-        net_sqft = gross_sqft - road_sqft - open_sqft
+        from analysis.lot_packing import LotPackingOptimizer
 
+        gross_sqft = self.boundary.area  # assumes projected CRS in feet
         lot_sqft = target_lot_size_acres * SQFT_PER_ACRE
-        max_lots = int(net_sqft / lot_sqft) if lot_sqft > 0 else 0
+        ratio_net = gross_sqft * (1.0 - road_reserve_pct - open_space_pct)
+        ratio_estimate = int(ratio_net / lot_sqft) if lot_sqft > 0 else 0
+
+        optimizer = LotPackingOptimizer(self.boundary, exclusions=exclusions)
+        layout = optimizer.optimize(
+            target_lot_acres=target_lot_size_acres,
+            pad_size_sqft=pad_size_sqft,
+            time_budget_s=time_budget_s,
+        )
+
+        road_sqft = layout.street_length_ft * optimizer.row
+        areas = np.sort(layout.lot_areas_sqft)
+        required_open = gross_sqft * open_space_pct
+        # Leftover open space grows by each lot given up, smallest first
+        open_after = gross_sqft - road_sqft - (areas.sum() - np.concatenate(([0.0], np.cumsum(areas))))
+        drop = int(np.argmax(open_after >= required_open)) if (open_after >= required_open).any() else areas.size
+        max_lots = int(areas.size - drop)
+        lots_sqft = float(areas[drop:].sum())
+        open_sqft = gross_sqft - road_sqft - lots_sqft
 
         result = {
             "gross_area_sqft": round(gross_sqft, 1),
             "road_area_sqft": round(road_sqft, 1),
             "open_space_area_sqft": round(open_sqft, 1),
-            "net_area_sqft": round(net_sqft, 1),
+            "net_area_sqft": round(lots_sqft, 1),
             "target_lot_sqft": round(lot_sqft, 1),
             "max_lots": max_lots,
+            "lots_given_to_open_space": drop,
+            "area_ratio_estimate": ratio_estimate,
+            "layout": layout.summary(),
         }
-        logger.info("Lot optimisation: max %d lots on %.1f net sq ft", max_lots, net_sqft)
+        logger.info(
+            "Lot optimisation: %d lots from layout (area-ratio estimate %d)", max_lots, ratio_estimate,
+        )
         return result
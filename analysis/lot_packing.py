@@ -0,0 +1,349 @@
+"""Street-spine lot packing for subdivision yield.
+
+Layouts are double-loaded streets: parallel street rights-of-way with a row
+of lots on each side, lots backing onto the lots of the next street.  In a
+frame rotated by the street bearing the repeating module is::
+
+    lot depth | ROW | lot depth  (period = 2 * depth + ROW_WIDTH)
+
+For each street bearing, lot frontage/depth pair, spine offset and lot shift
+along the street, every candidate lot is built as a shapely array in one go
+and tested in bulk:
+
+* the building envelope (lot minus ``config`` setbacks) must lie inside the
+  site boundary (corner ``contains_xy`` prefilter, then prepared ``contains``);
+* the lot's frontage point on the street centreline must be on site;
+* envelopes must not hit any exclusion polygon (``STRtree`` query);
+* lots clipped by the boundary keep at least the minimum lot area.
+
+Bearings are evaluated in parallel threads (shapely 2 releases the GIL in its
+vectorized operations) and the search stops at a time budget, returning the
+best layout found so far.
+"""
+
+import logging
+import math
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import shapely
+from shapely import STRtree, affinity
+
+from config import config
+
+logger = logging.getLogger(__name__)
+
+SQFT_PER_ACRE = 43_560.0
+FRONTAGE_CANDIDATES_FT = (50.0, 60.0, 70.0, 80.0, 90.0, 100.0, 120.0, 150.0, 200.0)
+MAX_DEPTH_TO_FRONTAGE = 3.0
+
+
+@dataclass
+class PackedLayout:
+    """Best lot layout found for a site (coordinates in the site's CRS).
+
+    ``streets`` are the spine centrelines serving the lots, clipped to the
+    site.  The spines are parallel and unconnected: no collector street tying
+    them together (or to the site entrance) is laid out, so
+    ``street_length_ft`` is a lower bound on the road length a real plan needs.
+    """
+    lot_count: int
+    rotation_deg: float
+    frontage_ft: float
+    depth_ft: float
+    lots: np.ndarray                      # shapely Polygon array
+    lot_areas_sqft: np.ndarray
+    streets: np.ndarray                   # shapely LineString array (centrelines)
+    street_length_ft: float               # spine centrelines only, no connector street
+    configurations: int
+    elapsed_s: float
+    complete: bool
+    params: Dict = field(default_factory=dict)
+
+    def summary(self) -> Dict:
+        return {
+            "lot_count": self.lot_count,
+            "rotation_deg": round(self.rotation_deg, 1),
+            "frontage_ft": round(self.frontage_ft, 1),
+            "depth_ft": round(self.depth_ft, 1),
+            "lot_area_sqft": round(float(self.lot_areas_sqft.sum()), 1),
+            "avg_lot_sqft": round(float(self.lot_areas_sqft.mean()), 1) if self.lot_count else 0.0,
+            "street_length_ft": round(self.street_length_ft, 1),
+            "configurations": self.configurations,
+            "elapsed_s": round(self.elapsed_s, 3),
+            "complete": self.complete,
+        }
+
+
+class LotPackingOptimizer:
+    """Search street-spine layouts and keep the one with the most valid lots."""
+
+    def __init__(
+        self,
+        boundary,
+        exclusions: Optional[Sequence] = None,
+        row_width: Optional[float] = None,
+        setbacks: Optional[Tuple[float, float, float]] = None,
+        min_lot_acres: Optional[float] = None,
+        max_lot_acres: Optional[float] = None,
+    ):
+        """
+        Args:
+            boundary: Site polygon in a projected CRS (feet).
+            exclusions: Polygons lots may not build on (steep ground, wetlands, easements).
+            row_width: Street right-of-way width (default ``config.ROW_WIDTH``).
+            setbacks: (front, side, rear) in feet (default ``config.SETBACK_*``).
+            min_lot_acres: Smallest legal lot (default ``config.MIN_LOT_SIZE``).
+            max_lot_acres: Largest lot (default ``config.MAX_LOT_SIZE``).
+        """
+        self.boundary = boundary
+        self.exclusions = list(exclusions or [])
+        self.row = float(row_width if row_width is not None else config.ROW_WIDTH)
+        self.front, self.side, self.rear = setbacks or (
+            config.SETBACK_FRONT, config.SETBACK_SIDE, config.SETBACK_REAR,
+        )
+        self.min_lot_sqft = (min_lot_acres if min_lot_acres is not None else config.MIN_LOT_SIZE) * SQFT_PER_ACRE
+        self.max_lot_sqft = (max_lot_acres if max_lot_acres is not None else config.MAX_LOT_SIZE) * SQFT_PER_ACRE
+        self.origin = boundary.centroid
+
+    # ------------------------------------------------------------------
+    # Search
+    # ------------------------------------------------------------------
+
+    def lot_dimensions(self, target_lot_acres: float, pad_size_sqft: float = 0.0) -> List[Tuple[float, float]]:
+        """(frontage, depth) pairs for the target lot area that satisfy the standards.
+
+        The target is clamped into [min, max] lot size.  Depth is at most
+        ``MAX_DEPTH_TO_FRONTAGE`` x frontage and no shallower than the frontage,
+        and the setback envelope must hold *pad_size_sqft*.
+        """
+        area = min(max(target_lot_acres * SQFT_PER_ACRE, self.min_lot_sqft), self.max_lot_sqft)
+        dims = []
+        for frontage in FRONTAGE_CANDIDATES_FT:
+            depth = area / frontage
+            if not frontage <= depth <= MAX_DEPTH_TO_FRONTAGE * frontage:
+                continue
+            env_w = frontage - 2.0 * self.side
+            env_d = depth - self.front - self.rear
+            if env_w <= 0 or env_d <= 0 or env_w * env_d < pad_size_sqft:
+                continue
+            dims.append((frontage, depth))
+        return dims
+
+    def optimize(
+        self,
+        target_lot_acres: float = 0.5,
+        pad_size_sqft: float = 0.0,
+        rotations: int = 12,
+        spine_offsets: int = 6,
+        lot_shifts: int = 3,
+        time_budget_s: float = 3.0,
+        workers: Optional[int] = None,
+    ) -> PackedLayout:
+        """Return the best layout found within *time_budget_s*.
+
+        Args:
+            target_lot_acres: Lot size to lay out (clamped to the lot-size range).
+            pad_size_sqft: Minimum building envelope per lot.
+            rotations: Street bearings tried, evenly spaced over 0-180°.
+            spine_offsets: Street positions tried across one module period.
+            lot_shifts: Lot-line positions tried along the street.
+            time_budget_s: Wall-clock limit; unfinished bearings are abandoned.
+            workers: Threads for the bearing search (default: CPU count, max 8).
+
+        Raises:
+            ValueError: If no frontage/depth pair satisfies the lot standards.
+        """
+        dims = self.lot_dimensions(target_lot_acres, pad_size_sqft)
+        if not dims:
+            raise ValueError(
+                f"No lot frontage/depth satisfies {target_lot_acres:.2f} ac with the "
+                f"setbacks and a {pad_size_sqft:.0f} sq ft pad"
+            )
+        start = time.perf_counter()
+        deadline = start + float(time_budget_s)
+        angles = np.linspace(0.0, 180.0, max(1, int(rotations)), endpoint=False)
+        workers = workers or min(8, os.cpu_count() or 1, len(angles))
+
+        with ThreadPoolExecutor(workers, thread_name_prefix="lot-pack") as pool:
+            results = list(pool.map(
+                lambda a: self._search_bearing(a, dims, spine_offsets, lot_shifts, deadline, self.exclusions),
+                angles,
+            ))
+
+        configurations = sum(r["evaluated"] for r in results)
+        complete = all(r["complete"] for r in results)
+        candidates = [r["best"] for r in results if r["best"] is not None]
+        if not candidates:
+            return PackedLayout(
+                0, 0.0, dims[0][0], dims[0][1], np.array([], dtype=object), np.zeros(0),
+                np.array([], dtype=object), 0.0, configurations, time.perf_counter() - start, complete,
+            )
+
+        best = max(candidates, key=lambda c: (c["count"], -c["street_length"]))
+        layout = self._materialize(best)
+        layout.configurations = configurations
+        layout.elapsed_s = time.perf_counter() - start
+        layout.complete = complete
+        layout.params = {
+            "target_lot_acres": target_lot_acres,
+            "pad_size_sqft": pad_size_sqft,
+            "row_width_ft": self.row,
+            "setbacks_ft": [self.front, self.side, self.rear],
+        }
+        logger.info(
+            "Lot packing: %d lots (%.0f x %.0f ft, bearing %.0f°) from %d layouts in %.2fs%s",
+            layout.lot_count, layout.frontage_ft, layout.depth_ft, layout.rotation_deg,
+            configurations, layout.elapsed_s, "" if complete else " (time budget reached)",
+        )
+        return layout
+
+    def _search_bearing(self, angle, dims, spine_offsets, lot_shifts, deadline, exclusions) -> Dict:
+        """Evaluate every dimension/offset/shift combination for one street bearing.
+
+        *exclusions* are rotated into the bearing's frame and indexed here.
+        """
+        site = affinity.rotate(self.boundary, -angle, origin=self.origin)
+        shapely.prepare(site)
+        if exclusions:
+            exclusions = STRtree([affinity.rotate(g, -angle, origin=self.origin) for g in exclusions])
+        else:
+            exclusions = None
+
+        best, evaluated = None, 0
+        for frontage, depth in dims:
+            period = 2.0 * depth + self.row
+            for k in range(max(1, spine_offsets)):
+                for s in range(max(1, lot_shifts)):
+                    if time.perf_counter() > deadline:
+                        return {"best": best, "evaluated": evaluated, "complete": False}
+                    result = self._evaluate(
+                        site, exclusions, frontage, depth,
+                        period * k / max(1, spine_offsets), frontage * s / max(1, lot_shifts),
+                    )
+                    evaluated += 1
+                    if best is None or (result["count"], -result["street_length"]) > (
+                        best["count"], -best["street_length"]
+                    ):
+                        result["angle"] = float(angle)
+                        best = result
+        return {"best": best, "evaluated": evaluated, "complete": True}
+
+    def _evaluate(self, site, exclusions, frontage, depth, spine_offset, lot_shift) -> Dict:
+        """Lay out one configuration in the rotated frame and validate all lots in bulk."""
+        minx, miny, maxx, maxy = site.bounds
+        period = 2.0 * depth + self.row
+        half_row = self.row / 2.0
+
+        streets_y = miny - period + spine_offset + depth + half_row + period * np.arange(
+            int(math.ceil((maxy - miny) / period)) + 2
+        )
+        lots_x = minx - frontage + lot_shift + frontage * np.arange(
+            int(math.ceil((maxx - minx) / frontage)) + 2
+        )
+
+        # Every lot: (street index, side) x column; side +1 = north of the street
+        street_idx = np.repeat(np.arange(streets_y.size), 2)
+        side = np.tile([1.0, -1.0], streets_y.size)
+        sy, xs = np.meshgrid(street_idx, np.arange(lots_x.size), indexing="ij")
+        sd = np.broadcast_to(side[:, None], sy.shape)
+        x0 = lots_x[xs].ravel()
+        x1 = x0 + frontage
+        street_y = streets_y[sy].ravel()
+        sd = sd.ravel()
+        front_y = street_y + sd * half_row
+        back_y = front_y + sd * depth
+        y0, y1 = np.minimum(front_y, back_y), np.maximum(front_y, back_y)
+
+        # Building envelope inside the setbacks
+        ex0, ex1 = x0 + self.side, x1 - self.side
+        ey_front = front_y + sd * self.front
+        ey_back = back_y - sd * self.rear
+        ey0, ey1 = np.minimum(ey_front, ey_back), np.maximum(ey_front, ey_back)
+
+        # Cheap prefilters: frontage point on the street and envelope corners on site
+        ok = shapely.contains_xy(site, (x0 + x1) / 2.0, street_y)
+        for cx, cy in ((ex0, ey0), (ex0, ey1), (ex1, ey0), (ex1, ey1)):
+            ok[ok] &= shapely.contains_xy(site, cx[ok], cy[ok])
+        idx = np.flatnonzero(ok)
+
+        envelopes = shapely.box(ex0[idx], ey0[idx], ex1[idx], ey1[idx])
+        inside = shapely.contains(site, envelopes)
+        if exclusions is not None and inside.any():
+            hits = exclusions.query(envelopes[inside], predicate="intersects")[0]
+            keep = np.ones(int(inside.sum()), dtype=bool)
+            keep[hits] = False
+            inside[np.flatnonzero(inside)] = keep
+        idx = idx[inside]
+
+        boxes = shapely.box(x0[idx], y0[idx], x1[idx], y1[idx])
+        full = shapely.contains(site, boxes)
+        areas = np.full(idx.size, frontage * depth)
+        clipped = np.empty(idx.size, dtype=object)
+        clipped[full] = boxes[full]
+        if (~full).any():
+            parts = shapely.intersection(boxes[~full], site)
+            clipped[~full] = parts
+            areas[~full] = shapely.area(parts)
+        valid = areas >= self.min_lot_sqft - 1e-6
+        idx, clipped, areas = idx[valid], clipped[valid], areas[valid]
+
+        # Streets: each run of adjacent lots on a spine, clipped to the site
+        runs = []
+        lot_street = sy.ravel()[idx]
+        for street in np.unique(lot_street):
+            sel = idx[lot_street == street]
+            rx0, rx1 = np.unique(x0[sel]), np.unique(x1[sel])
+            breaks = np.flatnonzero(rx0[1:] > rx1[:-1] + 1e-6)
+            for a, b in zip(np.r_[0, breaks + 1], np.r_[breaks, rx0.size - 1]):
+                runs.append([(rx0[a], streets_y[street]), (rx1[b], streets_y[street])])
+        segments = []
+        if runs:
+            parts = shapely.get_parts(shapely.intersection(shapely.linestrings(runs), site))
+            parts = parts[(shapely.get_type_id(parts) == 1) & (shapely.length(parts) > 0)]
+            for px0, py, px1, _ in shapely.bounds(parts).tolist():
+                segments.append((px0, py, px1))
+        length = float(sum(px1 - px0 for px0, _, px1 in segments))
+
+        return {
+            "count": int(idx.size),
+            "street_length": length,
+            "frontage": frontage,
+            "depth": depth,
+            "lots": clipped,
+            "areas": areas,
+            "segments": segments,
+        }
+
+    def _materialize(self, best: Dict) -> PackedLayout:
+        """Rotate the winning layout back into the site CRS."""
+        angle = best["angle"]
+        ox, oy = self.origin.x, self.origin.y
+        theta = math.radians(angle)
+        cos, sin = math.cos(theta), math.sin(theta)
+
+        def rotate(coords: np.ndarray) -> np.ndarray:
+            dx, dy = coords[:, 0] - ox, coords[:, 1] - oy
+            return np.column_stack([ox + dx * cos - dy * sin, oy + dx * sin + dy * cos])
+
+        lots = shapely.transform(best["lots"], rotate) if best["lots"].size else best["lots"]
+        streets = shapely.transform(
+            shapely.linestrings([[(x0, y), (x1, y)] for x0, y, x1 in best["segments"]]), rotate,
+        ) if best["segments"] else np.array([], dtype=object)
+        return PackedLayout(
+            lot_count=best["count"],
+            rotation_deg=angle,
+            frontage_ft=best["frontage"],
+            depth_ft=best["depth"],
+            lots=lots,
+            lot_areas_sqft=best["areas"],
+            streets=streets,
+            street_length_ft=best["street_length"],
+            configurations=0,
+            elapsed_s=0.0,
+            complete=True,
+        )
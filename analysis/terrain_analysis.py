@@ -6,20 +6,140 @@ from typing import Dict, Optional, Tuple
 import numpy as np
 from scipy import ndimage
 
+from analysis.earthwork import PadElevationSolver
+from analysis.grading import PadGradingEngine
+from analysis.rasterize import mask_window, rasterize_polygon
+from config import config
+
 logger = logging.getLogger(__name__)
 
 
 class TerrainAnalyzer:
     """Analyse a DEM raster for slope, aspect, buildable areas, and cut/fill."""
 
-    def __init__(self, elevation: np.ndarray, cell_size: float = 1.0):
+    def __init__(
+        self,
+        elevation: np.ndarray,
+        cell_size: float = 1.0,
+        dtype: Optional[str] = None,
+        nodata: Optional[float] = None,
+        mask: Optional[np.ndarray] = None,
+    ):
         """
         Args:
             elevation: 2-D array of elevations.
             cell_size: Ground distance per pixel (same units as elevation, typically metres or feet).
+            dtype: Working precision ("float32" or "float64"); defaults to
+                ``config.TERRAIN_DTYPE``.  The input is only copied when its
+                dtype differs or nodata cells must be replaced.
+            nodata: Optional nodata value to treat as NaN.
+            mask: Optional boolean area of interest (e.g. the parcel).  Cells
+                outside it still feed the gradient kernels, but slope,
+                buildability, pad elevation and cut/fill only cover the mask.
         """
-        self.elevation = elevation.astype(np.float64)
+        dtype = np.dtype(dtype or config.TERRAIN_DTYPE)
+        elev = np.asarray(elevation, dtype=dtype)
+        if nodata is not None:
+            void = elev == nodata
+            if void.any():
+                if np.shares_memory(elev, elevation) or not elev.flags.writeable:
+                    elev = elev.copy()
+                elev[void] = np.nan
+        if mask is not None and mask.shape != elev.shape:
+            raise ValueError(f"mask shape {mask.shape} != elevation shape {elev.shape}")
+        self.elevation = elev
         self.cell_size = cell_size
+        self.mask = mask
+        self._gradients: Optional[Tuple[np.ndarray, np.ndarray]] = None
+        self._slope: Optional[np.ndarray] = None
+
+    @classmethod
+    def for_polygon(
+        cls,
+        elevation: np.ndarray,
+        profile: dict,
+        geometry,
+        cell_size: float,
+        nodata: Optional[float] = None,
+        dtype: Optional[str] = None,
+    ) -> Tuple["TerrainAnalyzer", dict]:
+        """Analyzer clipped to a parcel polygon.
+
+        The polygon is rasterized onto the DEM grid, and the raster is
+        cropped to the mask's bounding window plus a one-cell margin (so the
+        3x3 slope kernel sees real neighbours at the parcel edge) before any
+        analysis runs.
+
+        Args:
+            elevation: DEM covering the parcel.
+            profile: Raster profile with the DEM's ``transform``.
+            geometry: Parcel polygon in the DEM's CRS (GeoJSON dict, ESRI
+                rings or shapely geometry; see :func:`analysis.rasterize.polygon_rings`).
+            cell_size: Ground distance per pixel.
+            nodata: Optional nodata value to treat as NaN.
+            dtype: Working precision (see ``__init__``).
+
+        Returns:
+            Tuple of (analyzer, profile of the cropped window).
+
+        Raises:
+            ValueError: If the polygon does not overlap the DEM.
+        """
+        mask = rasterize_polygon(geometry, profile["transform"], elevation.shape)
+        window = mask_window(mask, margin=1)
+        if window is None:
+            raise ValueError("Parcel polygon does not overlap the elevation data")
+        rows, cols = window
+        a, b, c, d, e, f = [float(v) for v in tuple(profile["transform"])[:6]]
+        cropped = dict(profile)
+        cropped.update({
+            "width": cols.stop - cols.start,
+            "height": rows.stop - rows.start,
+            "transform": [a, b, c + cols.start * a, d, e, f + rows.start * e],
+        })
+        logger.info(
+            "Parcel mask: %d of %d cells; analysing a %dx%d window",
+            int(mask.sum()), mask.size, cropped["height"], cropped["width"],
+        )
+        analyzer = cls(elevation[rows, cols], cell_size=cell_size, dtype=dtype, nodata=nodata, mask=mask[rows, cols])
+        return analyzer, cropped
+
+    @property
+    def cell_count(self) -> int:
+        """Cells in the area of interest (the mask, or the whole raster)."""
+        return int(np.count_nonzero(self.mask)) if self.mask is not None else int(self.elevation.size)
+
+    @property
+    def clipped_elevation(self) -> np.ndarray:
+        """Elevation with cells outside the mask set to NaN (for statistics)."""
+        if self.mask is None:
+            return self.elevation
+        return np.where(self.mask, self.elevation, np.nan)
+
+    def _clip(self, values: np.ndarray) -> np.ndarray:
+        """Set cells outside the mask to NaN in place."""
+        if self.mask is not None:
+            values[~self.mask] = np.nan
+        return values
+
+    # ------------------------------------------------------------------
+    # Gradients
+    # ------------------------------------------------------------------
+
+    @property
+    def gradients(self) -> Tuple[np.ndarray, np.ndarray]:
+        """(dz/dx, dz/dy) from Horn's Sobel kernels, computed once per instance.
+
+        x increases with column (east) and y with row (south).
+        """
+        if self._gradients is None:
+            scale = 8.0 * self.cell_size
+            dz_dx = ndimage.sobel(self.elevation, axis=1)
+            dz_dx /= scale
+            dz_dy = ndimage.sobel(self.elevation, axis=0)
+            dz_dy /= scale
+            self._gradients = (dz_dx, dz_dy)
+        return self._gradients
 
     # ------------------------------------------------------------------
     # Slope & Aspect
@@ -28,34 +148,85 @@ class TerrainAnalyzer:
     def calculate_slope(self) -> np.ndarray:
         """Calculate slope in degrees using Horn's method via Sobel operators.
 
+        The result is cached; callers must not modify it in place.
+
         Returns:
-            2-D array of slope values in degrees.
+            2-D array of slope values in degrees (NaN outside the mask).
         """
-        dz_dx = ndimage.sobel(self.elevation, axis=1) / (8.0 * self.cell_size)
-        dz_dy = ndimage.sobel(self.elevation, axis=0) / (8.0 * self.cell_size)
-        slope_rad = np.arctan(np.sqrt(dz_dx ** 2 + dz_dy ** 2))
-        slope_deg = np.degrees(slope_rad)
+        if self._slope is not None:
+            return self._slope
+
+        dz_dx, dz_dy = self.gradients
+        slope_deg = np.hypot(dz_dx, dz_dy)
+        np.arctan(slope_deg, out=slope_deg)
+        np.degrees(slope_deg, out=slope_deg)
+        self._clip(slope_deg)
         logger.info(
             "Slope calculated: min=%.2f°, max=%.2f°, mean=%.2f°",
             float(np.nanmin(slope_deg)),
             float(np.nanmax(slope_deg)),
             float(np.nanmean(slope_deg)),
         )
+        self._slope = slope_deg
         return slope_deg
 
+    def slope_statistics(self) -> Dict[str, float]:
+        """Min / max / mean slope in degrees over the area of interest."""
+        slope = self.calculate_slope()
+        return {
+            "min": float(np.nanmin(slope)),
+            "max": float(np.nanmax(slope)),
+            "mean": float(np.nanmean(slope)),
+        }
+
     def calculate_aspect(self) -> np.ndarray:
         """Calculate aspect (compass bearing of steepest descent) in degrees.
 
         Returns:
             2-D array of aspect values (0-360°, north = 0°).
         """
-        dz_dx = ndimage.sobel(self.elevation, axis=1) / (8.0 * self.cell_size)
-        dz_dy = ndimage.sobel(self.elevation, axis=0) / (8.0 * self.cell_size)
-        aspect_rad = np.arctan2(-dz_dy, dz_dx)
-        aspect_deg = np.degrees(aspect_rad)
+        dz_dx, dz_dy = self.gradients
+        aspect_deg = np.degrees(np.arctan2(-dz_dy, dz_dx))
         # Convert from math-angle to compass bearing
         aspect_compass = (90.0 - aspect_deg) % 360.0
-        return aspect_compass
+        return self._clip(aspect_compass)
+
+    def calculate_hillshade(self, azimuth: float = 315.0, altitude: float = 45.0) -> np.ndarray:
+        """Calculate an analytical hillshade (0-255).
+
+        Args:
+            azimuth: Sun compass bearing in degrees (clockwise from north).
+            altitude: Sun elevation above the horizon in degrees.
+
+        Returns:
+            2-D array of illumination values.
+        """
+        dz_dx, dz_dy = self.gradients
+        az = np.radians(azimuth)
+        alt = np.radians(altitude)
+        # Surface normal is (-dz/dEast, -dz/dNorth, 1); rows run south so dz/dNorth = -dz_dy
+        shade = (
+            np.sin(alt)
+            - dz_dx * (np.sin(az) * np.cos(alt))
+            + dz_dy * (np.cos(az) * np.cos(alt))
+        )
+        shade /= np.sqrt(1.0 + dz_dx ** 2 + dz_dy ** 2)
+        np.clip(shade, 0.0, 1.0, out=shade)
+        shade *= 255.0
+        return shade
+
+    def calculate_curvature(self) -> np.ndarray:
+        """Calculate total curvature (Laplacian of elevation) in 1/length units.
+
+        Positive values are concave (hollows), negative values convex (ridges).
+
+        Returns:
+            2-D array of curvature values.
+        """
+        dz_dx, dz_dy = self.gradients
+        curvature = np.gradient(dz_dx, self.cell_size, axis=1)
+        curvature += np.gradient(dz_dy, self.cell_size, axis=0)
+        return self._clip(curvature)
 
     # ------------------------------------------------------------------
     # Buildable Area Identification
@@ -65,20 +236,35 @@ class TerrainAnalyzer:
         self,
         max_slope: float = 15.0,
         min_area_sqft: float = 5000.0,
+        opening_iterations: int = 0,
+        closing_iterations: int = 0,
     ) -> np.ndarray:
         """Identify contiguous regions with slope ≤ *max_slope*.
 
-        Small isolated patches (< *min_area_sqft*) are filtered out.
+        Small isolated patches (< *min_area_sqft*) are filtered out with a
+        single labelling pass and a ``bincount`` size lookup, so the cost is
+        linear in raster size regardless of how many regions there are.
 
         Args:
             max_slope: Maximum allowable slope in degrees.
             min_area_sqft: Minimum contiguous area in square feet.
+            opening_iterations: Morphological opening applied before
+                labelling (removes thin spurs and specks); 0 disables it.
+            closing_iterations: Morphological closing applied after opening
+                (fills pinholes and narrow gaps); 0 disables it.
 
         Returns:
-            Boolean mask where True = buildable.
+            Boolean mask where True = buildable (never outside the analyzer mask).
         """
         slope = self.calculate_slope()
-        buildable = slope <= max_slope
+        buildable = slope <= max_slope  # NaN (no data / outside mask) is never buildable
+
+        if opening_iterations > 0:
+            buildable = self._morphology(buildable, ndimage.binary_opening, opening_iterations)
+        if closing_iterations > 0:
+            buildable = self._morphology(buildable, ndimage.binary_closing, closing_iterations)
+        if self.mask is not None and (opening_iterations > 0 or closing_iterations > 0):
+            buildable &= self.mask  # closing can grow regions past the parcel edge
 
         # Connected-component labelling to remove small patches
         labelled, num_features = ndimage.label(buildable)
@@ -87,19 +273,30 @@ class TerrainAnalyzer:
         cell_area_sqft = (self.cell_size ** 2) * 10.7639  # m² → ft² (approx)
         min_cells = max(1, int(min_area_sqft / cell_area_sqft))
 
-        for region_id in range(1, num_features + 1):
-            region_mask = labelled == region_id
-            if region_mask.sum() < min_cells:
-                buildable[region_mask] = False
+        sizes = np.bincount(labelled.ravel(), minlength=num_features + 1)
+        keep = sizes >= min_cells
+        keep[0] = False  # background
+        buildable = keep[labelled]
 
-        remaining = ndimage.label(buildable)[1]
+        remaining = int(np.count_nonzero(keep))
         logger.info(
-            "Buildable area: %.1f%% of raster (%d regions after filtering)",
-            100.0 * buildable.sum() / buildable.size,
+            "Buildable area: %.1f%% of analysis area (%d regions after filtering)",
+            self.buildable_percent(buildable),
             remaining,
         )
         return buildable
 
+    def buildable_percent(self, buildable: np.ndarray) -> float:
+        """Share of the area of interest covered by *buildable*, in percent."""
+        return round(100.0 * float(np.count_nonzero(buildable)) / max(self.cell_count, 1), 2)
+
+    @staticmethod
+    def _morphology(mask: np.ndarray, op, iterations: int) -> np.ndarray:
+        """Apply a binary morphology op with edge padding so raster borders aren't eroded."""
+        padded = np.pad(mask, iterations, mode="edge")
+        result = op(padded, iterations=iterations)
+        return result[iterations:-iterations, iterations:-iterations]
+
     # ------------------------------------------------------------------
     # Cut / Fill
     # ------------------------------------------------------------------
@@ -113,20 +310,30 @@ class TerrainAnalyzer:
 
         Args:
             target_elevation: Desired pad / finish grade elevation.
-            buildable_mask: Optional boolean mask limiting the analysis area.
+            buildable_mask: Optional boolean mask limiting the analysis area
+                (defaults to the analyzer mask).
 
         Returns:
             Dict with 'cut_cy' and 'fill_cy' (cubic yards).
         """
-        elev = self.elevation.copy()
+        if buildable_mask is None:
+            buildable_mask = self.mask
+        elev = self.elevation
+        cut_sel = elev > target_elevation  # NaN compares False on both sides
+        fill_sel = elev < target_elevation
         if buildable_mask is not None:
-            elev = np.where(buildable_mask, elev, np.nan)
+            cut_sel &= buildable_mask
+            fill_sel &= buildable_mask
 
-        diff = elev - target_elevation  # positive = cut, negative = fill
-        cell_volume_m3 = self.cell_size ** 2  # volume per 1 m depth per cell
+        # Masked reductions accumulate in float64 without a full diff temporary
+        n_cut = int(np.count_nonzero(cut_sel))
+        n_fill = int(np.count_nonzero(fill_sel))
+        cut_depth = np.sum(elev, where=cut_sel, dtype=np.float64) - target_elevation * n_cut
+        fill_depth = target_elevation * n_fill - np.sum(elev, where=fill_sel, dtype=np.float64)
 
-        cut_m3 = float(np.nansum(np.where(diff > 0, diff, 0.0)) * cell_volume_m3)
-        fill_m3 = float(np.nansum(np.where(diff < 0, -diff, 0.0)) * cell_volume_m3)
+        cell_volume_m3 = self.cell_size ** 2  # volume per 1 m depth per cell
+        cut_m3 = float(cut_depth * cell_volume_m3)
+        fill_m3 = float(fill_depth * cell_volume_m3)
 
         m3_to_cy = 1.30795  # 1 m³ ≈ 1.308 yd³
         result = {
@@ -143,16 +350,17 @@ class TerrainAnalyzer:
         """Find the pad elevation that minimises total earthwork (median).
 
         Args:
-            buildable_mask: Optional boolean mask for the area of interest.
+            buildable_mask: Optional boolean mask (defaults to the analyzer mask).
 
         Returns:
             Optimal pad elevation value.
         """
-        elev = self.elevation.copy()
+        if buildable_mask is None:
+            buildable_mask = self.mask
         if buildable_mask is not None:
-            elev = elev[buildable_mask]
+            elev = self.elevation[buildable_mask]
         else:
-            elev = elev.ravel()
+            elev = self.elevation.ravel()
 
         valid = elev[~np.isnan(elev)]
         if valid.size == 0:
@@ -161,3 +369,31 @@ class TerrainAnalyzer:
         optimal = float(np.median(valid))
         logger.info("Optimal pad elevation (median): %.2f", optimal)
         return optimal
+
+    def pad_solver(self, buildable_mask: Optional[np.ndarray] = None, **kwargs) -> PadElevationSolver:
+        """Build a :class:`PadElevationSolver` over the masked cells.
+
+        The solver sorts the elevations once and then answers cut/fill for
+        any pad elevation, the balanced-earthwork elevation and the full
+        volume curve without touching the raster again.
+
+        Args:
+            buildable_mask: Optional boolean mask (defaults to the analyzer mask).
+            **kwargs: Passed through to :class:`PadElevationSolver`.
+        """
+        if buildable_mask is None:
+            buildable_mask = self.mask
+        elev = self.elevation[buildable_mask] if buildable_mask is not None else self.elevation
+        return PadElevationSolver(elev, cell_size=self.cell_size, **kwargs)
+
+    def grade_pads(self, pad_labels: np.ndarray, balance: bool = True, **kwargs) -> Dict:
+        """Fit a sloped drainage plane per pad and report per-pad and total earthwork.
+
+        Args:
+            pad_labels: Integer raster (0 = none) assigning cells to pads or lots;
+                see :func:`analysis.grading.labels_from_polygons`.
+            balance: Balance shrunk cut against fill on each pad.
+            **kwargs: Passed through to :class:`PadGradingEngine`.
+        """
+        engine = PadGradingEngine(self.elevation, cell_size=self.cell_size, **kwargs)
+        return engine.grade(pad_labels, balance=balance)
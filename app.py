@@ -4,28 +4,22 @@ import logging
 import json
 import os
 import smtplib
+import time
 from datetime import datetime
 from pathlib import Path
 from email.message import EmailMessage
-from flask import Flask, jsonify, request, send_file
+from flask import Flask, Response, g, jsonify, request, send_file, stream_with_context
 from werkzeug.utils import secure_filename
 from flask_cors import CORS
 
+import metrics
 from config import config
-from data_fetchers.gcgis_fetcher import search_parcels, get_parcel_by_pin, geocode_address
-
-# Lazy imports for heavy modules (scipy, numpy) — only loaded when needed
-ParcelFetcher = None
-ElevationFetcher = None
-TerrainAnalyzer = None
-
-def _load_heavy_modules():
-    global ElevationFetcher, TerrainAnalyzer
-    if TerrainAnalyzer is None:
-        from data_fetchers.elevation_fetcher import ElevationFetcher as _EF
-        from analysis.terrain_analysis import TerrainAnalyzer as _TA
-        ElevationFetcher = _EF
-        TerrainAnalyzer = _TA
+from metrics import span
+from lazy_modules import (
+    registry as module_registry, batch as batch_analysis, elevation as elevation_fetcher,
+    estimate_workbook, gcgis, http_client, jobs, proforma, rasterize, takeoff,
+    terrain as terrain_analysis,
+)
 
 logging.basicConfig(
     level=logging.INFO,
@@ -38,6 +32,43 @@ app.config["SECRET_KEY"] = config.SECRET_KEY
 app.json.sort_keys = False  # preserve dict key order
 CORS(app)
 
+
+@app.before_request
+def _start_warm_up():
+    """Begin background imports in this process (no-op after the first request)."""
+    module_registry.start_warm_up()
+
+
+@app.before_request
+def _begin_request_timing():
+    g.request_started = time.perf_counter()
+    metrics.begin_request()
+
+
+@app.after_request
+def _end_request_timing(response):
+    """Record the request latency and attach ``Server-Timing`` when enabled."""
+    started = g.pop("request_started", None)
+    if started is not None:
+        header = metrics.end_request(
+            request.endpoint or "unknown", request.method, time.perf_counter() - started,
+            failed=response.status_code >= 500,
+        )
+        if header:
+            response.headers["Server-Timing"] = header
+    return response
+
+
+@app.teardown_request
+def _record_failed_request(exc):
+    """Count requests that never reached ``after_request`` (unhandled exceptions)."""
+    started = g.pop("request_started", None)
+    if started is not None:
+        metrics.end_request(
+            request.endpoint or "unknown", request.method, time.perf_counter() - started, failed=True,
+        )
+
+
 UPLOAD_DIR = Path(__file__).parent / "uploads" / "plans"
 SUBMISSIONS_DIR = UPLOAD_DIR / "submissions"
 UPLOAD_DIR.mkdir(parents=True, exist_ok=True)
@@ -142,33 +173,43 @@ def _require_admin_token() -> bool:
 def debug_check():
     """Test heavy module loading."""
     issues = []
-    try:
-        import numpy as np
-        issues.append(f"numpy OK: {np.__version__}")
-    except Exception as e:
-        issues.append(f"numpy FAIL: {e}")
-    try:
-        from scipy import ndimage
-        issues.append("scipy.ndimage OK")
-    except Exception as e:
-        issues.append(f"scipy FAIL: {e}")
-    try:
-        _load_heavy_modules()
-        issues.append(f"heavy modules OK: EF={ElevationFetcher}, TA={TerrainAnalyzer}")
-    except Exception as e:
-        issues.append(f"heavy modules FAIL: {e}")
-    
+    for alias in ("numpy", "scipy.ndimage", "elevation", "terrain"):
+        try:
+            module = module_registry.load(alias)
+            version = getattr(module, "__version__", None)
+            issues.append(f"{alias} OK" + (f": {version}" if version else ""))
+        except Exception as e:
+            issues.append(f"{alias} FAIL: {e}")
+
     # Check API keys and rasterio
     issues.append(f"OPENTOPO_API_KEY: {'SET' if config.OPENTOPO_API_KEY else 'MISSING'}")
     issues.append(f"OPENTOPOGRAPHY_API_KEY: {'SET' if config.OPENTOPOGRAPHY_API_KEY else 'MISSING'}")
     try:
-        from data_fetchers.elevation_fetcher import HAS_RASTERIO, HAS_PILLOW
-        issues.append(f"rasterio: {'AVAILABLE' if HAS_RASTERIO else 'NOT_AVAILABLE'}")
-        issues.append(f"pillow: {'AVAILABLE' if HAS_PILLOW else 'NOT_AVAILABLE'}")
+        issues.append(f"rasterio: {'AVAILABLE' if elevation_fetcher.HAS_RASTERIO else 'NOT_AVAILABLE'}")
+        issues.append(f"pillow: {'AVAILABLE' if elevation_fetcher.HAS_PILLOW else 'NOT_AVAILABLE'}")
     except Exception as e:
         issues.append(f"image library check FAILED: {e}")
-    
-    return jsonify({"checks": issues})
+
+    return jsonify({
+        "checks": issues,
+        "imports": module_registry.stats(),
+        "upstream": http_client.upstream_stats(),
+        "jobs": jobs.get_job_manager().stats(),
+        "estimate_cache": estimate_workbook.get_workbook_cache().stats(),
+        "metrics": metrics.registry.snapshot(),
+    })
+
+
+@app.route("/api/metrics", methods=["GET"])
+def metrics_export():
+    """Stage, upstream and request latency histograms.
+
+    Prometheus text by default; ``?format=json`` returns count, mean and
+    p50/p95/p99 per series instead.
+    """
+    if request.args.get("format") == "json":
+        return jsonify(metrics.registry.snapshot())
+    return Response(metrics.registry.render_prometheus(), mimetype="text/plain; version=0.0.4")
 
 
 @app.route("/api/health", methods=["GET"])
@@ -178,9 +219,213 @@ def health():
     return jsonify({"status": "ok" if not issues else "degraded", "issues": issues})
 
 
+def _earthwork_summary(analyzer, buildable, data: dict) -> dict:
+    """Balanced-pad solution, optional what-if pad elevations and volume curve.
+
+    Request keys (all optional): ``pad_elevations`` (list of what-if pad
+    elevations), ``curve_points`` (int, 0 = no curve).
+    """
+    solver = analyzer.pad_solver(buildable)
+    summary = {
+        "balanced": solver.solve("balanced"),
+        "min_earthwork": solver.solve("min_earthwork"),
+    }
+    what_if = data.get("pad_elevations") or []
+    if what_if:
+        summary["what_if"] = [solver.evaluate(float(t)) for t in what_if]
+    curve_points = int(data.get("curve_points", 0))
+    if curve_points > 0:
+        summary["curve"] = solver.volume_curve(min(curve_points, 500))
+    return summary
+
+
+def _takeoff_estimate(data: dict, acres: float, cut_fill: dict):
+    """Priced estimate for the analysed site when the request asks for one.
+
+    ``estimate`` may be ``true`` or a dict of :func:`takeoff.compute_quantities`
+    overrides (``lot_size_sf``, ``lots``, ``road_lf``, ``public_sewer``, ...)
+    plus an optional ``layout`` summary and ``sections`` of unit prices.
+    Terrain cut/fill replaces the per-lot earthwork rule of thumb.
+    """
+    opts = data.get("estimate")
+    if not opts:
+        return None
+    opts = dict(opts) if isinstance(opts, dict) else {}
+    params = {"acres": acres, "cut_cy": cut_fill.get("cut_cy"), "fill_cy": cut_fill.get("fill_cy")}
+    params.update(opts)
+    with span("takeoff"):
+        return takeoff.estimate(**params)
+
+
+def _terrain_stages(analyzer, max_slope: float, data: dict) -> tuple:
+    """Slope, buildable mask, pad elevation, cut/fill and earthwork, each timed.
+
+    Returns:
+        Tuple of (buildable, optimal pad elevation, cut/fill, earthwork summary).
+    """
+    with span("slope"):
+        analyzer.calculate_slope()
+    with span("buildable"):
+        buildable = analyzer.identify_buildable_areas(max_slope=max_slope)
+    with span("pad"):
+        optimal_elev = analyzer.find_optimal_pad_elevation(buildable)
+    with span("cut_fill"):
+        cut_fill = analyzer.calculate_cut_fill_volumes(optimal_elev, buildable)
+    with span("earthwork"):
+        earthwork = _earthwork_summary(analyzer, buildable, data)
+    return buildable, optimal_elev, cut_fill, earthwork
+
+
+def _estimate_options_error(data: dict):
+    """Error message for an invalid ``estimate`` option, checked before the DEM pipeline."""
+    opts = data.get("estimate")
+    if not isinstance(opts, dict):
+        return None
+    try:
+        takeoff.validate_params(opts)
+    except ValueError as exc:
+        return str(exc)
+    return None
+
+
+def _parcel_geometry(tax_id: str) -> tuple:
+    """Parcel polygon for *tax_id*: GCGIS (local index first), then Regrid.
+
+    Returns:
+        Tuple of (geometry, validation issues).
+    """
+    try:
+        parcel = gcgis.get_parcel_by_pin(tax_id)
+        if parcel.get("_geometry"):
+            return parcel["_geometry"], []
+        gcgis_error = ValueError(f"Parcel {tax_id} has no geometry")
+    except ValueError as exc:
+        gcgis_error = exc
+    if not config.REGRID_API_KEY:
+        raise gcgis_error
+
+    from data_fetchers.parcel_fetcher import ParcelFetcher as _PF
+    parcel_gdf = _PF(api_key=config.REGRID_API_KEY).fetch_by_tax_id(tax_id)
+    issues = _PF.validate_parcel_data(parcel_gdf)
+    if issues:
+        logger.warning("Parcel validation issues: %s", issues)
+    return parcel_gdf.geometry.unary_union, issues
+
+
+def _run_parcel_analysis(data: dict) -> dict:
+    """Parcel lookup, DEM fetch and terrain analysis for ``/api/analyze``.
+
+    Every statistic is restricted to the parcel polygon, rasterized onto the
+    DEM grid; the raster is cropped to the parcel's window first.
+
+    Raises:
+        ValueError: If the parcel cannot be found or has no usable data.
+    """
+    tax_id: str = data.get("tax_id", "").strip()
+    max_slope = float(data.get("max_slope", config.MAX_BUILDABLE_SLOPE))
+    buffer_distance = float(data.get("buffer_distance", 0.001))
+
+    # 1. Fetch parcel geometry
+    with span("parcel_fetch"):
+        geometry, issues = _parcel_geometry(tax_id)
+    points = [pt for ring in rasterize.polygon_rings(geometry) for pt in ring]
+    if not points:
+        raise ValueError(f"Parcel {tax_id} has no geometry")
+    xs, ys = [p[0] for p in points], [p[1] for p in points]
+    bounds = (min(xs), min(ys), max(xs), max(ys))  # (minx, miny, maxx, maxy)
+
+    # 2. Fetch elevation data
+    elev_fetcher = elevation_fetcher.ElevationFetcher()
+    with span("dem_fetch"):
+        elevation, profile = elev_fetcher.fetch_dem_for_parcel(
+            bounds=bounds,
+            buffer_distance=buffer_distance,
+        )
+
+    # 3. Terrain analysis on the parcel mask — convert degrees to meters
+    import math
+    deg_size = abs(profile.get("transform", [1])[0])
+    mid_lat = (bounds[1] + bounds[3]) / 2.0
+    cell_size = deg_size * 111320 * math.cos(math.radians(mid_lat))
+    with span("rasterize"):
+        analyzer, _ = terrain_analysis.TerrainAnalyzer.for_polygon(
+            elevation, profile, geometry, cell_size=cell_size, nodata=profile.get("nodata"),
+        )
+    elev_stats = elevation_fetcher.ElevationFetcher.calculate_elevation_statistics(analyzer.clipped_elevation)
+    buildable, optimal_elev, cut_fill, earthwork = _terrain_stages(analyzer, max_slope, data)
+    site_acres = analyzer.cell_count * cell_size ** 2 / 4046.856
+
+    return {
+        "tax_id": tax_id,
+        "parcel_bounds": list(bounds),
+        "parcel_cells": analyzer.cell_count,
+        "elevation_stats": elev_stats,
+        "slope_stats": analyzer.slope_statistics(),
+        "buildable_pct": analyzer.buildable_percent(buildable),
+        "optimal_pad_elevation": optimal_elev,
+        "cut_fill": cut_fill,
+        "earthwork": earthwork,
+        "estimate": _takeoff_estimate(data, site_acres, cut_fill),
+        "validation_issues": issues,
+    }
+
+
+def _run_coords_analysis(data: dict) -> dict:
+    """DEM fetch and terrain analysis for a bounding box (``/api/analyze-coords``)."""
+    south, north = float(data["south"]), float(data["north"])
+    west, east = float(data["west"]), float(data["east"])
+    max_slope = float(data.get("max_slope", config.MAX_BUILDABLE_SLOPE))
+    bounds = (west, south, east, north)
+
+    # Fetch elevation
+    elev_fetcher = elevation_fetcher.ElevationFetcher()
+    with span("dem_fetch"):
+        elevation, profile = elev_fetcher.fetch_dem_for_parcel(
+            bounds=bounds, buffer_distance=0.0005
+        )
+
+    # Terrain analysis — convert cell size from degrees to meters
+    import math
+    deg_size = abs(profile.get("transform", [1])[0])
+    mid_lat = (south + north) / 2.0
+    cell_size_m = deg_size * 111320 * math.cos(math.radians(mid_lat))
+    analyzer = terrain_analysis.TerrainAnalyzer(elevation, cell_size=cell_size_m, nodata=profile.get("nodata"))
+    elev_stats = elevation_fetcher.ElevationFetcher.calculate_elevation_statistics(analyzer.elevation)
+    buildable, optimal_elev, cut_fill, earthwork = _terrain_stages(analyzer, max_slope, data)
+
+    return {
+        "bounds": list(bounds),
+        "elevation_stats": elev_stats,
+        "slope_stats": analyzer.slope_statistics(),
+        "buildable_pct": analyzer.buildable_percent(buildable),
+        "optimal_pad_elevation": optimal_elev,
+        "cut_fill": cut_fill,
+        "earthwork": earthwork,
+        "estimate": _takeoff_estimate(data, analyzer.elevation.size * cell_size_m ** 2 / 4046.856, cut_fill),
+    }
+
+
+def _wants_async(data: dict) -> bool:
+    flag = data.get("async", request.args.get("async", False))
+    return str(flag).lower() in ("1", "true", "yes")
+
+
+def _submit_job(kind: str, fn, data: dict):
+    """Queue *fn(data)* as a background job and return the 202 response."""
+
+    try:
+        job = jobs.get_job_manager().submit(kind, fn, data, params=data)
+    except jobs.JobQueueFull as exc:
+        return jsonify({"error": str(exc)}), 503
+    return jsonify({
+        "job_id": job.id,
+        "status": job.status,
+        "status_url": f"/api/jobs/{job.id}",
+    }), 202
+
+
 @app.route("/api/analyze", methods=["POST"])
 def analyze():
-    _load_heavy_modules()
     """Run the full analysis pipeline for a parcel.
 
     Expects JSON body::
@@ -188,7 +433,9 @@ def analyze():
         {
             "tax_id": "123-456-789",
             "max_slope": 15,          // optional
-            "buffer_distance": 0.001  // optional
+            "buffer_distance": 0.001, // optional
+            "estimate": {...},        // optional: priced takeoff (true or takeoff overrides)
+            "async": true             // optional: return a job id, poll /api/jobs/<id>
         }
     """
     data = request.get_json(force=True)
@@ -196,53 +443,17 @@ def analyze():
     if not tax_id:
         return jsonify({"error": "tax_id is required"}), 400
 
-    max_slope = float(data.get("max_slope", config.MAX_BUILDABLE_SLOPE))
-    buffer_distance = float(data.get("buffer_distance", 0.001))
-
-    try:
-        # 1. Fetch parcel geometry
-        parcel_fetcher = ParcelFetcher()
-        parcel_gdf = parcel_fetcher.fetch_by_tax_id(tax_id)
-        issues = ParcelFetcher.validate_parcel_data(parcel_gdf)
-        if issues:
-            logger.warning("Parcel validation issues: %s", issues)
-
-        bounds = tuple(parcel_gdf.total_bounds)  # (minx, miny, maxx, maxy)
+    estimate_error = _estimate_options_error(data)
+    if estimate_error:
+        return jsonify({"error": estimate_error}), 400
 
-        # 2. Fetch elevation data
-        elev_fetcher = ElevationFetcher()
-        elevation, profile = elev_fetcher.fetch_dem_for_parcel(
-            bounds=bounds,
-            buffer_distance=buffer_distance,
-        )
-        elev_stats = ElevationFetcher.calculate_elevation_statistics(elevation)
-
-        # 3. Terrain analysis — convert degrees to meters
-        import math
-        deg_size = abs(profile.get("transform", [1])[0])
-        mid_lat = (bounds[1] + bounds[3]) / 2.0
-        cell_size = deg_size * 111320 * math.cos(math.radians(mid_lat))
-        analyzer = TerrainAnalyzer(elevation, cell_size=cell_size)
-        slope = analyzer.calculate_slope()
-        buildable = analyzer.identify_buildable_areas(max_slope=max_slope)
-        optimal_elev = analyzer.find_optimal_pad_elevation(buildable)
-        cut_fill = analyzer.calculate_cut_fill_volumes(optimal_elev, buildable)
+    if _wants_async(data):
+        return _submit_job("analyze", _run_parcel_analysis, data)
 
-        result = {
-            "tax_id": tax_id,
-            "parcel_bounds": list(bounds),
-            "elevation_stats": elev_stats,
-            "slope_stats": {
-                "min": float(slope.min()),
-                "max": float(slope.max()),
-                "mean": float(slope.mean()),
-            },
-            "buildable_pct": round(100.0 * buildable.sum() / buildable.size, 2),
-            "optimal_pad_elevation": optimal_elev,
-            "cut_fill": cut_fill,
-            "validation_issues": issues,
-        }
-        return jsonify(result)
+    try:
+        result = _run_parcel_analysis(data)
+        with span("serialize"):
+            return jsonify(result)
 
     except ValueError as exc:
         logger.error("Analysis error: %s", exc)
@@ -254,7 +465,6 @@ def analyze():
 
 @app.route("/api/analyze-coords", methods=["POST"])
 def analyze_coords():
-    _load_heavy_modules()
     """Analyze terrain for a bounding box (no parcel lookup needed).
 
     Expects JSON body::
@@ -264,7 +474,8 @@ def analyze_coords():
             "north": 35.06,
             "west": -82.45,
             "east": -82.44,
-            "max_slope": 15
+            "max_slope": 15,
+            "async": true    // optional: return a job id, poll /api/jobs/<id>
         }
     """
     data = request.get_json(force=True)
@@ -273,48 +484,118 @@ def analyze_coords():
     if missing:
         return jsonify({"error": f"Missing fields: {missing}"}), 400
 
-    south, north = float(data["south"]), float(data["north"])
-    west, east = float(data["west"]), float(data["east"])
-    max_slope = float(data.get("max_slope", config.MAX_BUILDABLE_SLOPE))
+    estimate_error = _estimate_options_error(data)
+    if estimate_error:
+        return jsonify({"error": estimate_error}), 400
 
-    try:
-        bounds = (west, south, east, north)
-
-        # Fetch elevation
-        elev_fetcher = ElevationFetcher()
-        elevation, profile = elev_fetcher.fetch_dem_for_parcel(
-            bounds=bounds, buffer_distance=0.0005
-        )
-        elev_stats = ElevationFetcher.calculate_elevation_statistics(elevation)
-
-        # Terrain analysis — convert cell size from degrees to meters
-        import math
-        deg_size = abs(profile.get("transform", [1])[0])
-        mid_lat = (south + north) / 2.0
-        cell_size_m = deg_size * 111320 * math.cos(math.radians(mid_lat))
-        analyzer = TerrainAnalyzer(elevation, cell_size=cell_size_m)
-        slope = analyzer.calculate_slope()
-        buildable = analyzer.identify_buildable_areas(max_slope=max_slope)
-        optimal_elev = analyzer.find_optimal_pad_elevation(buildable)
-        cut_fill = analyzer.calculate_cut_fill_volumes(optimal_elev, buildable)
+    if _wants_async(data):
+        return _submit_job("analyze-coords", _run_coords_analysis, data)
 
-        return jsonify({
-            "bounds": list(bounds),
-            "elevation_stats": elev_stats,
-            "slope_stats": {
-                "min": float(slope.min()),
-                "max": float(slope.max()),
-                "mean": float(slope.mean()),
-            },
-            "buildable_pct": round(100.0 * buildable.sum() / buildable.size, 2),
-            "optimal_pad_elevation": optimal_elev,
-            "cut_fill": cut_fill,
-        })
+    try:
+        result = _run_coords_analysis(data)
+        with span("serialize"):
+            return jsonify(result)
     except Exception as exc:
         logger.exception("Error in coordinate analysis")
         return jsonify({"error": str(exc)}), 500
 
 
+@app.route("/api/jobs/<job_id>", methods=["GET"])
+def job_status(job_id: str):
+    """Status of a background job; ``result`` is included once it is done.
+
+    Batch analysis jobs (``/api/analyze/batch``) are also reported here.
+    """
+    job = jobs.get_job_manager().get(job_id)
+    if job is not None:
+        return jsonify(job.to_dict())
+
+    batch = batch_analysis.get_batch_runner().get(job_id)
+    if batch is not None:
+        return jsonify(dict(batch.snapshot(), kind="batch"))
+    return jsonify({"error": f"Unknown or expired job: {job_id}"}), 404
+
+
+@app.route("/api/analyze/batch", methods=["POST"])
+def analyze_batch():
+    """Queue terrain screening for many parcels and return a job id.
+
+    Expects JSON body::
+
+        {
+            "pins": ["0538010100300", ...],   // and/or
+            "query": "OAK HILLS",             // parcel search (e.g. a SUBDIV)
+            "field": "subdivision",           // optional, default auto
+            "limit": 200,                     // optional, max parcels from the query
+            "max_slope": 15,                  // optional
+            "rank_by": "buildable_acres"      // or buildable_pct | earthwork
+        }
+
+    Poll ``GET /api/analyze/batch/<job_id>`` or stream
+    ``GET /api/analyze/batch/<job_id>/stream`` (server-sent events).
+    """
+
+    data = request.get_json(force=True)
+    try:
+        job = batch_analysis.get_batch_runner().submit(
+            pins=data.get("pins"),
+            query=data.get("query"),
+            field=data.get("field", "auto"),
+            limit=data.get("limit"),
+            max_slope=data.get("max_slope"),
+            buffer_distance=float(data.get("buffer_distance", 0.0005)),
+            rank_by=data.get("rank_by", "buildable_acres"),
+        )
+    except ValueError as exc:
+        return jsonify({"error": str(exc)}), 400
+
+    return jsonify({
+        "job_id": job.id,
+        "status": job.status,
+        "status_url": f"/api/analyze/batch/{job.id}",
+        "stream_url": f"/api/analyze/batch/{job.id}/stream",
+    }), 202
+
+
+@app.route("/api/analyze/batch/<job_id>", methods=["GET"])
+def analyze_batch_status(job_id: str):
+    """Progress and the ranked result table (partial until the job is done)."""
+
+    job = batch_analysis.get_batch_runner().get(job_id)
+    if job is None:
+        return jsonify({"error": f"Unknown batch job: {job_id}"}), 404
+    include_results = request.args.get("results", "true").lower() != "false"
+    return jsonify(job.snapshot(include_results=include_results))
+
+
+@app.route("/api/analyze/batch/<job_id>/stream", methods=["GET"])
+def analyze_batch_stream(job_id: str):
+    """Server-sent events: a ``progress`` event per change, then ``done`` with the ranked table.
+
+    Each open stream holds one request thread, so prefer polling when many
+    clients watch the same job.
+    """
+
+    job = batch_analysis.get_batch_runner().get(job_id)
+    if job is None:
+        return jsonify({"error": f"Unknown batch job: {job_id}"}), 404
+
+    def events():
+        version = -1
+        while True:
+            version = job.wait(version)
+            if job.is_finished:
+                yield f"event: done\ndata: {json.dumps(job.snapshot())}\n\n"
+                return
+            yield f"event: progress\ndata: {json.dumps(job.snapshot(include_results=False))}\n\n"
+
+    return Response(
+        stream_with_context(events()),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
 @app.route("/api/estimate/template", methods=["GET"])
 def get_estimate_template():
     """Return default sections and unit prices for the estimate form."""
@@ -322,6 +603,43 @@ def get_estimate_template():
     return jsonify(DEFAULT_SECTIONS)
 
 
+@app.route("/api/estimate/takeoff", methods=["POST"])
+def estimate_takeoff():
+    """Quantity takeoff and pricing for one or many scenarios.
+
+    Expects JSON with :func:`takeoff.compute_quantities` parameters; any of
+    them may be a list, and lists are broadcast against each other::
+
+        {
+            "acres": [20, 35, 50],
+            "lot_size_sf": 10000,
+            "public_sewer": true,
+            "sections": { ... },   // optional unit prices (default DEFAULT_SECTIONS)
+            "layout": { ... }      // optional lot layout summary (single scenario)
+        }
+
+    A single scenario returns the priced sections; several return the
+    quantity and cost arrays per item code.
+    """
+    data = request.get_json(force=True) or {}
+    if not isinstance(data, dict):
+        return jsonify({"error": "Expected a JSON object"}), 400
+    sections = data.pop("sections", None)
+    layout = data.pop("layout", None)
+    if "acres" not in data:
+        return jsonify({"error": "acres is required"}), 400
+    try:
+        takeoff.validate_params(data)
+        params = {**takeoff.layout_inputs(layout or {}), **{k: v for k, v in data.items() if v is not None}}
+        quantities = takeoff.compute_quantities(**params)
+    except (TypeError, ValueError) as exc:
+        return jsonify({"error": str(exc)}), 400
+
+    if quantities["W-5"].size == 1:
+        return jsonify(takeoff.summarize(quantities, sections))
+    return jsonify(takeoff.summarize_scenarios(quantities, sections))
+
+
 @app.route("/api/estimate/generate", methods=["POST"])
 def generate_estimate_post():
     """Generate an estimate workbook from user-provided data.
@@ -331,36 +649,46 @@ def generate_estimate_post():
             "project_name": "Pennington Ridge",
             "sections": { ... }   // same shape as DEFAULT_SECTIONS with user Qty values
         }
+
+    or, for several layouts / phases in one workbook with Comparison and
+    Delta sheets (a scenario without ``sections`` uses the top-level
+    ``sections``, default DEFAULT_SECTIONS)::
+
+        {
+            "project_name": "Pennington Ridge",
+            "scenarios": [{"name": "Layout A", "sections": { ... }}, ...]
+        }
     Returns the file as a download.
     """
-    import io
-    from estimate_workbook import generate_workbook
     from unit_prices import DEFAULT_SECTIONS
 
     data = request.get_json(force=True)
     project_name = data.get("project_name", "Untitled Project")
+    scenarios = data.get("scenarios")
+    if scenarios is not None and (not isinstance(scenarios, list) or not all(isinstance(sc, dict) for sc in scenarios)):
+        return jsonify({"error": "scenarios must be a list of {name, sections} objects"}), 400
     sections = data.get("sections", DEFAULT_SECTIONS)
-
-    # Generate to memory buffer
-    output_path = f"/tmp/{project_name.replace(' ', '_')}_Estimate.xlsx"
-    generate_workbook(output_path=output_path, project_name=project_name, sections=sections)
-
-    from flask import send_file
-    return send_file(output_path, as_attachment=True,
-                     download_name=f"{project_name.replace(' ', '_')}_Estimate.xlsx",
-                     mimetype="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet")
+    return _send_workbook(project_name, sections, f"{project_name.replace(' ', '_')}_Estimate.xlsx", scenarios)
 
 
 @app.route("/api/estimate", methods=["POST"])
 def generate_estimate():
     """Quick estimate with defaults. Returns download."""
-    from estimate_workbook import generate_workbook
     from unit_prices import DEFAULT_SECTIONS
-    output_path = "/tmp/Quick_Estimate.xlsx"
-    generate_workbook(output_path=output_path, project_name="Quick Estimate", sections=DEFAULT_SECTIONS)
-    from flask import send_file
-    return send_file(output_path, as_attachment=True,
-                     download_name="Quick_Estimate.xlsx",
+    return _send_workbook("Quick Estimate", DEFAULT_SECTIONS, "Quick_Estimate.xlsx")
+
+
+def _send_workbook(project_name: str, sections: dict, download_name: str, scenarios: list = None):
+    """Serve an estimate workbook from the content-addressed cache.
+
+    Workbooks are built in memory (no temp files); the cache key is sent as
+    the ETag so clients can tell identical estimates apart.
+    """
+    import io
+
+    key, data = estimate_workbook.get_workbook_cache().get_or_build(project_name, sections, scenarios)
+    return send_file(io.BytesIO(data), as_attachment=True,
+                     download_name=download_name, etag=key,
                      mimetype="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet")
 
 
@@ -381,7 +709,7 @@ def parcel_search():
     limit = min(int(request.args.get("limit", 25)), 100)
 
     try:
-        result = search_parcels(q, field=field, max_results=limit)
+        result = gcgis.search_parcels(q, field=field, max_results=limit)
         return jsonify(result)
     except Exception as exc:
         logger.exception("Parcel search error")
@@ -392,7 +720,7 @@ def parcel_search():
 def parcel_detail(pin):
     """Get a single parcel by PIN with geometry."""
     try:
-        parcel = get_parcel_by_pin(pin)
+        parcel = gcgis.get_parcel_by_pin(pin)
         return jsonify(parcel)
     except ValueError as exc:
         return jsonify({"error": str(exc)}), 404
@@ -411,8 +739,6 @@ def parcel_identify():
         width, height: map container size in pixels
         sw_lat, sw_lon, ne_lat, ne_lon: map bounds
     """
-    import requests as req
-
     lat = request.args.get("lat")
     lon = request.args.get("lon")
     if not lat or not lon:
@@ -425,37 +751,13 @@ def parcel_identify():
     width = request.args.get("width", "1000")
     height = request.args.get("height", "600")
 
-    identify_url = (
-        "https://www.gcgis.org/arcgis/rest/services/"
-        "GreenvilleJS/QueryLayers_JS/MapServer/identify"
-    )
-    params = {
-        "geometry": f"{lon},{lat}",
-        "geometryType": "esriGeometryPoint",
-        "sr": "4326",
-        "layers": "all:0",
-        "tolerance": "3",
-        "mapExtent": f"{sw_lon},{sw_lat},{ne_lon},{ne_lat}",
-        "imageDisplay": f"{width},{height},96",
-        "returnGeometry": "true",
-        "returnFieldName": "true",
-        "f": "json",
-    }
-
     try:
-        resp = req.get(identify_url, params=params, timeout=10)
-        resp.raise_for_status()
-        data = resp.json()
-
-        results = []
-        for r in data.get("results", []):
-            attr = r.get("attributes", {})
-            geom = r.get("geometry", {})
-            if geom and "rings" in geom:
-                attr["_geometry"] = {"type": "Polygon", "coordinates": geom["rings"]}
-            results.append(attr)
-
-        return jsonify({"count": len(results), "features": results})
+        result = gcgis.identify_parcel_at_point(
+            float(lat), float(lon),
+            map_extent=f"{sw_lon},{sw_lat},{ne_lon},{ne_lat}",
+            image_display=f"{width},{height},96",
+        )
+        return jsonify(result)
     except Exception as exc:
         logger.exception("Identify error")
         return jsonify({"error": str(exc)}), 500
@@ -472,7 +774,7 @@ def geocode():
     if not q:
         return jsonify({"error": "q parameter required"}), 400
     try:
-        results = geocode_address(q)
+        results = gcgis.geocode_address(q)
         return jsonify({"results": results})
     except Exception as exc:
         logger.exception("Geocode error")
@@ -666,101 +968,52 @@ def residential_proforma():
 @app.route("/api/residential-proforma/calculate", methods=["POST"])
 def residential_proforma_calculate():
     """Calculate residential development proforma."""
-    data = request.json
-    
-    # INPUTS
-    acres = float(data.get('acres', 10))
-    lot_count = int(data.get('lot_count', 50))
-    lot_price = float(data.get('lot_price', 75000))
-    land_cost_per_acre = float(data.get('land_cost_per_acre', 50000))
-    
-    # Hard costs (from estimate)
-    earthwork = float(data.get('earthwork', 0))
-    erosion_control = float(data.get('erosion_control', 0))
-    storm_drainage = float(data.get('storm_drainage', 0))
-    sanitary_sewer = float(data.get('sanitary_sewer', 0))
-    water = float(data.get('water', 0))
-    paving_concrete = float(data.get('paving_concrete', 0))
-    striping_signage = float(data.get('striping_signage', 0))
-    fencing_misc = float(data.get('fencing_misc', 0))
-    
-    # Soft costs
-    engineering = float(data.get('engineering', 0))
-    permits = float(data.get('permits', 0))
-    legal = float(data.get('legal', 0))
-    marketing = float(data.get('marketing', 0))
-    
-    # Sales & financing
-    sales_commission_pct = float(data.get('sales_commission_pct', 5.0))
-    construction_loan_rate = float(data.get('construction_loan_rate', 7.5))
-    development_months = int(data.get('development_months', 12))
-    sales_months = int(data.get('sales_months', 18))
-    lots_per_month = float(data.get('lots_per_month', 3))
-    
-    # CALCULATIONS
-    land_cost = acres * land_cost_per_acre
-    
-    hard_costs = (earthwork + erosion_control + storm_drainage + sanitary_sewer + 
-                  water + paving_concrete + striping_signage + fencing_misc)
-    
-    soft_costs = engineering + permits + legal + marketing
-    
-    total_development_cost = land_cost + hard_costs + soft_costs
-    
-    # Construction loan interest
-    avg_loan_balance = total_development_cost / 2
-    construction_interest = avg_loan_balance * (construction_loan_rate / 100) * (development_months / 12)
-    
-    total_cost_with_financing = total_development_cost + construction_interest
-    
-    # Revenue
-    gross_revenue = lot_count * lot_price
-    sales_commissions = gross_revenue * (sales_commission_pct / 100)
-    net_revenue = gross_revenue - sales_commissions
-    
-    # Profit
-    gross_profit = net_revenue - total_cost_with_financing
-    profit_margin = (gross_profit / net_revenue * 100) if net_revenue > 0 else 0
-    
-    cost_per_lot = total_cost_with_financing / lot_count if lot_count > 0 else 0
-    profit_per_lot = gross_profit / lot_count if lot_count > 0 else 0
-    
-    # ROI
-    roi = (gross_profit / total_cost_with_financing * 100) if total_cost_with_financing > 0 else 0
-    
-    # Timeline
-    total_months = development_months + sales_months
-    months_to_breakeven = 0
-    cumulative_cash = -total_development_cost
-    
-    for month in range(1, total_months + 1):
-        if month <= development_months:
-            cumulative_cash -= construction_interest / development_months
-        else:
-            month_revenue = lots_per_month * lot_price
-            month_commission = month_revenue * (sales_commission_pct / 100)
-            cumulative_cash += (month_revenue - month_commission)
-            
-            if cumulative_cash >= 0 and months_to_breakeven == 0:
-                months_to_breakeven = month
-    
-    return jsonify({
-        'land_cost': round(land_cost, 2),
-        'hard_costs': round(hard_costs, 2),
-        'soft_costs': round(soft_costs, 2),
-        'construction_interest': round(construction_interest, 2),
-        'total_cost': round(total_cost_with_financing, 2),
-        'gross_revenue': round(gross_revenue, 2),
-        'sales_commissions': round(sales_commissions, 2),
-        'net_revenue': round(net_revenue, 2),
-        'gross_profit': round(gross_profit, 2),
-        'profit_margin': round(profit_margin, 2),
-        'cost_per_lot': round(cost_per_lot, 2),
-        'profit_per_lot': round(profit_per_lot, 2),
-        'roi': round(roi, 2),
-        'months_to_breakeven': months_to_breakeven,
-        'total_months': total_months
-    })
+    data = request.json or {}
+    inputs = {name: data.get(name) for name in proforma.INPUT_DEFAULTS}
+    try:
+        result = proforma.calculate(**inputs)
+    except (TypeError, ValueError) as exc:
+        return jsonify({"error": str(exc)}), 400
+
+    out = {name: round(float(value), 2) for name, value in result.items()}
+    out["months_to_breakeven"] = int(result["months_to_breakeven"])
+    out["total_months"] = int(result["total_months"])
+    return jsonify(out)
+
+
+@app.route("/api/residential-proforma/sweep", methods=["POST"])
+def residential_proforma_sweep():
+    """Evaluate a grid of proforma scenarios in one pass.
+
+    Expects JSON::
+
+        {
+            "base": { ... },                      // calculate inputs held fixed
+            "axes": {
+                "lot_price": {"start": 60000, "stop": 90000, "steps": 7},
+                "lot_count": [40, 50, 60],
+                "timeline": [0.8, 1.0, 1.25]      // multiplier on dev + sales months
+            },
+            "metrics": ["gross_profit", "roi"],   // optional; first one drives best/tornado
+            "tornado": {"lot_price": [65000, 85000]},  // optional
+            "table": ["lot_price", "lot_count"]   // optional 2-D sensitivity axes
+        }
+    """
+    data = request.get_json(force=True) or {}
+    started = time.perf_counter()
+    try:
+        result = proforma.sweep(
+            base=data.get("base"),
+            axes=data.get("axes"),
+            metrics=data.get("metrics") or ("gross_profit", "profit_margin", "roi", "months_to_breakeven"),
+            tornado=data.get("tornado"),
+            tornado_pct=float(data.get("tornado_pct", 10.0)),
+            table=data.get("table"),
+        )
+    except (KeyError, TypeError, ValueError) as exc:
+        return jsonify({"error": str(exc)}), 400
+    result["elapsed_ms"] = round((time.perf_counter() - started) * 1000, 1)
+    return jsonify(result)
 
 
 if __name__ == "__main__":
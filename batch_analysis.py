@@ -0,0 +1,494 @@
+"""Batch terrain screening for many parcels (a PIN list or a parcel search).
+
+A :class:`BatchRunner` owns an in-process job queue and a dispatcher thread;
+no outside broker is needed.  For each job:
+
+1. Parcel geometry is resolved concurrently on a thread pool (local parcel
+   index first, GCGIS as fallback, see ``gcgis_fetcher``).
+2. Parcels whose buffered bounds touch the same DEM grid tiles are grouped,
+   and each group's DEM is fetched once on the thread pool, so a subdivision
+   of adjacent lots costs one download instead of one per lot.
+3. Each parcel's window is cropped from its group's DEM and analysed with
+   :class:`~analysis.terrain_analysis.TerrainAnalyzer`, clipped to the
+   parcel polygon, in a process pool.
+
+Progress is published on the job (``snapshot`` / ``wait``) so clients can poll
+or stream it, and the finished job carries one ranked result table.
+"""
+
+import logging
+import math
+import multiprocessing
+import queue
+import threading
+import time
+import uuid
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from config import config
+from metrics import span
+from data_fetchers.dem_cache import crop_to_bounds
+from data_fetchers.gcgis_fetcher import get_parcel_by_pin, search_parcels
+
+logger = logging.getLogger(__name__)
+
+SQM_PER_ACRE = 4046.8564224
+
+RANK_KEYS = {
+    # key -> (sort value, descending)
+    "buildable_acres": (lambda r: r["buildable_acres"], True),
+    "buildable_pct": (lambda r: r["buildable_pct"], True),
+    "earthwork": (lambda r: r["earthwork_cy_per_acre"], False),
+}
+
+Bounds = Tuple[float, float, float, float]
+
+
+# ----------------------------------------------------------------------
+# Per-parcel analysis (runs in worker processes)
+# ----------------------------------------------------------------------
+
+def analyze_window(
+    elevation: np.ndarray,
+    profile: dict,
+    geometry,
+    cell_size: float,
+    max_slope: float,
+) -> Dict:
+    """Screening metrics for one parcel, clipped to its polygon.
+
+    Module-level so it can be pickled into a :class:`ProcessPoolExecutor`.
+    """
+    from analysis.terrain_analysis import TerrainAnalyzer
+
+    analyzer, _ = TerrainAnalyzer.for_polygon(
+        elevation, profile, geometry, cell_size=cell_size, nodata=profile.get("nodata"),
+    )
+    buildable = analyzer.identify_buildable_areas(max_slope=max_slope)
+    cell_acres = cell_size ** 2 / SQM_PER_ACRE
+    buildable_acres = float(buildable.sum()) * cell_acres
+    clipped = analyzer.clipped_elevation
+
+    result = {
+        "elevation_min": _finite(np.nanmin(clipped)),
+        "elevation_max": _finite(np.nanmax(clipped)),
+        "slope_mean": _finite(analyzer.slope_statistics()["mean"], 2),
+        "buildable_pct": analyzer.buildable_percent(buildable),
+        "buildable_acres": round(buildable_acres, 3),
+        "pad_elevation": None,
+        "cut_cy": 0.0,
+        "fill_cy": 0.0,
+        "net_cy": 0.0,
+        "earthwork_cy_per_acre": float("inf"),
+    }
+    if buildable.any():
+        balanced = analyzer.pad_solver(buildable).solve("balanced")
+        result.update({
+            "pad_elevation": round(balanced["pad_elevation"], 2),
+            "cut_cy": balanced["cut_cy"],
+            "fill_cy": balanced["fill_cy"],
+            "net_cy": balanced["net_cy"],
+            "earthwork_cy_per_acre": round(
+                (balanced["cut_cy"] + balanced["fill_cy"]) / max(buildable_acres, 1e-9), 1
+            ),
+        })
+    return result
+
+
+def _finite(value, digits: Optional[int] = None) -> Optional[float]:
+    """*value* as a float, or None when it is NaN/inf (e.g. an all-nodata window)."""
+    value = float(value)
+    if not math.isfinite(value):
+        return None
+    return value if digits is None else round(value, digits)
+
+
+def _cell_size_m(profile: dict, bounds: Bounds) -> float:
+    """Pixel size in metres for a geographic (degree) raster."""
+    deg_size = abs(profile.get("transform", [1])[0])
+    mid_lat = (bounds[1] + bounds[3]) / 2.0
+    return deg_size * 111320 * math.cos(math.radians(mid_lat))
+
+
+# ----------------------------------------------------------------------
+# Parcels & DEM grouping
+# ----------------------------------------------------------------------
+
+def _parcel_record(attr: dict) -> Dict:
+    rings = (attr.get("_geometry") or {}).get("coordinates") or []
+    xs = [pt[0] for ring in rings for pt in ring]
+    ys = [pt[1] for ring in rings for pt in ring]
+    return {
+        "pin": attr.get("PIN"),
+        "owner": attr.get("OWNAM1"),
+        "address": attr.get("LOCATE"),
+        "subdivision": attr.get("SUBDIV"),
+        "acres": attr.get("GIS_ACRES") or attr.get("TACRES"),
+        "bounds": (min(xs), min(ys), max(xs), max(ys)) if xs else None,
+        "geometry": attr.get("_geometry"),
+    }
+
+
+def group_by_dem_tiles(
+    parcels: Sequence[Dict],
+    buffer_distance: float,
+    tile_deg: Optional[float] = None,
+    max_deg: Optional[float] = None,
+) -> List[Dict]:
+    """Group parcels whose buffered bounds touch the same DEM grid tiles.
+
+    Groups are greedily merged while their combined extent stays within
+    *max_deg* on each side, so one DEM request serves each group.
+
+    Returns:
+        List of ``{"bounds": (w, s, e, n), "parcels": [...]}``.
+    """
+    t = float(tile_deg or config.DEM_TILE_DEG)
+    max_deg = float(max_deg or config.BATCH_MAX_DEM_DEG)
+    groups: List[Dict] = []
+    for parcel in sorted(parcels, key=lambda p: (p["bounds"][1], p["bounds"][0])):
+        w, s, e, n = parcel["bounds"]
+        b = (w - buffer_distance, s - buffer_distance, e + buffer_distance, n + buffer_distance)
+        tiles = {
+            (ix, iy)
+            for ix in range(math.floor(b[0] / t), math.floor(b[2] / t) + 1)
+            for iy in range(math.floor(b[1] / t), math.floor(b[3] / t) + 1)
+        }
+        for group in groups:
+            if group["tiles"].isdisjoint(tiles):
+                continue
+            gb = group["bounds"]
+            merged = (min(gb[0], b[0]), min(gb[1], b[1]), max(gb[2], b[2]), max(gb[3], b[3]))
+            if merged[2] - merged[0] <= max_deg and merged[3] - merged[1] <= max_deg:
+                group["bounds"] = merged
+                group["tiles"] |= tiles
+                group["parcels"].append((parcel, b))
+                break
+        else:
+            groups.append({"bounds": b, "tiles": tiles, "parcels": [(parcel, b)]})
+    return groups
+
+
+# ----------------------------------------------------------------------
+# Jobs
+# ----------------------------------------------------------------------
+
+class BatchJob:
+    """State and progress of one batch request."""
+
+    def __init__(self, params: Dict):
+        self.id = uuid.uuid4().hex[:12]
+        self.params = params
+        self.status = "queued"
+        self.created = time.time()
+        self.started: Optional[float] = None
+        self.finished: Optional[float] = None
+        self.total = 0
+        self.error: Optional[str] = None
+        self.results: List[Dict] = []
+        self.version = 0
+        self._cond = threading.Condition()
+
+    def update(self, **fields) -> None:
+        with self._cond:
+            for key, value in fields.items():
+                setattr(self, key, value)
+            self.version += 1
+            self._cond.notify_all()
+
+    def add_result(self, row: Dict) -> None:
+        with self._cond:
+            self.results.append(row)
+            self.version += 1
+            self._cond.notify_all()
+
+    def wait(self, version: int, timeout: float = 15.0) -> int:
+        """Block until the job changes past *version* (or *timeout*); return the new version."""
+        with self._cond:
+            self._cond.wait_for(lambda: self.version > version or self.is_finished, timeout)
+            return self.version
+
+    @property
+    def is_finished(self) -> bool:
+        return self.status in ("done", "failed")
+
+    def ranked(self) -> List[Dict]:
+        """Completed rows sorted by the job's ``rank_by`` key; failed parcels last."""
+        value, descending = RANK_KEYS[self.params["rank_by"]]
+        with self._cond:
+            ok = [r for r in self.results if "error" not in r]
+            failed = [r for r in self.results if "error" in r]
+        ok.sort(key=value, reverse=descending)
+        rows = []
+        for rank, row in enumerate(ok + failed, start=1):
+            row = dict(row, rank=rank if "error" not in row else None)
+            if row.get("earthwork_cy_per_acre") == float("inf"):
+                row["earthwork_cy_per_acre"] = None  # no buildable area; keep JSON valid
+            rows.append(row)
+        return rows
+
+    def snapshot(self, include_results: bool = True) -> Dict:
+        with self._cond:
+            completed = len(self.results)
+            failed = sum(1 for r in self.results if "error" in r)
+            snap = {
+                "job_id": self.id,
+                "status": self.status,
+                "total": self.total,
+                "completed": completed,
+                "failed": failed,
+                "progress_pct": round(100.0 * completed / self.total, 1) if self.total else 0.0,
+                "created": self.created,
+                "started": self.started,
+                "finished": self.finished,
+                "elapsed_s": round((self.finished or time.time()) - (self.started or self.created), 2),
+                "error": self.error,
+                "params": self.params,
+            }
+        if include_results:
+            snap["results"] = self.ranked()
+        return snap
+
+
+class BatchRunner:
+    """In-process queue + thread pool (I/O) + process pool (analysis)."""
+
+    def __init__(
+        self,
+        fetch_threads: Optional[int] = None,
+        processes: Optional[int] = None,
+        max_jobs: Optional[int] = None,
+    ):
+        """
+        Args:
+            fetch_threads: Concurrent parcel/DEM fetches (``BATCH_FETCH_THREADS``).
+            processes: Analysis worker processes (``BATCH_PROCESSES``); 0 runs
+                each analysis synchronously on the dispatcher thread.
+            max_jobs: Jobs kept for polling; the oldest finished ones are dropped.
+        """
+        self.fetch_threads = fetch_threads or config.BATCH_FETCH_THREADS
+        self.processes = config.BATCH_PROCESSES if processes is None else processes
+        self.max_jobs = max_jobs or config.BATCH_MAX_JOBS
+        self._jobs: Dict[str, BatchJob] = {}
+        self._jobs_lock = threading.Lock()
+        self._queue: "queue.Queue[BatchJob]" = queue.Queue()
+        self._fetch_pool: Optional[ThreadPoolExecutor] = None
+        self._process_pool: Optional[ProcessPoolExecutor] = None
+        self._dispatcher: Optional[threading.Thread] = None
+        self._start_lock = threading.Lock()
+
+    # ------------------------------------------------------------------
+    # Public API
+    # ------------------------------------------------------------------
+
+    def submit(
+        self,
+        pins: Optional[Sequence[str]] = None,
+        query: Optional[str] = None,
+        field: str = "auto",
+        limit: Optional[int] = None,
+        max_slope: Optional[float] = None,
+        buffer_distance: float = 0.0005,
+        rank_by: str = "buildable_acres",
+    ) -> BatchJob:
+        """Queue a batch and return its job immediately.
+
+        Raises:
+            ValueError: On an empty request, too many PINs or an unknown ``rank_by``.
+        """
+        max_parcels = config.BATCH_MAX_PARCELS
+        pins = [str(p).strip() for p in (pins or []) if str(p).strip()]
+        if not pins and not (query and query.strip()):
+            raise ValueError("Provide 'pins' or 'query'")
+        if len(pins) > max_parcels:
+            raise ValueError(f"At most {max_parcels} parcels per batch (got {len(pins)})")
+        if rank_by not in RANK_KEYS:
+            raise ValueError(f"rank_by must be one of {sorted(RANK_KEYS)}")
+
+        job = BatchJob({
+            "pins": list(dict.fromkeys(pins)),
+            "query": (query or "").strip() or None,
+            "field": field,
+            "limit": min(int(limit or max_parcels), max_parcels),
+            "max_slope": float(max_slope if max_slope is not None else config.MAX_BUILDABLE_SLOPE),
+            "buffer_distance": float(buffer_distance),
+            "rank_by": rank_by,
+        })
+        self._ensure_started()
+        with self._jobs_lock:
+            self._jobs[job.id] = job
+            self._prune()
+        self._queue.put(job)
+        logger.info("Batch %s queued (%d pins, query=%r)", job.id, len(pins), job.params["query"])
+        return job
+
+    def get(self, job_id: str) -> Optional[BatchJob]:
+        with self._jobs_lock:
+            return self._jobs.get(job_id)
+
+    def stats(self) -> Dict:
+        with self._jobs_lock:
+            jobs = list(self._jobs.values())
+        return {
+            "queued": self._queue.qsize(),
+            "jobs": len(jobs),
+            "running": sum(1 for j in jobs if j.status == "running"),
+            "fetch_threads": self.fetch_threads,
+            "processes": self.processes,
+        }
+
+    # ------------------------------------------------------------------
+    # Worker side
+    # ------------------------------------------------------------------
+
+    def _ensure_started(self) -> None:
+        with self._start_lock:
+            if self._dispatcher is not None:
+                return
+            self._fetch_pool = ThreadPoolExecutor(self.fetch_threads, thread_name_prefix="batch-fetch")
+            if self.processes > 0:
+                self._process_pool = self._new_process_pool()
+            self._dispatcher = threading.Thread(target=self._dispatch, name="batch-dispatch", daemon=True)
+            self._dispatcher.start()
+
+    def _new_process_pool(self) -> ProcessPoolExecutor:
+        # spawn, not fork: the web process is multi-threaded
+        return ProcessPoolExecutor(self.processes, mp_context=multiprocessing.get_context("spawn"))
+
+    def _prune(self) -> None:
+        """Drop the oldest finished jobs beyond ``max_jobs`` (caller holds the lock)."""
+        finished = sorted((j for j in self._jobs.values() if j.is_finished), key=lambda j: j.created)
+        while len(self._jobs) > self.max_jobs and finished:
+            self._jobs.pop(finished.pop(0).id, None)
+
+    def _dispatch(self) -> None:
+        """Run queued jobs one at a time; each job fans out over the pools."""
+        while True:
+            job = self._queue.get()
+            try:
+                self._run(job)
+            except Exception as exc:
+                logger.exception("Batch %s failed", job.id)
+                job.update(status="failed", error=str(exc), finished=time.time())
+
+    def _run(self, job: BatchJob) -> None:
+        job.update(status="running", started=time.time())
+        params = job.params
+
+        parcels = self._resolve_parcels(job)
+        with_geometry = [p for p in parcels if p["bounds"] is not None]
+        for p in parcels:
+            if p["bounds"] is None:
+                job.add_result(dict(_public(p), error="No parcel geometry"))
+
+        groups = group_by_dem_tiles(with_geometry, params["buffer_distance"])
+        logger.info("Batch %s: %d parcels in %d DEM group(s)", job.id, len(with_geometry), len(groups))
+
+        dem_futures = {self._fetch_pool.submit(self._fetch_dem, g["bounds"]): g for g in groups}
+        analysis: List[Future] = []
+        for fut in as_completed(dem_futures):
+            group = dem_futures[fut]
+            try:
+                elevation, profile = fut.result()
+            except Exception as exc:
+                logger.warning("Batch %s: DEM fetch failed for %s: %s", job.id, group["bounds"], exc)
+                for parcel, _ in group["parcels"]:
+                    job.add_result(dict(_public(parcel), error=f"DEM fetch failed: {exc}"))
+                continue
+
+            for parcel, bounds in group["parcels"]:
+                window, window_profile = crop_to_bounds(elevation, profile, bounds)
+                args = (
+                    np.array(window),  # contiguous copy; pickled to the worker
+                    window_profile,
+                    parcel["geometry"],
+                    _cell_size_m(window_profile, bounds),
+                    params["max_slope"],
+                )
+                future = self._submit_analysis(args)
+                future.add_done_callback(lambda f, p=parcel: job.add_result(_row(p, f)))
+                analysis.append(future)
+
+        for future in analysis:
+            try:
+                future.result()
+            except Exception:
+                pass  # recorded on the row by the callback
+        job.update(status="done", finished=time.time())
+        logger.info("Batch %s done: %d parcels in %.1fs", job.id, job.total, job.finished - job.started)
+
+    def _resolve_parcels(self, job: BatchJob) -> List[Dict]:
+        params = job.params
+        parcels: List[Dict] = []
+        if params["query"]:
+            found = search_parcels(params["query"], field=params["field"], max_results=params["limit"])
+            parcels.extend(_parcel_record(attr) for attr in found["features"])
+
+        seen = {p["pin"] for p in parcels}
+        pins = [pin for pin in params["pins"] if pin not in seen]
+        job.update(total=len(parcels) + len(pins))
+
+        def fetch(pin: str) -> Dict:
+            try:
+                return _parcel_record(get_parcel_by_pin(pin))
+            except Exception as exc:
+                return {"pin": pin, "bounds": None, "lookup_error": str(exc)}
+
+        for record in self._fetch_pool.map(fetch, pins):
+            if record.get("lookup_error"):
+                job.add_result({"pin": record["pin"], "error": record["lookup_error"]})
+            else:
+                parcels.append(record)
+        return parcels
+
+    @staticmethod
+    def _fetch_dem(bounds: Bounds) -> Tuple[np.ndarray, dict]:
+        from data_fetchers.elevation_fetcher import ElevationFetcher
+        with span("dem_fetch"):
+            return ElevationFetcher().fetch_dem_for_parcel(bounds=bounds, buffer_distance=0.0)
+
+    def _submit_analysis(self, args: tuple) -> Future:
+        if self._process_pool is not None:
+            try:
+                return self._process_pool.submit(analyze_window, *args)
+            except BrokenProcessPool:
+                logger.warning("Analysis process pool died; starting a new one")
+                self._process_pool = self._new_process_pool()
+                return self._process_pool.submit(analyze_window, *args)
+        future: Future = Future()
+        try:
+            future.set_result(analyze_window(*args))
+        except Exception as exc:
+            future.set_exception(exc)
+        return future
+
+
+def _public(parcel: Dict) -> Dict:
+    return {k: parcel.get(k) for k in ("pin", "owner", "address", "subdivision", "acres")}
+
+
+def _row(parcel: Dict, future: Future) -> Dict:
+    row = _public(parcel)
+    try:
+        row.update(future.result())
+    except Exception as exc:
+        logger.warning("Analysis failed for %s: %s", parcel.get("pin"), exc)
+        row["error"] = str(exc)
+    return row
+
+
+_runner: Optional[BatchRunner] = None
+_runner_lock = threading.Lock()
+
+
+def get_batch_runner() -> BatchRunner:
+    """Return the process-wide batch runner (pools start on first submit)."""
+    global _runner
+    with _runner_lock:
+        if _runner is None:
+            _runner = BatchRunner()
+    return _runner
@@ -0,0 +1,75 @@
+"""Benchmark TerrainAnalyzer.identify_buildable_areas against raster size.
+
+Generates noisy synthetic terrain (many small flat patches, like a 1 m DEM)
+and times the vectorized region filter.  Time per megapixel should stay
+roughly constant as the raster grows.  With ``--compare`` the old per-region
+loop is timed as well on the smaller sizes.
+
+Usage:
+    python benchmarks/bench_buildable_areas.py [--sizes 500 1000 2000 4000] [--compare]
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+from scipy import ndimage
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from analysis.terrain_analysis import TerrainAnalyzer  # noqa: E402
+
+
+def synthetic_dem(size: int, seed: int = 0) -> np.ndarray:
+    """Rolling terrain plus per-cell noise so slope thresholds fragment into many regions."""
+    rng = np.random.default_rng(seed)
+    y, x = np.mgrid[0:size, 0:size].astype(np.float32)
+    base = 8.0 * np.sin(x / 40.0) * np.cos(y / 55.0)
+    return (300.0 + base + rng.normal(scale=0.35, size=(size, size))).astype(np.float32)
+
+
+def loop_filter(buildable: np.ndarray, min_cells: int) -> np.ndarray:
+    """The original O(regions × pixels) filter, kept for comparison."""
+    buildable = buildable.copy()
+    labelled, num_features = ndimage.label(buildable)
+    for region_id in range(1, num_features + 1):
+        region_mask = labelled == region_id
+        if region_mask.sum() < min_cells:
+            buildable[region_mask] = False
+    return buildable
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[500, 1000, 2000, 4000])
+    parser.add_argument("--compare", action="store_true", help="also time the old per-region loop")
+    args = parser.parse_args()
+
+    print(f"{'size':>6} {'Mpx':>7} {'regions':>8} {'filter s':>9} {'s/Mpx':>8} {'loop s':>9}")
+    for size in args.sizes:
+        analyzer = TerrainAnalyzer(synthetic_dem(size), cell_size=1.0)
+        analyzer.calculate_slope()  # exclude Sobel cost from the filter timing
+
+        start = time.perf_counter()
+        mask = analyzer.identify_buildable_areas(max_slope=15.0, min_area_sqft=50.0)
+        elapsed = time.perf_counter() - start
+
+        raw = analyzer.calculate_slope() <= 15.0
+        regions = ndimage.label(raw)[1]
+        mpx = size * size / 1e6
+
+        loop_s = ""
+        if args.compare and size <= 1000:
+            min_cells = max(1, int(50.0 / 10.7639))
+            start = time.perf_counter()
+            expected = loop_filter(raw, min_cells)
+            loop_s = f"{time.perf_counter() - start:9.3f}"
+            assert np.array_equal(expected, mask), "vectorized filter disagrees with loop"
+
+        print(f"{size:>6} {mpx:>7.2f} {regions:>8} {elapsed:>9.3f} {elapsed / mpx:>8.3f} {loop_s:>9}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""Cold-start budget for ``import app``.
+
+Imports the app in fresh interpreters (no warm bytecode beyond what is on
+disk), reports the median wall time and the slowest modules from
+``-X importtime``, and exits non-zero when the median exceeds the budget or
+a module that must stay lazy (numpy, scipy, shapely, requests, pandas,
+xlsxwriter) is imported eagerly.  Suitable as a CI step.
+
+Usage:
+    python benchmarks/bench_cold_start.py [--runs 5] [--budget-ms 750] [--top 10]
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+MUST_STAY_LAZY = ("numpy", "scipy", "shapely", "requests", "pandas", "xlsxwriter")
+
+PROBE = (
+    "import json, sys, time\n"
+    "t = time.perf_counter()\n"
+    "import app\n"
+    "ms = (time.perf_counter() - t) * 1000\n"
+    "print(json.dumps({'ms': ms, 'modules': sorted(m for m in sys.modules if '.' not in m)}))\n"
+)
+
+
+def cold_import(env: dict) -> dict:
+    out = subprocess.run(
+        [sys.executable, "-c", PROBE], cwd=REPO, env=env,
+        capture_output=True, text=True, check=True,
+    )
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def import_profile(env: dict, top: int) -> list:
+    """Slowest modules by cumulative import time (microseconds)."""
+    out = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import app"], cwd=REPO, env=env,
+        capture_output=True, text=True, check=True,
+    )
+    rows = []
+    for line in out.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        rows.append((int(cumulative_us), int(self_us), name.strip()))
+    rows.sort(reverse=True)
+    return rows[:top]
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--budget-ms", type=float, default=750.0)
+    parser.add_argument("--top", type=int, default=10)
+    args = parser.parse_args()
+
+    env = dict(os.environ, WARMUP_ENABLED="false", PYTHONDONTWRITEBYTECODE="1")
+    results = [cold_import(env) for _ in range(args.runs)]
+    times = [r["ms"] for r in results]
+    median = statistics.median(times)
+    eager = sorted(set(MUST_STAY_LAZY) & set(results[-1]["modules"]))
+
+    print(f"import app: median {median:.0f} ms over {args.runs} runs "
+          f"(min {min(times):.0f}, max {max(times):.0f}); budget {args.budget_ms:.0f} ms")
+    print(f"{'cumulative ms':>14} {'self ms':>8}  module")
+    for cumulative_us, self_us, name in import_profile(env, args.top):
+        print(f"{cumulative_us / 1000:14.1f} {self_us / 1000:8.1f}  {name}")
+
+    failed = False
+    if eager:
+        print(f"FAIL: imported eagerly, should be lazy: {', '.join(eager)}")
+        failed = True
+    if median > args.budget_ms:
+        print(f"FAIL: cold start {median:.0f} ms exceeds budget {args.budget_ms:.0f} ms")
+        failed = True
+    if not failed:
+        print("OK")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
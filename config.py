@@ -6,7 +6,8 @@ development standards, cost parameters, and API credentials.
 """
 
 import os
-from typing import Dict, Any
+import tempfile
+from typing import Any, Dict, Optional
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -26,6 +27,7 @@ class Config:
     MAX_FILL_DEPTH_FT: float = 10.0
     SOIL_SWELL_FACTOR: float = 1.25  # cut material expands ~25%
     SOIL_SHRINK_FACTOR: float = 0.90  # fill material compacts ~10%
+    TERRAIN_DTYPE: str = os.getenv("TERRAIN_DTYPE", "float32")  # analysis precision
 
     # --- Lot / Subdivision Standards ---
     MIN_LOT_SIZE: float = 0.25  # acres
@@ -33,6 +35,7 @@ class Config:
     ROAD_WIDTH: float = 30.0  # feet (back-of-curb to back-of-curb)
     ROW_WIDTH: float = 50.0  # feet (right-of-way)
     CUL_DE_SAC_RADIUS: float = 45.0  # feet
+    LOT_SLIVER_SQFT: float = float(os.getenv("LOT_SLIVER_SQFT", "500"))  # clipped lot pieces below this are dropped
 
     # --- Setbacks (feet) ---
     SETBACK_FRONT: float = 25.0
@@ -62,10 +65,65 @@ class Config:
     OPENTOPO_BASE_URL: str = "https://portal.opentopography.org/API"
     OPENTOPOGRAPHY_BASE_URL: str = "https://portal.opentopography.org/API"
 
+    # --- DEM Cache ---
+    DEM_CACHE_ENABLED: bool = os.getenv("DEM_CACHE_ENABLED", "true").lower() == "true"
+    DEM_CACHE_DIR: str = os.getenv(
+        "DEM_CACHE_DIR", os.path.join(tempfile.gettempdir(), "landtakeoffs_dem_cache")
+    )
+    DEM_CACHE_MAX_MB: float = float(os.getenv("DEM_CACHE_MAX_MB", "512"))
+    DEM_TILE_DEG: float = float(os.getenv("DEM_TILE_DEG", "0.05"))  # SRTM tile grid
+    DEM_STREAM_DOWNLOAD: bool = os.getenv("DEM_STREAM_DOWNLOAD", "true").lower() == "true"
+    DEM_DOWNLOAD_CHUNK_BYTES: int = int(os.getenv("DEM_DOWNLOAD_CHUNK_BYTES", str(1024 * 1024)))
+    DEM_FETCH_DEADLINE_S: float = float(os.getenv("DEM_FETCH_DEADLINE_S", "30"))  # retry window for globaldem
+    DEM_TEMP_DIR: Optional[str] = os.getenv("DEM_TEMP_DIR") or None  # None = system temp dir
+
+    # --- Upstream HTTP (gcgis.org, Regrid, OpenTopography) ---
+    HTTP_POOL_CONNECTIONS: int = int(os.getenv("HTTP_POOL_CONNECTIONS", "4"))
+    HTTP_POOL_MAXSIZE: int = int(os.getenv("HTTP_POOL_MAXSIZE", "8"))
+    HTTP_RETRIES: int = int(os.getenv("HTTP_RETRIES", "3"))
+    HTTP_BACKOFF: float = float(os.getenv("HTTP_BACKOFF", "0.5"))  # seconds, doubles per retry
+    HTTP_TIMEOUT_S: float = float(os.getenv("HTTP_TIMEOUT_S", "30"))
+    HTTP_DEADLINE_S: float = float(os.getenv("HTTP_DEADLINE_S", "60"))  # no retries start after this
+    HTTP_CIRCUIT_FAILURES: int = int(os.getenv("HTTP_CIRCUIT_FAILURES", "5"))
+    HTTP_CIRCUIT_RESET_S: float = float(os.getenv("HTTP_CIRCUIT_RESET_S", "30"))
+
+    # --- GCGIS Response Cache ---
+    GCGIS_CACHE_ENABLED: bool = os.getenv("GCGIS_CACHE_ENABLED", "true").lower() == "true"
+    GCGIS_CACHE_TTL_S: float = float(os.getenv("GCGIS_CACHE_TTL_S", "21600"))  # 6 h
+    GCGIS_CACHE_MAX_ENTRIES: int = int(os.getenv("GCGIS_CACHE_MAX_ENTRIES", "5000"))
+    GCGIS_CACHE_MAX_MB: float = float(os.getenv("GCGIS_CACHE_MAX_MB", "64"))
+    GCGIS_CACHE_DB: str = os.getenv("GCGIS_CACHE_DB", "")  # SQLite path; empty = memory only
+    GCGIS_IDENTIFY_PRECISION: int = int(os.getenv("GCGIS_IDENTIFY_PRECISION", "5"))  # decimal places
+
+    # --- Local Parcel Index ---
+    PARCEL_INDEX_DB: str = os.getenv("PARCEL_INDEX_DB", "")  # SQLite path; empty = remote lookups only
+    PARCEL_INDEX_PAGE_SIZE: int = int(os.getenv("PARCEL_INDEX_PAGE_SIZE", "1000"))
+
+    # --- Batch Analysis ---
+    BATCH_MAX_PARCELS: int = int(os.getenv("BATCH_MAX_PARCELS", "500"))
+    BATCH_FETCH_THREADS: int = int(os.getenv("BATCH_FETCH_THREADS", "4"))
+    BATCH_PROCESSES: int = int(os.getenv("BATCH_PROCESSES", str(min(2, os.cpu_count() or 1))))  # 0 = on the dispatcher thread
+    BATCH_MAX_DEM_DEG: float = float(os.getenv("BATCH_MAX_DEM_DEG", "0.1"))  # largest shared DEM window
+    BATCH_MAX_JOBS: int = int(os.getenv("BATCH_MAX_JOBS", "50"))  # finished jobs kept for polling
+
+    # --- Background Jobs ---
+    JOBS_MAX_WORKERS: int = int(os.getenv("JOBS_MAX_WORKERS", "2"))
+    JOBS_MAX_PENDING: int = int(os.getenv("JOBS_MAX_PENDING", "20"))
+    JOBS_RESULT_TTL_S: float = float(os.getenv("JOBS_RESULT_TTL_S", "3600"))
+
+    # --- Estimate workbooks ---
+    ESTIMATE_CACHE_MAX_ENTRIES: int = int(os.getenv("ESTIMATE_CACHE_MAX_ENTRIES", "64"))
+    ESTIMATE_CACHE_MAX_MB: float = float(os.getenv("ESTIMATE_CACHE_MAX_MB", "32"))
+
+    # --- Proforma sweeps ---
+    PROFORMA_SWEEP_MAX_SCENARIOS: int = int(os.getenv("PROFORMA_SWEEP_MAX_SCENARIOS", "250000"))
+
     # --- Flask ---
     FLASK_HOST: str = os.getenv("FLASK_HOST", "0.0.0.0")
     FLASK_PORT: int = int(os.getenv("FLASK_PORT", "5000"))
     FLASK_DEBUG: bool = os.getenv("FLASK_DEBUG", "false").lower() == "true"
+    SERVER_TIMING_ENABLED: bool = os.getenv("SERVER_TIMING_ENABLED", "false").lower() == "true"  # per-request Server-Timing header
+    WARMUP_ENABLED: bool = os.getenv("WARMUP_ENABLED", "true").lower() == "true"  # background imports per worker
 
     # --- Output ---
     OUTPUT_DIR: str = os.getenv("OUTPUT_DIR", os.path.dirname(os.path.abspath(__file__)))
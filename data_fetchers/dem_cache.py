@@ -0,0 +1,269 @@
+"""Persistent on-disk DEM cache with LRU eviction.
+
+The world is divided into a fixed degree grid (``DEM_TILE_DEG``); each grid
+cell is one cache entry, stored as a memory-mappable ``.npy`` array next to a
+small JSON sidecar holding the raster profile (width, height, affine
+transform).  ``data_fetchers.dem_mosaic`` stitches tiles back together for
+arbitrary bounding boxes.
+
+Entries are content-addressed by a hash of the DEM type and the tile
+bounds.  Access time is tracked through the file mtime, so the LRU order
+survives restarts without a separate index.
+"""
+
+import hashlib
+import json
+import logging
+import math
+import os
+import threading
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+
+from config import config
+
+logger = logging.getLogger(__name__)
+
+Bounds = Tuple[float, float, float, float]
+
+
+class DEMTileCache:
+    """Content-addressed ``.npy`` cache for decoded DEM rasters."""
+
+    def __init__(
+        self,
+        cache_dir: Optional[str] = None,
+        max_bytes: Optional[int] = None,
+        tile_deg: Optional[float] = None,
+    ):
+        """
+        Args:
+            cache_dir: Directory holding cached rasters (created if missing).
+            max_bytes: Size cap; least-recently-used entries are evicted past it.
+            tile_deg: Grid spacing (degrees) that request bounds are snapped to.
+        """
+        self.cache_dir = cache_dir or config.DEM_CACHE_DIR
+        self.max_bytes = int(max_bytes if max_bytes is not None else config.DEM_CACHE_MAX_MB * 1024 * 1024)
+        self.tile_deg = float(tile_deg or config.DEM_TILE_DEG)
+        self._lock = threading.Lock()
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    # ------------------------------------------------------------------
+    # Keys & grid
+    # ------------------------------------------------------------------
+
+    def snap_bounds(self, bounds: Bounds) -> Bounds:
+        """Expand (west, south, east, north) outward to the tile grid."""
+        west, south, east, north = bounds
+        t = self.tile_deg
+        # Round before floor/ceil so float noise doesn't add a spurious tile
+        snap_down = lambda v: math.floor(round(v / t, 9)) * t  # noqa: E731
+        snap_up = lambda v: math.ceil(round(v / t, 9)) * t  # noqa: E731
+        return (
+            round(snap_down(west), 9),
+            round(snap_down(south), 9),
+            round(snap_up(east), 9),
+            round(snap_up(north), 9),
+        )
+
+    def tiles_for_bounds(self, bounds: Bounds) -> list:
+        """Return the (ix, iy) grid indices of every tile intersecting *bounds*."""
+        west, south, east, north = self.snap_bounds(bounds)
+        t = self.tile_deg
+        ix0, ix1 = int(round(west / t)), int(round(east / t))
+        iy0, iy1 = int(round(south / t)), int(round(north / t))
+        return [(ix, iy) for iy in range(iy0, max(iy1, iy0 + 1)) for ix in range(ix0, max(ix1, ix0 + 1))]
+
+    def tile_bounds(self, ix: int, iy: int) -> Bounds:
+        """Return the (west, south, east, north) extent of grid tile (ix, iy)."""
+        t = self.tile_deg
+        return (round(ix * t, 9), round(iy * t, 9), round((ix + 1) * t, 9), round((iy + 1) * t, 9))
+
+    def tile_key(self, dem_type: str, ix: int, iy: int) -> str:
+        return self.make_key(dem_type, self.tile_bounds(ix, iy))
+
+    @staticmethod
+    def make_key(dem_type: str, bounds: Bounds) -> str:
+        """Hash a DEM type + snapped bounds into a stable cache key."""
+        payload = f"{dem_type}|" + "|".join(f"{v:.9f}" for v in bounds)
+        return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+    def _paths(self, key: str) -> Tuple[str, str]:
+        base = os.path.join(self.cache_dir, key)
+        return base + ".npy", base + ".json"
+
+    # ------------------------------------------------------------------
+    # Get / Put
+    # ------------------------------------------------------------------
+
+    def get(self, key: str) -> Optional[Tuple[np.ndarray, dict]]:
+        """Return a memory-mapped (elevation, profile) for *key*, or None."""
+        npy_path, meta_path = self._paths(key)
+        try:
+            with open(meta_path, "r", encoding="utf-8") as f:
+                profile = json.load(f)
+            elevation = np.load(npy_path, mmap_mode="r")
+        except (OSError, ValueError):
+            return None
+
+        # Touch both files so eviction sees this entry as recently used
+        try:
+            os.utime(npy_path, None)
+            os.utime(meta_path, None)
+        except OSError:
+            pass
+        return elevation, profile
+
+    def put(self, key: str, elevation: np.ndarray, profile: dict, evict: bool = True) -> None:
+        """Persist a decoded raster and evict old entries if over the cap.
+
+        Pass ``evict=False`` when storing a batch of tiles and call
+        :meth:`evict` once afterwards.
+        """
+        npy_path, meta_path = self._paths(key)
+        tmp_npy = f"{npy_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        tmp_meta = f"{meta_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp_npy, "wb") as f:
+                np.save(f, elevation)
+            with open(tmp_meta, "w", encoding="utf-8") as f:
+                json.dump(self.serializable_profile(profile), f)
+            # Metadata lands last: an entry is only visible once both exist
+            os.replace(tmp_npy, npy_path)
+            os.replace(tmp_meta, meta_path)
+        except OSError as exc:
+            logger.warning("DEM cache write failed for %s: %s", key, exc)
+            for p in (tmp_npy, tmp_meta):
+                if os.path.exists(p):
+                    os.remove(p)
+            return
+        if evict:
+            self.evict()
+
+    @staticmethod
+    def serializable_profile(profile: dict) -> dict:
+        """Reduce a raster profile to the JSON-safe keys the app relies on."""
+        transform = profile.get("transform")
+        if transform is not None:
+            transform = [float(v) for v in tuple(transform)[:6]]
+        out = {
+            "width": int(profile.get("width", 0)),
+            "height": int(profile.get("height", 0)),
+            "transform": transform,
+        }
+        nodata = profile.get("nodata")
+        if nodata is not None:
+            out["nodata"] = float(nodata)
+        return out
+
+    # ------------------------------------------------------------------
+    # Eviction
+    # ------------------------------------------------------------------
+
+    def _entries(self) -> list:
+        """List (mtime, size, key) for every complete entry."""
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            if not name.endswith(".npy"):
+                continue
+            key = name[:-4]
+            npy_path, meta_path = self._paths(key)
+            try:
+                st = os.stat(npy_path)
+                size = st.st_size + os.path.getsize(meta_path)
+            except OSError:
+                continue
+            entries.append((st.st_mtime, size, key))
+        return entries
+
+    def total_bytes(self) -> int:
+        return sum(size for _, size, _ in self._entries())
+
+    def evict(self) -> None:
+        with self._lock:
+            entries = self._entries()
+            total = sum(size for _, size, _ in entries)
+            if total <= self.max_bytes:
+                return
+            entries.sort()  # oldest mtime first
+            for _, size, key in entries:
+                if total <= self.max_bytes:
+                    break
+                for p in self._paths(key):
+                    try:
+                        os.remove(p)
+                    except OSError:
+                        pass
+                total -= size
+                logger.info("DEM cache evicted %s (%.1f KB)", key, size / 1024.0)
+
+    def stats(self) -> Dict[str, float]:
+        entries = self._entries()
+        return {
+            "entries": len(entries),
+            "bytes": sum(size for _, size, _ in entries),
+            "max_bytes": self.max_bytes,
+            "tile_deg": self.tile_deg,
+        }
+
+
+def crop_to_bounds(
+    elevation: np.ndarray,
+    profile: dict,
+    bounds: Bounds,
+    partition: bool = False,
+) -> Tuple[np.ndarray, dict]:
+    """Crop a north-up raster to *bounds*, returning a view and adjusted profile.
+
+    By default the window is expanded outward to whole pixels so the
+    requested area is fully covered.  With ``partition=True`` edges are
+    rounded to the nearest pixel boundary instead, so adjacent bounds split a
+    raster into non-overlapping windows (used when cutting grid tiles).  The
+    returned transform is the source transform shifted to the window origin,
+    keeping cell size exact.
+    """
+    west, south, east, north = bounds
+    a, _, c, _, e, f = [float(v) for v in tuple(profile["transform"])[:6]]
+    height, width = elevation.shape[:2]
+
+    if partition:
+        lo = hi = lambda v: int(math.floor(v + 0.5))  # noqa: E731
+    else:
+        eps = 1e-6
+        lo = lambda v: int(math.floor(v + eps))  # noqa: E731
+        hi = lambda v: int(math.ceil(v - eps))  # noqa: E731
+    col0 = max(0, lo((west - c) / a))
+    col1 = min(width, hi((east - c) / a))
+    row0 = max(0, lo((north - f) / e))
+    row1 = min(height, hi((south - f) / e))
+    col1 = max(col1, col0 + 1)
+    row1 = max(row1, row0 + 1)
+
+    window = elevation[row0:row1, col0:col1]
+    cropped = dict(profile)
+    cropped.update({
+        "width": int(window.shape[1]),
+        "height": int(window.shape[0]),
+        "transform": [a, 0.0, c + col0 * a, 0.0, e, f + row0 * e],
+    })
+    return window, cropped
+
+
+_default_cache: Optional[DEMTileCache] = None
+_default_lock = threading.Lock()
+
+
+def get_default_cache() -> Optional[DEMTileCache]:
+    """Return the process-wide cache, or None when caching is disabled."""
+    global _default_cache
+    if not config.DEM_CACHE_ENABLED:
+        return None
+    with _default_lock:
+        if _default_cache is None:
+            try:
+                _default_cache = DEMTileCache()
+            except OSError as exc:
+                logger.warning("DEM cache unavailable (%s); continuing without it", exc)
+                return None
+    return _default_cache
@@ -0,0 +1,147 @@
+"""Serve arbitrary DEM bounding boxes by mosaicking cached grid tiles.
+
+Only tiles missing from the :class:`~data_fetchers.dem_cache.DEMTileCache`
+are downloaded.  Missing tiles are grouped into rectangles so that a block of
+adjacent gaps costs one request, the response is cut into grid tiles and
+stored, and the requested window is stitched together and cropped with an
+exact affine transform.
+"""
+
+import logging
+from typing import Callable, Dict, List, Tuple
+
+import numpy as np
+
+from data_fetchers.dem_cache import Bounds, DEMTileCache, crop_to_bounds
+
+logger = logging.getLogger(__name__)
+
+# download(west, south, east, north, dem_type) -> (elevation, profile)
+Downloader = Callable[[float, float, float, float, str], Tuple[np.ndarray, dict]]
+
+Tile = Tuple[int, int]
+
+
+class DEMMosaic:
+    """Tile-backed DEM source that only downloads areas it has not seen."""
+
+    def __init__(self, cache: DEMTileCache, download: Downloader):
+        """
+        Args:
+            cache: Tile cache used for lookups and storage.
+            download: Callable fetching a raster for a (w, s, e, n) box.
+        """
+        self.cache = cache
+        self.download = download
+
+    def fetch(self, bounds: Bounds, dem_type: str = "SRTMGL1") -> Tuple[np.ndarray, dict]:
+        """Return the DEM window covering *bounds* and its raster profile."""
+        tiles = self.cache.tiles_for_bounds(bounds)
+        loaded: Dict[Tile, Tuple[np.ndarray, dict]] = {}
+        missing: List[Tile] = []
+
+        for ix, iy in tiles:
+            hit = self.cache.get(self.cache.tile_key(dem_type, ix, iy))
+            if hit is None:
+                missing.append((ix, iy))
+            else:
+                loaded[(ix, iy)] = hit
+
+        logger.info(
+            "DEM mosaic (%s): %d tile(s) requested, %d cached, %d to download",
+            dem_type, len(tiles), len(loaded), len(missing),
+        )
+
+        for block in self._group_rectangles(missing):
+            loaded.update(self._download_block(block, dem_type))
+        if missing:
+            self.cache.evict()
+
+        elevation, profile = self._stitch([loaded[t] for t in tiles if t in loaded])
+        return crop_to_bounds(elevation, profile, bounds)
+
+    # ------------------------------------------------------------------
+    # Download & split
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def _group_rectangles(missing: List[Tile]) -> List[Tuple[int, int, int, int]]:
+        """Greedily merge missing tiles into (ix0, iy0, ix1, iy1) rectangles (inclusive)."""
+        remaining = set(missing)
+        rects = []
+        for ix, iy in sorted(missing, key=lambda t: (t[1], t[0])):
+            if (ix, iy) not in remaining:
+                continue
+            ix1 = ix
+            while (ix1 + 1, iy) in remaining:
+                ix1 += 1
+            iy1 = iy
+            while all((x, iy1 + 1) in remaining for x in range(ix, ix1 + 1)):
+                iy1 += 1
+            for y in range(iy, iy1 + 1):
+                for x in range(ix, ix1 + 1):
+                    remaining.discard((x, y))
+            rects.append((ix, iy, ix1, iy1))
+        return rects
+
+    def _download_block(self, block: Tuple[int, int, int, int], dem_type: str) -> Dict[Tile, Tuple[np.ndarray, dict]]:
+        """Download one rectangle of tiles and store each tile in the cache."""
+        ix0, iy0, ix1, iy1 = block
+        west, south, _, _ = self.cache.tile_bounds(ix0, iy0)
+        _, _, east, north = self.cache.tile_bounds(ix1, iy1)
+        elevation, profile = self.download(west, south, east, north, dem_type)
+        profile = DEMTileCache.serializable_profile(profile)
+
+        tiles = {}
+        for iy in range(iy0, iy1 + 1):
+            for ix in range(ix0, ix1 + 1):
+                window, tile_profile = crop_to_bounds(
+                    elevation, profile, self.cache.tile_bounds(ix, iy), partition=True,
+                )
+                key = self.cache.tile_key(dem_type, ix, iy)
+                self.cache.put(key, window, tile_profile, evict=False)
+                # Re-open from disk so only one tile is held in memory at a time
+                tiles[(ix, iy)] = self.cache.get(key) or (np.array(window), tile_profile)
+        return tiles
+
+    # ------------------------------------------------------------------
+    # Stitch
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def _stitch(parts: List[Tuple[np.ndarray, dict]]) -> Tuple[np.ndarray, dict]:
+        """Paste tiles into one north-up canvas on the first tile's pixel grid."""
+        if not parts:
+            raise RuntimeError("No DEM tiles available for the requested area")
+        if len(parts) == 1:
+            return parts[0]
+
+        a, _, _, _, e, _ = parts[0][1]["transform"]
+        placed = []
+        for arr, prof in parts:
+            _, _, c, _, _, f = prof["transform"]
+            placed.append((arr, c, f))
+
+        west = min(c for _, c, _ in placed)
+        north = max(f for _, _, f in placed)
+        offsets = [
+            (int(round((north - f) / -e)), int(round((c - west) / a)), arr)
+            for arr, c, f in placed
+        ]
+        height = max(r + arr.shape[0] for r, _, arr in offsets)
+        width = max(col + arr.shape[1] for _, col, arr in offsets)
+
+        dtype = np.result_type(*[arr.dtype for _, _, arr in offsets])
+        fill = np.nan if np.issubdtype(dtype, np.floating) else parts[0][1].get("nodata", 0)
+        canvas = np.full((height, width), fill, dtype=dtype)
+        for r, col, arr in offsets:
+            canvas[r:r + arr.shape[0], col:col + arr.shape[1]] = arr
+
+        profile = {
+            "width": width,
+            "height": height,
+            "transform": [a, 0.0, west, 0.0, e, north],
+        }
+        if "nodata" in parts[0][1]:
+            profile["nodata"] = parts[0][1]["nodata"]
+        return canvas, profile
@@ -2,18 +2,25 @@
 
 import io
 import logging
-import struct
+import mmap
+import os
+import tempfile
 from typing import Dict, Optional, Tuple
 
 import numpy as np
 
 from config import config
+from metrics import span
+from data_fetchers.dem_cache import DEMTileCache, get_default_cache
+from data_fetchers.dem_mosaic import DEMMosaic
+from data_fetchers.geotiff import decode_geotiff, is_tiff_header
 
 logger = logging.getLogger(__name__)
 
 try:
     import rasterio
     from rasterio.io import MemoryFile
+    from rasterio.windows import Window, from_bounds
     HAS_RASTERIO = True
 except ImportError:
     HAS_RASTERIO = False
@@ -27,6 +34,7 @@ except ImportError:
 
 try:
     import requests
+    from data_fetchers import http_client
 except ImportError:
     requests = None
 
@@ -34,9 +42,17 @@ except ImportError:
 class ElevationFetcher:
     """Download and analyse DEM rasters from OpenTopography."""
 
-    def __init__(self, api_key: Optional[str] = None):
+    def __init__(
+        self,
+        api_key: Optional[str] = None,
+        cache: Optional[DEMTileCache] = None,
+        stream: Optional[bool] = None,
+    ):
         self.api_key = api_key or config.OPENTOPOGRAPHY_API_KEY
         self.base_url = config.OPENTOPOGRAPHY_BASE_URL
+        self.stream = config.DEM_STREAM_DOWNLOAD if stream is None else stream
+        self.cache = cache if cache is not None else get_default_cache()
+        self.mosaic = DEMMosaic(self.cache, self._download_dem) if self.cache is not None else None
 
     def fetch_dem_for_parcel(
         self,
@@ -46,6 +62,9 @@ class ElevationFetcher:
     ) -> Tuple[np.ndarray, dict]:
         """Download a DEM raster covering the given WGS-84 bounding box.
 
+        When the DEM cache is enabled the window is assembled from cached
+        grid tiles; only tiles not yet on disk are downloaded.
+
         Returns:
             Tuple of (elevation_array, raster_profile).
         """
@@ -55,6 +74,14 @@ class ElevationFetcher:
         east += buffer_distance
         north += buffer_distance
 
+        if self.mosaic is None:
+            return self._download_dem(west, south, east, north, dem_type)
+        return self.mosaic.fetch((west, south, east, north), dem_type)
+
+    def _download_dem(
+        self, west: float, south: float, east: float, north: float, dem_type: str,
+    ) -> Tuple[np.ndarray, dict]:
+        """Request a GeoTIFF from OpenTopography ``globaldem`` and decode it."""
         logger.info(
             "Fetching DEM (%s) for bounds: W=%.5f S=%.5f E=%.5f N=%.5f",
             dem_type, west, south, east, north,
@@ -74,7 +101,14 @@ class ElevationFetcher:
         if requests is None:
             raise RuntimeError("requests library is required")
 
-        response = requests.get(url, params=params, timeout=120)
+        # One slow download must not be repeated: read timeouts are never
+        # retried, and connect/5xx retries stop after DEM_FETCH_DEADLINE_S.
+        deadline = config.DEM_FETCH_DEADLINE_S
+        if self.stream:
+            with http_client.get(url, params=params, timeout=120, deadline=deadline, stream=True) as response:
+                return self._stream_to_disk(response, west, south, east, north)
+
+        response = http_client.get(url, params=params, timeout=120, deadline=deadline)
 
         # Check for API errors (OpenTopography returns HTML/text on errors)
         ct = response.headers.get('content-type', '')
@@ -88,27 +122,127 @@ class ElevationFetcher:
                          len(response.content), response.text[:200])
             raise RuntimeError("OpenTopography returned empty/invalid DEM data")
 
+        return self._parse_geotiff(response.content, west, south, east, north)
+
+    def _stream_to_disk(self, response, west, south, east, north) -> Tuple[np.ndarray, dict]:
+        """Write a streamed GeoTIFF response to a temp file and decode it from disk.
+
+        The TIFF signature is checked on the first bytes so HTML/text error
+        bodies are rejected before anything is written.  Peak memory is one
+        download chunk plus the decoded array, which itself is disk-backed
+        when the built-in decoder is used.
+        """
+        chunks = response.iter_content(chunk_size=config.DEM_DOWNLOAD_CHUNK_BYTES)
+        head = b""
+        for chunk in chunks:
+            head += chunk
+            if len(head) >= 8:
+                break
+
+        if response.status_code != 200 or not is_tiff_header(head):
+            ct = response.headers.get('content-type', '')
+            body = head[:500].decode("utf-8", "replace")
+            logger.error("OpenTopography error: status=%s, content-type=%s, body=%s",
+                         response.status_code, ct, body)
+            raise RuntimeError(f"OpenTopography API error: {body[:200]}")
+
+        fd, path = tempfile.mkstemp(prefix="dem_", suffix=".tif", dir=config.DEM_TEMP_DIR)
+        try:
+            nbytes = len(head)
+            with os.fdopen(fd, "wb") as f:
+                f.write(head)
+                for chunk in chunks:
+                    f.write(chunk)
+                    nbytes += len(chunk)
+
+            if nbytes < 100:
+                logger.error("OpenTopography returned tiny response (%d bytes)", nbytes)
+                raise RuntimeError("OpenTopography returned empty/invalid DEM data")
+            logger.info("DEM streamed to disk: %.1f MB", nbytes / 1e6)
+            return self._parse_geotiff_file(path, west, south, east, north)
+        finally:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    @span("dem_parse")
+    def _parse_geotiff_file(self, path: str, west, south, east, north) -> Tuple[np.ndarray, dict]:
+        """Decode a GeoTIFF on disk without loading the whole file into memory.
+
+        rasterio reads only the requested window.  Otherwise the file is
+        memory-mapped and decoded into a disk-backed ``numpy.memmap``.
+        """
         if HAS_RASTERIO:
-            return self._parse_with_rasterio(response.content)
-        elif HAS_PILLOW:
-            return self._parse_with_pillow(response.content, west, south, east, north)
-        else:
-            return self._parse_geotiff_minimal(response.content, west, south, east, north)
+            return self._read_window_with_rasterio(path, west, south, east, north)
+
+        def allocate(shape, dtype):
+            out_fd, out_path = tempfile.mkstemp(prefix="dem_", suffix=".npy", dir=config.DEM_TEMP_DIR)
+            os.close(out_fd)
+            arr = np.lib.format.open_memmap(out_path, mode="w+", dtype=dtype, shape=shape)
+            try:
+                os.remove(out_path)  # mapping stays valid until the array is released
+            except OSError:
+                pass
+            return arr
+
+        with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            try:
+                return self._parse_geotiff_minimal(mm, west, south, east, north, allocate=allocate)
+            except NotImplementedError as exc:
+                if not HAS_PILLOW:
+                    raise
+                logger.warning("Built-in GeoTIFF decoder unsupported (%s); falling back to Pillow", exc)
+        with open(path, "rb") as f:
+            return self._parse_with_pillow(f.read(), west, south, east, north)
+
+    def _read_window_with_rasterio(self, path: str, west, south, east, north) -> Tuple[np.ndarray, dict]:
+        """Read the (west, south, east, north) window of a GeoTIFF with rasterio."""
+        with rasterio.open(path) as dataset:
+            window = from_bounds(west, south, east, north, transform=dataset.transform)
+            window = window.round_offsets().round_lengths()
+            window = window.intersection(Window(0, 0, dataset.width, dataset.height))
+            elevation = dataset.read(1, window=window)
+            profile = dict(dataset.profile)
+            profile.update({
+                "width": elevation.shape[1],
+                "height": elevation.shape[0],
+                "transform": dataset.window_transform(window),
+            })
+        logger.info("DEM fetched (rasterio, windowed): shape=%s, dtype=%s", elevation.shape, elevation.dtype)
+        return elevation, profile
+
+    @span("dem_parse")
+    def _parse_geotiff(self, data, west, south, east, north) -> Tuple[np.ndarray, dict]:
+        """Decode a GeoTIFF with the best available backend.
+
+        rasterio is preferred; otherwise the built-in decoder is used, with
+        Pillow as a last resort for layouts the decoder does not support.
+        """
+        if HAS_RASTERIO:
+            return self._parse_with_rasterio(data)
+        try:
+            return self._parse_geotiff_minimal(data, west, south, east, north)
+        except NotImplementedError as exc:
+            if not HAS_PILLOW:
+                raise
+            logger.warning("Built-in GeoTIFF decoder unsupported (%s); falling back to Pillow", exc)
+            return self._parse_with_pillow(data, west, south, east, north)
 
     def _parse_with_rasterio(self, data: bytes) -> Tuple[np.ndarray, dict]:
         """Parse GeoTIFF using rasterio (full featured)."""
         with MemoryFile(data) as memfile:
             with memfile.open() as dataset:
-                elevation = dataset.read(1).astype(np.float64)
+                elevation = dataset.read(1)
                 profile = dict(dataset.profile)
-        logger.info("DEM fetched (rasterio): shape=%s", elevation.shape)
+        logger.info("DEM fetched (rasterio): shape=%s, dtype=%s", elevation.shape, elevation.dtype)
         return elevation, profile
 
     def _parse_with_pillow(self, data: bytes, west, south, east, north) -> Tuple[np.ndarray, dict]:
         """Parse GeoTIFF using Pillow."""
         try:
             img = Image.open(io.BytesIO(data))
-            elevation = np.array(img).astype(np.float64)
+            elevation = np.asarray(img)
             
             # Handle different image modes
             if elevation.ndim == 3:
@@ -133,134 +267,24 @@ class ElevationFetcher:
             logger.error(f"Pillow TIFF parsing failed: {e}")
             raise RuntimeError(f"Failed to parse GeoTIFF with Pillow: {e}")
 
-    def _parse_geotiff_minimal(self, data: bytes, west, south, east, north) -> Tuple[np.ndarray, dict]:
-        """Parse GeoTIFF without rasterio — basic TIFF parser for single-band DEMs."""
-        import struct
-
-        # Read TIFF header
-        bo = '<' if data[:2] == b'II' else '>'
-        magic = struct.unpack_from(f'{bo}H', data, 2)[0]
-        if magic != 42:
-            raise ValueError("Not a valid TIFF file")
-
-        ifd_offset = struct.unpack_from(f'{bo}I', data, 4)[0]
-        num_entries = struct.unpack_from(f'{bo}H', data, ifd_offset)[0]
-
-        tags = {}
-        for i in range(num_entries):
-            entry_offset = ifd_offset + 2 + i * 12
-            tag, dtype, count = struct.unpack_from(f'{bo}HHI', data, entry_offset)
-            if dtype == 3 and count == 1:  # SHORT
-                val = struct.unpack_from(f'{bo}H', data, entry_offset + 8)[0]
-            elif dtype == 4 and count == 1:  # LONG
-                val = struct.unpack_from(f'{bo}I', data, entry_offset + 8)[0]
-            elif dtype == 1 and count == 1:  # BYTE
-                val = data[entry_offset + 8]
-            else:
-                val = struct.unpack_from(f'{bo}I', data, entry_offset + 8)[0]
-            tags[tag] = (dtype, count, val)
-
-        width = tags.get(256, (0, 0, 0))[2]   # ImageWidth
-        height = tags.get(257, (0, 0, 0))[2]   # ImageLength
-        bits = tags.get(258, (0, 0, 16))[2]     # BitsPerSample
-        sample_format = tags.get(339, (0, 0, 1))[2]  # SampleFormat (1=uint, 2=int, 3=float)
-        strip_offsets = tags.get(273, (0, 0, 0))[2]
-        strip_byte_counts = tags.get(279, (0, 0, 0))[2]
-
-        # Handle strip offsets that point to an array
-        so_dtype, so_count, so_val = tags.get(273, (4, 1, 0))
-        if so_count == 1:
-            offsets = [so_val]
-        elif so_count > 1:
-            fmt = f'{bo}{so_count}I' if so_dtype == 4 else f'{bo}{so_count}H'
-            try:
-                offsets = list(struct.unpack_from(fmt, data, so_val))
-            except struct.error as e:
-                logger.error(f"Failed to unpack strip offsets: {e}, count={so_count}, val={so_val}")
-                offsets = []
-        else:
-            offsets = []
-
-        sbc_dtype, sbc_count, sbc_val = tags.get(279, (4, 1, 0))
-        if sbc_count == 1:
-            byte_counts = [sbc_val]
-        elif sbc_count > 1:
-            fmt = f'{bo}{sbc_count}I' if sbc_dtype == 4 else f'{bo}{sbc_count}H'
-            try:
-                byte_counts = list(struct.unpack_from(fmt, data, sbc_val))
-            except struct.error as e:
-                logger.error(f"Failed to unpack byte counts: {e}, count={sbc_count}, val={sbc_val}")
-                byte_counts = []
-        else:
-            byte_counts = []
-        
-        if not offsets or not byte_counts:
-            # Try tiled format (tags 324, 325 for tile offsets/byte counts)
-            tile_offsets = tags.get(324, None)
-            tile_byte_counts = tags.get(325, None)
-            
-            if tile_offsets and tile_byte_counts:
-                logger.info("TIFF uses tiles instead of strips")
-                to_dtype, to_count, to_val = tile_offsets
-                tbc_dtype, tbc_count, tbc_val = tile_byte_counts
-                
-                if to_count == 1:
-                    offsets = [to_val]
-                else:
-                    fmt = f'{bo}{to_count}I' if to_dtype == 4 else f'{bo}{to_count}H'
-                    offsets = list(struct.unpack_from(fmt, data, to_val))
-                
-                if tbc_count == 1:
-                    byte_counts = [tbc_val]
-                else:
-                    fmt = f'{bo}{tbc_count}I' if tbc_dtype == 4 else f'{bo}{tbc_count}H'
-                    byte_counts = list(struct.unpack_from(fmt, data, tbc_val))
-            else:
-                logger.error(f"Missing strip/tile info: offsets={len(offsets)}, byte_counts={len(byte_counts)}")
-                logger.error(f"TIFF tags: {[(k, v) for k, v in tags.items() if k in [273, 279, 324, 325, 256, 257]]}")
-                raise RuntimeError("Cannot find strip offsets/byte counts or tile offsets/byte counts in TIFF")
-
-        # Read pixel data
-        raw = b''
-        for off, bc in zip(offsets, byte_counts):
-            if off < len(data) and bc > 0:
-                raw += data[off:off + bc]
-            else:
-                logger.error(f"Invalid strip: offset={off}, bytes={bc}, data_len={len(data)}")
-
-        # Check if we got data
-        if len(raw) == 0:
-            logger.error(f"No pixel data extracted from TIFF. Tags: {list(tags.keys())}")
-            raise RuntimeError("Failed to extract pixel data from GeoTIFF - empty strips")
-        
-        expected_size = width * height * (bits // 8)
-        if len(raw) != expected_size:
-            logger.error(f"Pixel data size mismatch: got {len(raw)} bytes, expected {expected_size}")
-            # Try to use what we have
-            if len(raw) < expected_size:
-                raise RuntimeError(f"Insufficient pixel data: {len(raw)} < {expected_size} bytes")
-
-        # Convert to numpy
-        if bits == 16 and sample_format == 2:
-            elevation = np.frombuffer(raw, dtype=f'{bo.replace("<","<").replace(">",">")}i2').reshape(height, width).astype(np.float64)
-        elif bits == 16 and sample_format == 1:
-            elevation = np.frombuffer(raw, dtype=f'{bo.replace("<","<").replace(">",">")}u2').reshape(height, width).astype(np.float64)
-        elif bits == 32 and sample_format == 3:
-            elevation = np.frombuffer(raw, dtype=f'{bo.replace("<","<").replace(">",">")}f4').reshape(height, width).astype(np.float64)
-        else:
-            elevation = np.frombuffer(raw, dtype=f'{bo.replace("<","<").replace(">",">")}i2').reshape(height, width).astype(np.float64)
-
-        # Build a minimal profile with transform info
-        x_res = (east - west) / width
-        y_res = (north - south) / height
-        profile = {
-            "width": width,
-            "height": height,
-            "transform": [x_res, 0, west, 0, -y_res, north],
-        }
+    def _parse_geotiff_minimal(self, data, west, south, east, north, allocate=None) -> Tuple[np.ndarray, dict]:
+        """Parse GeoTIFF without rasterio using the built-in decoder.
+
+        The array keeps the file's native dtype (typically int16 or float32).
+        The transform comes from the GeoTIFF tags when present, otherwise it
+        is derived from the requested bounds.
+        """
+        elevation, profile = decode_geotiff(data, allocate=allocate)
+
+        if profile.get("transform") is None:
+            height, width = elevation.shape
+            x_res = (east - west) / width
+            y_res = (north - south) / height
+            profile["transform"] = [x_res, 0, west, 0, -y_res, north]
 
-        logger.info("DEM fetched (minimal parser): shape=%s, min=%.1f, max=%.1f",
-                     elevation.shape, float(np.nanmin(elevation)), float(np.nanmax(elevation)))
+        logger.info("DEM fetched (minimal parser): shape=%s, dtype=%s, min=%.1f, max=%.1f",
+                     elevation.shape, elevation.dtype,
+                     float(np.nanmin(elevation)), float(np.nanmax(elevation)))
         return elevation, profile
 
     @staticmethod
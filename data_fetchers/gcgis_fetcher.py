@@ -5,10 +5,22 @@ Endpoints used:
 - GVL_COMPOSITE_LOC/GeocodeServer — address geocoding
 
 No API key required. Free public data.
+
+Responses are memoised in a TTL + LRU cache (see
+``data_fetchers.response_cache``) keyed on the normalized query, so repeated
+PIN, identify and geocode lookups from the map UI are served in-process.
+
+When ``config.PARCEL_INDEX_DB`` points at a loaded parcel index (see
+``data_fetchers.parcel_index``), search, PIN and identify lookups are answered
+locally first and the remote query is only the fallback.
 """
 
 import logging
-import requests
+
+from config import config
+from data_fetchers import http_client
+from data_fetchers.parcel_index import get_parcel_index
+from data_fetchers.response_cache import ResponseCache, get_gcgis_cache
 
 logger = logging.getLogger(__name__)
 
@@ -17,6 +29,11 @@ PARCEL_URL = (
     "GreenvilleJS/QueryLayers_JS/MapServer/0/query"
 )
 
+IDENTIFY_URL = (
+    "https://www.gcgis.org/arcgis/rest/services/"
+    "GreenvilleJS/QueryLayers_JS/MapServer/identify"
+)
+
 GEOCODE_URL = (
     "https://www.gcgis.org/arcgis/rest/services/"
     "GVL_COMPOSITE_LOC/GeocodeServer/findAddressCandidates"
@@ -46,7 +63,31 @@ def search_parcels(query: str, field: str = "auto", max_results: int = 25) -> di
     if field == "auto":
         field = _detect_field(query)
 
+    index = get_parcel_index()
+    if index is not None:
+        local = index.search(query, field, max_results)
+        if local is not None and local["features"]:
+            return local
+
     where = _build_where(query, field)
+    cache = get_gcgis_cache()
+    if cache is None:
+        return _query_parcels(where, field, max_results)
+
+    result = cache.get_or_fetch(
+        ResponseCache.make_key("search", where, max_results),
+        lambda: _query_parcels(where, field, max_results),
+    )
+    # Prime the detail cache so clicking a search hit is an in-process lookup
+    for attr in result["features"]:
+        if attr.get("PIN") and attr.get("_geometry"):
+            key = ResponseCache.make_key("pin", _normalize_pin(attr["PIN"]))
+            if cache.get(key) is None:
+                cache.set(key, attr)
+    return result
+
+
+def _query_parcels(where: str, field: str, max_results: int) -> dict:
     logger.info("GCGIS parcel query: %s (field=%s)", where, field)
 
     params = {
@@ -58,7 +99,7 @@ def search_parcels(query: str, field: str = "auto", max_results: int = 25) -> di
         "f": "json",
     }
 
-    resp = requests.get(PARCEL_URL, params=params, timeout=15)
+    resp = http_client.get(PARCEL_URL, params=params, timeout=15)
     resp.raise_for_status()
     data = resp.json()
 
@@ -82,6 +123,20 @@ def search_parcels(query: str, field: str = "auto", max_results: int = 25) -> di
 
 def get_parcel_by_pin(pin: str) -> dict:
     """Get a single parcel by exact PIN with geometry."""
+    pin = _normalize_pin(pin)
+    index = get_parcel_index()
+    if index is not None:
+        local = index.get_by_pin(pin)
+        if local is not None:
+            return local
+
+    cache = get_gcgis_cache()
+    if cache is None:
+        return _query_parcel_by_pin(pin)
+    return cache.get_or_fetch(ResponseCache.make_key("pin", pin), lambda: _query_parcel_by_pin(pin))
+
+
+def _query_parcel_by_pin(pin: str) -> dict:
     params = {
         "where": f"PIN='{pin}'",
         "outFields": ",".join(PARCEL_FIELDS),
@@ -89,7 +144,7 @@ def get_parcel_by_pin(pin: str) -> dict:
         "outSR": "4326",
         "f": "json",
     }
-    resp = requests.get(PARCEL_URL, params=params, timeout=15)
+    resp = http_client.get(PARCEL_URL, params=params, timeout=15)
     resp.raise_for_status()
     data = resp.json()
 
@@ -108,15 +163,83 @@ def get_parcel_by_pin(pin: str) -> dict:
     return attr
 
 
+def identify_parcel_at_point(
+    lat: float,
+    lon: float,
+    map_extent: str = "-82.8,34.5,-82.0,35.2",
+    image_display: str = "1000,600,96",
+) -> dict:
+    """Identify the parcel(s) under a map click via the GCGIS identify endpoint.
+
+    Answered from the local parcel index when it has a hit; remote results
+    are cached on the click point rounded to
+    ``config.GCGIS_IDENTIFY_PRECISION`` decimal places (5 ≈ 1 m).
+    """
+    precision = config.GCGIS_IDENTIFY_PRECISION
+    index = get_parcel_index()
+    if index is not None:
+        local = index.identify(float(lat), float(lon))
+        if local["features"]:
+            return local
+
+    lat, lon = round(float(lat), precision), round(float(lon), precision)
+    cache = get_gcgis_cache()
+    if cache is None:
+        return _query_identify(lat, lon, map_extent, image_display)
+    return cache.get_or_fetch(
+        ResponseCache.make_key("identify", lat, lon),
+        lambda: _query_identify(lat, lon, map_extent, image_display),
+    )
+
+
+def _query_identify(lat: float, lon: float, map_extent: str, image_display: str) -> dict:
+    params = {
+        "geometry": f"{lon},{lat}",
+        "geometryType": "esriGeometryPoint",
+        "sr": "4326",
+        "layers": "all:0",
+        "tolerance": "3",
+        "mapExtent": map_extent,
+        "imageDisplay": image_display,
+        "returnGeometry": "true",
+        "returnFieldName": "true",
+        "f": "json",
+    }
+    resp = http_client.get(IDENTIFY_URL, params=params, timeout=10)
+    resp.raise_for_status()
+    data = resp.json()
+
+    results = []
+    for r in data.get("results", []):
+        attr = r.get("attributes", {})
+        geom = r.get("geometry", {})
+        if geom and "rings" in geom:
+            attr["_geometry"] = {"type": "Polygon", "coordinates": geom["rings"]}
+        results.append(attr)
+
+    return {"count": len(results), "features": results}
+
+
 def geocode_address(address: str, max_results: int = 5) -> list:
     """Geocode an address using GCGIS geocoder."""
+    address = " ".join(address.split())
+    cache = get_gcgis_cache()
+    if cache is None:
+        return _query_geocode(address, max_results)
+    return cache.get_or_fetch(
+        ResponseCache.make_key("geocode", address.upper(), max_results),
+        lambda: _query_geocode(address, max_results),
+    )
+
+
+def _query_geocode(address: str, max_results: int) -> list:
     params = {
         "SingleLine": address,
         "maxLocations": max_results,
         "outSR": "4326",
         "f": "json",
     }
-    resp = requests.get(GEOCODE_URL, params=params, timeout=10)
+    resp = http_client.get(GEOCODE_URL, params=params, timeout=10)
     resp.raise_for_status()
     data = resp.json()
 
@@ -131,6 +254,10 @@ def geocode_address(address: str, max_results: int = 5) -> list:
     return results
 
 
+def _normalize_pin(pin: str) -> str:
+    return str(pin).strip().upper()
+
+
 def _detect_field(query: str) -> str:
     """Auto-detect which field to search based on query pattern."""
     q = query.strip()
@@ -0,0 +1,334 @@
+"""Minimal single-band GeoTIFF decoder using only numpy and the standard library.
+
+Used when rasterio is not installed.  Supports classic and BigTIFF files,
+strip and tile layouts, no/Deflate/LZW compression and horizontal (2) or
+floating-point (3) predictors.  Pixel data is decoded block by block straight
+into a preallocated output array in the file's native dtype; the source
+buffer is only ever accessed through a ``memoryview`` so a ``bytes`` object,
+``mmap`` or ``numpy.memmap`` can be passed without copying it.
+"""
+
+import logging
+import math
+import struct
+import traceback
+import zlib
+from typing import Callable, Dict, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# TIFF field type -> (struct code, byte size)
+_FIELD_TYPES = {
+    1: ("B", 1),   # BYTE
+    2: ("s", 1),   # ASCII
+    3: ("H", 2),   # SHORT
+    4: ("I", 4),   # LONG
+    5: ("II", 8),  # RATIONAL
+    6: ("b", 1),   # SBYTE
+    7: ("B", 1),   # UNDEFINED
+    8: ("h", 2),   # SSHORT
+    9: ("i", 4),   # SLONG
+    11: ("f", 4),  # FLOAT
+    12: ("d", 8),  # DOUBLE
+    16: ("Q", 8),  # LONG8 (BigTIFF)
+    17: ("q", 8),  # SLONG8
+    18: ("Q", 8),  # IFD8
+}
+
+# (SampleFormat, BitsPerSample) -> numpy kind + size
+_DTYPES = {
+    (1, 8): "u1", (2, 8): "i1",
+    (1, 16): "u2", (2, 16): "i2",
+    (1, 32): "u4", (2, 32): "i4",
+    (3, 32): "f4", (3, 64): "f8",
+}
+
+TAG_WIDTH = 256
+TAG_HEIGHT = 257
+TAG_BITS = 258
+TAG_COMPRESSION = 259
+TAG_STRIP_OFFSETS = 273
+TAG_SAMPLES_PER_PIXEL = 277
+TAG_ROWS_PER_STRIP = 278
+TAG_STRIP_BYTE_COUNTS = 279
+TAG_PLANAR = 284
+TAG_PREDICTOR = 317
+TAG_TILE_WIDTH = 322
+TAG_TILE_LENGTH = 323
+TAG_TILE_OFFSETS = 324
+TAG_TILE_BYTE_COUNTS = 325
+TAG_SAMPLE_FORMAT = 339
+TAG_PIXEL_SCALE = 33550
+TAG_TIEPOINT = 33922
+TAG_GEOKEYS = 34735
+TAG_GDAL_NODATA = 42113
+
+COMPRESSION_NONE = 1
+COMPRESSION_LZW = 5
+COMPRESSION_DEFLATE = 8
+COMPRESSION_DEFLATE_OLD = 32946
+
+
+def is_tiff_header(head: bytes) -> bool:
+    """Return True if *head* starts with a little/big-endian TIFF or BigTIFF signature."""
+    return head[:4] in (b"II*\x00", b"MM\x00*", b"II+\x00", b"MM\x00+")
+
+
+def decode_geotiff(
+    data,
+    allocate: Optional[Callable[[Tuple[int, int], np.dtype], np.ndarray]] = None,
+) -> Tuple[np.ndarray, Dict]:
+    """Decode the first image of a single-band GeoTIFF.
+
+    Args:
+        data: Any object supporting the buffer protocol.
+        allocate: Optional ``allocate(shape, dtype)`` returning the output
+            array, e.g. a disk-backed ``numpy.memmap``.  Defaults to
+            ``numpy.empty``.
+
+    Returns:
+        Tuple of (elevation array in native dtype, profile).  The profile has
+        ``width``, ``height`` and ``dtype``; ``transform`` is set when the file
+        carries ModelPixelScale/ModelTiepoint tags (otherwise None) and
+        ``nodata`` when a GDAL_NODATA tag is present.
+    """
+    with memoryview(data) as raw, raw.cast("B") as mv:
+        try:
+            return _decode(mv, allocate)
+        except Exception as exc:
+            # The traceback keeps the decoder frames, and the block views in
+            # them, alive; drop their locals so the views (and an ``mmap``
+            # behind *data*) can be released while the error propagates.
+            traceback.clear_frames(exc.__traceback__)
+            raise
+
+
+def _decode(
+    mv: memoryview,
+    allocate: Optional[Callable[[Tuple[int, int], np.dtype], np.ndarray]],
+) -> Tuple[np.ndarray, Dict]:
+    if not is_tiff_header(bytes(mv[:4])):
+        raise ValueError("Not a valid TIFF file")
+
+    bo = "<" if mv[0] == 0x49 else ">"
+    bigtiff = struct.unpack_from(f"{bo}H", mv, 2)[0] == 43
+    if bigtiff:
+        ifd_offset = struct.unpack_from(f"{bo}Q", mv, 8)[0]
+    else:
+        ifd_offset = struct.unpack_from(f"{bo}I", mv, 4)[0]
+    tags = _read_ifd(mv, bo, ifd_offset, bigtiff)
+
+    width = int(tags[TAG_WIDTH][0])
+    height = int(tags[TAG_HEIGHT][0])
+    bits = int(tags.get(TAG_BITS, (16,))[0])
+    sample_format = int(tags.get(TAG_SAMPLE_FORMAT, (1,))[0])
+    compression = int(tags.get(TAG_COMPRESSION, (COMPRESSION_NONE,))[0])
+    predictor = int(tags.get(TAG_PREDICTOR, (1,))[0])
+    samples = int(tags.get(TAG_SAMPLES_PER_PIXEL, (1,))[0])
+    planar = int(tags.get(TAG_PLANAR, (1,))[0])
+
+    kind = _DTYPES.get((sample_format, bits))
+    if kind is None:
+        raise NotImplementedError(f"Unsupported sample format/bits: {sample_format}/{bits}")
+    if samples != 1 and planar != 2:
+        raise NotImplementedError(f"Only single-band rasters are supported (got {samples} samples)")
+    src_dtype = np.dtype(bo + kind)
+    out = (allocate or np.empty)((height, width), src_dtype.newbyteorder("="))
+
+    if TAG_TILE_OFFSETS in tags:
+        block_w = int(tags[TAG_TILE_WIDTH][0])
+        block_h = int(tags[TAG_TILE_LENGTH][0])
+        offsets = tags[TAG_TILE_OFFSETS]
+        counts = tags[TAG_TILE_BYTE_COUNTS]
+    elif TAG_STRIP_OFFSETS in tags:
+        block_w = width
+        block_h = int(tags.get(TAG_ROWS_PER_STRIP, (height,))[0])
+        offsets = tags[TAG_STRIP_OFFSETS]
+        counts = tags[TAG_STRIP_BYTE_COUNTS]
+    else:
+        raise RuntimeError("Cannot find strip offsets/byte counts or tile offsets/byte counts in TIFF")
+
+    blocks_across = math.ceil(width / block_w)
+    blocks_down = math.ceil(height / block_h)
+    n_blocks = blocks_across * blocks_down  # band 1 only when planar=2
+    if len(offsets) < n_blocks or len(counts) < n_blocks:
+        raise RuntimeError(f"TIFF block table too short: {len(offsets)} offsets for {n_blocks} blocks")
+
+    for idx in range(n_blocks):
+        off, count = int(offsets[idx]), int(counts[idx])
+        row0 = (idx // blocks_across) * block_h
+        col0 = (idx % blocks_across) * block_w
+        # Strips may be truncated at the bottom of the image; tiles never are
+        rows = block_h if TAG_TILE_OFFSETS in tags else min(block_h, height - row0)
+        if count == 0 or off + count > len(mv):
+            raise RuntimeError(f"Invalid block {idx}: offset={off}, bytes={count}, data_len={len(mv)}")
+
+        block = _decode_block(mv[off:off + count], compression, src_dtype, rows, block_w)
+        if predictor == 2:
+            block = np.cumsum(block, axis=1, dtype=block.dtype)
+        elif predictor == 3:
+            block = _undo_float_predictor(block, src_dtype)
+        elif predictor != 1:
+            raise NotImplementedError(f"Unsupported TIFF predictor: {predictor}")
+
+        r1 = min(row0 + block_h, height)
+        c1 = min(col0 + block_w, width)
+        out[row0:r1, col0:c1] = block[:r1 - row0, :c1 - col0]
+
+    profile = {
+        "width": width,
+        "height": height,
+        "dtype": str(out.dtype),
+        "transform": _geo_transform(tags),
+    }
+    nodata = _gdal_nodata(tags)
+    if nodata is not None:
+        profile["nodata"] = nodata
+    return out, profile
+
+
+# ----------------------------------------------------------------------
+# IFD parsing
+# ----------------------------------------------------------------------
+
+def _read_ifd(mv: memoryview, bo: str, offset: int, bigtiff: bool) -> Dict[int, tuple]:
+    """Return {tag: values} for one IFD; large arrays come back as numpy arrays."""
+    if bigtiff:
+        num_entries = struct.unpack_from(f"{bo}Q", mv, offset)[0]
+        entry_fmt, entry_size, inline_size, first = f"{bo}HHQ", 20, 8, offset + 8
+    else:
+        num_entries = struct.unpack_from(f"{bo}H", mv, offset)[0]
+        entry_fmt, entry_size, inline_size, first = f"{bo}HHI", 12, 4, offset + 2
+
+    tags: Dict[int, tuple] = {}
+    for i in range(num_entries):
+        entry = first + i * entry_size
+        tag, ftype, count = struct.unpack_from(entry_fmt, mv, entry)
+        if ftype not in _FIELD_TYPES:
+            continue
+        code, size = _FIELD_TYPES[ftype]
+        nbytes = size * count
+        value_pos = entry + (entry_size - inline_size)
+        if nbytes > inline_size:
+            value_pos = struct.unpack_from(f"{bo}{'Q' if bigtiff else 'I'}", mv, value_pos)[0]
+
+        if ftype == 2:
+            tags[tag] = (bytes(mv[value_pos:value_pos + count]).rstrip(b"\x00").decode("ascii", "replace"),)
+        elif ftype == 5:
+            raw = struct.unpack_from(f"{bo}{2 * count}I", mv, value_pos)
+            tags[tag] = tuple(raw[j] / raw[j + 1] if raw[j + 1] else 0.0 for j in range(0, len(raw), 2))
+        elif count > 16:
+            tags[tag] = np.frombuffer(mv, dtype=np.dtype(bo + code), count=count, offset=value_pos)
+        else:
+            tags[tag] = struct.unpack_from(f"{bo}{count}{code}", mv, value_pos)
+    return tags
+
+
+def _geo_transform(tags: Dict[int, tuple]) -> Optional[list]:
+    """Build an affine [a, b, c, d, e, f] from ModelPixelScale + ModelTiepoint."""
+    scale = tags.get(TAG_PIXEL_SCALE)
+    tie = tags.get(TAG_TIEPOINT)
+    if scale is None or tie is None or len(tie) < 6:
+        return None
+    sx, sy = float(scale[0]), float(scale[1])
+    i, j, x, y = float(tie[0]), float(tie[1]), float(tie[3]), float(tie[4])
+    c = x - i * sx
+    f = y + j * sy
+
+    # GTRasterTypeGeoKey (1025) == 2 means PixelIsPoint: shift to pixel corners
+    keys = tags.get(TAG_GEOKEYS)
+    if keys is not None and len(keys) >= 4:
+        for k in range(4, len(keys) - 3, 4):
+            if int(keys[k]) == 1025 and int(keys[k + 1]) == 0 and int(keys[k + 3]) == 2:
+                c -= sx / 2.0
+                f += sy / 2.0
+                break
+    return [sx, 0.0, c, 0.0, -sy, f]
+
+
+def _gdal_nodata(tags: Dict[int, tuple]) -> Optional[float]:
+    raw = tags.get(TAG_GDAL_NODATA)
+    if not raw:
+        return None
+    try:
+        return float(str(raw[0]).strip())
+    except ValueError:
+        return None
+
+
+# ----------------------------------------------------------------------
+# Block decoding
+# ----------------------------------------------------------------------
+
+def _decode_block(chunk: memoryview, compression: int, dtype: np.dtype, rows: int, cols: int) -> np.ndarray:
+    """Decompress one strip/tile into a (rows, cols) array view."""
+    n = rows * cols
+    if compression == COMPRESSION_NONE:
+        buf = chunk
+    elif compression in (COMPRESSION_DEFLATE, COMPRESSION_DEFLATE_OLD):
+        buf = zlib.decompress(chunk)
+    elif compression == COMPRESSION_LZW:
+        buf = _lzw_decode(chunk)
+    else:
+        raise NotImplementedError(f"Unsupported TIFF compression: {compression}")
+
+    if len(buf) < n * dtype.itemsize:
+        raise RuntimeError(f"Insufficient pixel data: {len(buf)} < {n * dtype.itemsize} bytes")
+    return np.frombuffer(buf, dtype=dtype, count=n).reshape(rows, cols)
+
+
+def _undo_float_predictor(block: np.ndarray, dtype: np.dtype) -> np.ndarray:
+    """Reverse TIFF predictor 3 (byte-shuffled horizontal differencing)."""
+    rows, cols = block.shape
+    size = dtype.itemsize
+    raw = np.frombuffer(block.tobytes(), dtype=np.uint8).reshape(rows, cols * size)
+    raw = np.cumsum(raw, axis=1, dtype=np.uint8)
+    # Each row stores all most-significant bytes first, then the next byte plane
+    planes = raw.reshape(rows, size, cols).transpose(0, 2, 1)
+    return np.ascontiguousarray(planes).view(np.dtype(">" + dtype.kind + str(size))).reshape(rows, cols)
+
+
+def _lzw_decode(chunk: memoryview) -> bytes:
+    """Decode TIFF-flavoured LZW (MSB-first codes, early change)."""
+    data = bytes(chunk) + b"\x00\x00\x00"
+    total_bits = (len(data) - 3) * 8
+    out = bytearray()
+    emit = out.extend
+    table = [bytes((i,)) for i in range(256)] + [b"", b""]
+    add = table.append
+    nbits, mask, next_switch = 9, 511, 511
+    bitpos = 0
+    prev = b""
+
+    while bitpos + nbits <= total_bits:
+        byte_i = bitpos >> 3
+        word = (data[byte_i] << 16) | (data[byte_i + 1] << 8) | data[byte_i + 2]
+        code = (word >> (24 - (bitpos & 7) - nbits)) & mask
+        bitpos += nbits
+
+        if code == 256:  # ClearCode
+            del table[258:]
+            nbits, mask, next_switch = 9, 511, 511
+            prev = b""
+            continue
+        if code == 257:  # EndOfInformation
+            break
+
+        if not prev:
+            entry = table[code]
+        else:
+            if code < len(table):
+                entry = table[code]
+                add(prev + entry[:1])
+            else:
+                entry = prev + prev[:1]
+                add(entry)
+            if len(table) == next_switch and nbits < 12:
+                nbits += 1
+                mask = (mask << 1) | 1
+                next_switch = mask
+        emit(entry)
+        prev = entry
+    return bytes(out)
@@ -0,0 +1,221 @@
+"""Shared upstream HTTP client: pooled sessions, retries and circuit breaking.
+
+Every fetcher talks to gcgis.org, Regrid and OpenTopography through
+:func:`get`.  One ``requests.Session`` is kept per host so TCP/TLS
+connections are reused, transient 5xx/connection errors are retried with
+exponential backoff, and a host that keeps failing is short-circuited for a
+cool-down period instead of tying up request threads on timeouts.
+
+Read timeouts are not retried: the server may still be working on the
+request, and retrying a 120 s DEM download would hold a worker thread far
+past gunicorn's timeout.  No retry starts once a call's deadline has passed.
+"""
+
+import contextvars
+import logging
+import threading
+import time
+from typing import Dict, Optional
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+import metrics
+from config import config
+
+logger = logging.getLogger(__name__)
+
+# Monotonic time after which the current call starts no further retries
+_call_deadline: contextvars.ContextVar[Optional[float]] = contextvars.ContextVar(
+    "http_call_deadline", default=None,
+)
+
+
+class CircuitOpenError(requests.ConnectionError):
+    """Raised when a host's circuit breaker is open."""
+
+
+class _DeadlineRetry(Retry):
+    """``Retry`` that is exhausted once the calling :meth:`UpstreamClient.get` runs out of time."""
+
+    def is_exhausted(self) -> bool:
+        deadline = _call_deadline.get()
+        if deadline is not None and time.monotonic() + self.get_backoff_time() >= deadline:
+            return True
+        return super().is_exhausted()
+
+
+class _HostState:
+    """Per-host session, breaker state and latency counters."""
+
+    def __init__(self, session: requests.Session):
+        self.session = session
+        self.lock = threading.Lock()
+        self.consecutive_failures = 0
+        self.open_until = 0.0
+        self.requests = 0
+        self.errors = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.last_ms = 0.0
+
+
+class UpstreamClient:
+    """Per-host pooled sessions with retry, timeout and circuit-breaker policy."""
+
+    def __init__(
+        self,
+        pool_connections: Optional[int] = None,
+        pool_maxsize: Optional[int] = None,
+        retries: Optional[int] = None,
+        backoff_factor: Optional[float] = None,
+        default_timeout: Optional[float] = None,
+        deadline: Optional[float] = None,
+        failure_threshold: Optional[int] = None,
+        reset_seconds: Optional[float] = None,
+    ):
+        """
+        Args:
+            pool_connections: Connection pools per session (``HTTP_POOL_CONNECTIONS``).
+            pool_maxsize: Max connections kept per pool (``HTTP_POOL_MAXSIZE``).
+            retries: Retry attempts for idempotent requests (``HTTP_RETRIES``).
+            backoff_factor: Exponential backoff base in seconds (``HTTP_BACKOFF``).
+            default_timeout: Timeout used when a call does not pass one (``HTTP_TIMEOUT_S``).
+            deadline: Seconds after a call starts when no further retry is
+                attempted (``HTTP_DEADLINE_S``).
+            failure_threshold: Consecutive failures that open a host's circuit.
+            reset_seconds: How long an open circuit rejects calls before a retry probe.
+        """
+        self.pool_connections = pool_connections or config.HTTP_POOL_CONNECTIONS
+        self.pool_maxsize = pool_maxsize or config.HTTP_POOL_MAXSIZE
+        self.retries = config.HTTP_RETRIES if retries is None else retries
+        self.backoff_factor = config.HTTP_BACKOFF if backoff_factor is None else backoff_factor
+        self.default_timeout = default_timeout or config.HTTP_TIMEOUT_S
+        self.deadline = config.HTTP_DEADLINE_S if deadline is None else deadline
+        self.failure_threshold = failure_threshold or config.HTTP_CIRCUIT_FAILURES
+        self.reset_seconds = config.HTTP_CIRCUIT_RESET_S if reset_seconds is None else reset_seconds
+        self._hosts: Dict[str, _HostState] = {}
+        self._lock = threading.Lock()
+
+    def _host(self, url: str) -> "tuple[str, _HostState]":
+        host = urlsplit(url).netloc
+        with self._lock:
+            state = self._hosts.get(host)
+            if state is None:
+                state = _HostState(self._make_session())
+                self._hosts[host] = state
+        return host, state
+
+    def _make_session(self) -> requests.Session:
+        retry = _DeadlineRetry(
+            total=self.retries,
+            connect=self.retries,
+            read=False,  # never re-send after a read timeout; raise ReadTimeout as-is
+            status=self.retries,
+            backoff_factor=self.backoff_factor,
+            status_forcelist=(500, 502, 503, 504),
+            allowed_methods=frozenset({"GET", "HEAD"}),
+            raise_on_status=False,  # hand the final 5xx back to the caller
+        )
+        adapter = HTTPAdapter(
+            pool_connections=self.pool_connections,
+            pool_maxsize=self.pool_maxsize,
+            max_retries=retry,
+        )
+        session = requests.Session()
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        return session
+
+    def get(self, url: str, deadline: Optional[float] = None, **kwargs) -> requests.Response:
+        """``requests.get`` through the host's pooled session.
+
+        Args:
+            url: Request URL.
+            deadline: Seconds from now after which connect/5xx retries stop
+                (default ``self.deadline``).  The attempt in flight still
+                runs to its own ``timeout``.
+            **kwargs: Passed to ``requests.Session.get``.
+
+        Raises:
+            CircuitOpenError: If the host has failed repeatedly and is cooling down.
+        """
+        host, state = self._host(url)
+        with state.lock:
+            if state.open_until > time.monotonic():
+                raise CircuitOpenError(f"Upstream {host} temporarily unavailable (circuit open)")
+
+        kwargs.setdefault("timeout", self.default_timeout)
+        start = time.perf_counter()
+        token = _call_deadline.set(time.monotonic() + (self.deadline if deadline is None else deadline))
+        try:
+            response = state.session.get(url, **kwargs)
+        except requests.RequestException:
+            self._record(host, state, start, failed=True)
+            raise
+        finally:
+            _call_deadline.reset(token)
+        self._record(host, state, start, failed=response.status_code >= 500)
+        return response
+
+    def _record(self, host: str, state: _HostState, start: float, failed: bool) -> None:
+        elapsed_ms = (time.perf_counter() - start) * 1000.0
+        with state.lock:
+            state.requests += 1
+            state.total_ms += elapsed_ms
+            state.last_ms = elapsed_ms
+            state.max_ms = max(state.max_ms, elapsed_ms)
+            if failed:
+                state.errors += 1
+                state.consecutive_failures += 1
+                if state.consecutive_failures >= self.failure_threshold:
+                    state.open_until = time.monotonic() + self.reset_seconds
+                    logger.warning(
+                        "Circuit opened for %s after %d consecutive failures (%.0fs cool-down)",
+                        host, state.consecutive_failures, self.reset_seconds,
+                    )
+            else:
+                state.consecutive_failures = 0
+                state.open_until = 0.0
+        metrics.observe_upstream(host, elapsed_ms / 1000.0, failed)
+
+    def stats(self) -> Dict[str, dict]:
+        """Per-host request counts, error counts and latency in milliseconds."""
+        out = {}
+        with self._lock:
+            hosts = list(self._hosts.items())
+        for host, state in hosts:
+            with state.lock:
+                out[host] = {
+                    "requests": state.requests,
+                    "errors": state.errors,
+                    "avg_ms": round(state.total_ms / state.requests, 1) if state.requests else 0.0,
+                    "max_ms": round(state.max_ms, 1),
+                    "last_ms": round(state.last_ms, 1),
+                    "circuit_open": state.open_until > time.monotonic(),
+                }
+        return out
+
+
+_client: Optional[UpstreamClient] = None
+_client_lock = threading.Lock()
+
+
+def get_client() -> UpstreamClient:
+    """Return the process-wide upstream client."""
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = UpstreamClient()
+    return _client
+
+
+def get(url: str, **kwargs) -> requests.Response:
+    """Module-level shortcut for ``get_client().get(...)``."""
+    return get_client().get(url, **kwargs)
+
+
+def upstream_stats() -> Dict[str, dict]:
+    return get_client().stats()
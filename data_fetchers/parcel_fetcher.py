@@ -1,17 +1,18 @@
 """Fetch parcel boundary data from the Regrid API."""
 
+from __future__ import annotations
+
 import logging
 from typing import Optional
 
-from __future__ import annotations
 try:
     import geopandas as gpd
 except ImportError:
     gpd = None
-import requests
 from shapely.geometry import shape
 
 from config import config
+from data_fetchers import http_client
 
 logger = logging.getLogger(__name__)
 
@@ -45,7 +46,7 @@ class ParcelFetcher:
             "return_geometry": True,
         }
 
-        response = requests.get(url, params=params, timeout=30)
+        response = http_client.get(url, params=params, timeout=30)
         response.raise_for_status()
         data = response.json()
 
@@ -0,0 +1,392 @@
+"""Local Greenville County parcel index in SQLite (R-tree + FTS5).
+
+The bulk loader pages through ``QueryLayers_JS/MapServer/0`` with
+``resultOffset``/``resultRecordCount`` and stores the ``PARCEL_FIELDS``
+attributes and ring geometry of every parcel.  Ring bounding boxes go into an
+R-tree for point identify; owner, address, subdivision and legal description
+go into an FTS5 table for search.  PIN, search and identify lookups are then
+answered from disk in a few milliseconds, and ``gcgis_fetcher`` only goes to
+the network when the index has no answer.
+
+Refreshes are incremental: each page is committed together with a checkpoint,
+so an interrupted load resumes where it stopped; rows whose content digest is
+unchanged are not rewritten; and when a full pass completes, parcels that
+were not seen during it (retired PINs) are deleted.
+
+Usage:
+    python -m data_fetchers.parcel_index refresh [--db PATH] [--max-pages N] [--restart]
+    python -m data_fetchers.parcel_index stats [--db PATH]
+"""
+
+import argparse
+import hashlib
+import json
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from config import config
+
+logger = logging.getLogger(__name__)
+
+_SCHEMA = (
+    """CREATE TABLE IF NOT EXISTS parcels (
+        id INTEGER PRIMARY KEY,
+        pin TEXT NOT NULL UNIQUE,
+        attrs TEXT NOT NULL,
+        rings TEXT,
+        digest TEXT NOT NULL,
+        seen REAL NOT NULL
+    )""",
+    "CREATE VIRTUAL TABLE IF NOT EXISTS parcels_rtree USING rtree(id, minx, maxx, miny, maxy)",
+    "CREATE VIRTUAL TABLE IF NOT EXISTS parcels_fts USING fts5(owner, address, subdivision, descr)",
+    "CREATE TABLE IF NOT EXISTS index_meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)",
+)
+
+# search_parcels field -> FTS5 column filter (None = all columns)
+_FTS_COLUMNS = {
+    "owner": "owner",
+    "address": "address",
+    "subdivision": "subdivision",
+    "all": None,
+}
+
+_TOKEN_RE = re.compile(r"[0-9A-Za-z]+")
+
+
+class ParcelIndex:
+    """SQLite parcel store with spatial and full-text lookups."""
+
+    def __init__(self, db_path: str):
+        """
+        Args:
+            db_path: SQLite file; created (with its schema) if missing.
+        """
+        self.db_path = db_path
+        self._local = threading.local()
+        parent = os.path.dirname(os.path.abspath(db_path))
+        os.makedirs(parent, exist_ok=True)
+        conn = self._conn()
+        conn.execute("PRAGMA journal_mode=WAL")  # readers are not blocked by a running refresh
+        for statement in _SCHEMA:
+            conn.execute(statement)
+        conn.commit()
+
+    def _conn(self) -> sqlite3.Connection:
+        """One connection per thread (request threads and the loader)."""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30)
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    # ------------------------------------------------------------------
+    # Lookups
+    # ------------------------------------------------------------------
+
+    def is_ready(self) -> bool:
+        """True once at least one parcel has been loaded."""
+        return self._conn().execute("SELECT 1 FROM parcels LIMIT 1").fetchone() is not None
+
+    def get_by_pin(self, pin: str) -> Optional[dict]:
+        """Return the parcel attributes (with ``_geometry``) for an exact PIN, or None."""
+        row = self._conn().execute(
+            "SELECT attrs, rings FROM parcels WHERE pin = ?", (_clean_pin(pin),)
+        ).fetchone()
+        return _to_feature(row) if row else None
+
+    def search(self, query: str, field: str, max_results: int = 25) -> Optional[dict]:
+        """Search like ``gcgis_fetcher.search_parcels``.
+
+        Text fields use FTS5 token-prefix matching (``"MAIN ST"`` matches
+        ``MAIN STREET``) rather than ArcGIS ``LIKE '%...%'`` substrings.
+
+        Returns:
+            Result dict in the remote format, or None if *field* is not
+            handled locally or the query has no searchable tokens.
+        """
+        conn = self._conn()
+        if field == "pin":
+            row = conn.execute(
+                "SELECT attrs, rings FROM parcels WHERE pin = ?", (_clean_pin(query),)
+            ).fetchone()
+            features = [_to_feature(row)] if row else []
+            return {"count": len(features), "field": field, "features": features}
+
+        if field not in _FTS_COLUMNS:
+            return None
+        tokens = _TOKEN_RE.findall(query.upper())
+        if not tokens:
+            return None
+        match = " AND ".join(f'"{t}"*' for t in tokens)
+        column = _FTS_COLUMNS[field]
+        if column:
+            match = f"{column} : ({match})"
+
+        rows = conn.execute(
+            "SELECT p.attrs, p.rings FROM parcels_fts f JOIN parcels p ON p.id = f.rowid "
+            "WHERE parcels_fts MATCH ? LIMIT ?",  # no bm25 sort: it scores every match
+            (match, int(max_results)),
+        ).fetchall()
+        features = [_to_feature(r) for r in rows]
+        return {"count": len(features), "field": field, "features": features}
+
+    def identify(self, lat: float, lon: float) -> dict:
+        """Parcels whose polygon contains (lat, lon), via R-tree candidates + ray casting."""
+        rows = self._conn().execute(
+            "SELECT p.attrs, p.rings FROM parcels_rtree r JOIN parcels p ON p.id = r.id "
+            "WHERE r.minx <= ? AND r.maxx >= ? AND r.miny <= ? AND r.maxy >= ?",
+            (lon, lon, lat, lat),
+        ).fetchall()
+        features = []
+        for attrs, rings in rows:
+            if rings and _point_in_rings(lon, lat, json.loads(rings)):
+                features.append(_to_feature((attrs, rings)))
+        return {"count": len(features), "features": features}
+
+    def stats(self) -> Dict[str, Any]:
+        conn = self._conn()
+        meta = dict(conn.execute("SELECT key, value FROM index_meta").fetchall())
+        return {
+            "db_path": self.db_path,
+            "parcels": conn.execute("SELECT COUNT(*) FROM parcels").fetchone()[0],
+            "last_full_refresh": float(meta["last_full_refresh"]) if "last_full_refresh" in meta else None,
+            "refresh_in_progress": "pass_started" in meta,
+            "next_offset": int(meta.get("next_offset", 0)),
+        }
+
+    # ------------------------------------------------------------------
+    # Bulk load / incremental refresh
+    # ------------------------------------------------------------------
+
+    def refresh(
+        self,
+        page_size: Optional[int] = None,
+        max_pages: Optional[int] = None,
+        restart: bool = False,
+        fetch_page: Optional[Callable[[int, int], Tuple[List[dict], bool]]] = None,
+    ) -> Dict[str, Any]:
+        """Page through the parcel layer and upsert every feature.
+
+        Args:
+            page_size: Records per request (default ``config.PARCEL_INDEX_PAGE_SIZE``).
+            max_pages: Stop after this many pages; the next call resumes from
+                the checkpoint.  None = run the pass to completion.
+            restart: Discard an interrupted pass and start again at offset 0.
+            fetch_page: ``(offset, count) -> (features, more)``; defaults to
+                querying ``PARCEL_URL``.
+
+        Returns:
+            Counters for the run plus ``complete`` (True when a full pass finished).
+        """
+        from data_fetchers.gcgis_fetcher import PARCEL_FIELDS
+
+        page_size = int(page_size or config.PARCEL_INDEX_PAGE_SIZE)
+        fetch_page = fetch_page or _fetch_remote_page
+        fields = frozenset(PARCEL_FIELDS)
+        conn = self._conn()
+        meta = dict(conn.execute("SELECT key, value FROM index_meta").fetchall())
+
+        if restart or "pass_started" not in meta:
+            pass_started, offset = time.time(), 0
+            self._set_meta(conn, pass_started=pass_started, next_offset=0)
+            conn.commit()
+        else:
+            pass_started, offset = float(meta["pass_started"]), int(meta["next_offset"])
+            logger.info("Resuming parcel index refresh at offset %d", offset)
+
+        counts = {"pages": 0, "fetched": 0, "inserted": 0, "updated": 0, "unchanged": 0, "deleted": 0}
+        complete = False
+        while max_pages is None or counts["pages"] < max_pages:
+            features, more = fetch_page(offset, page_size)
+            counts["pages"] += 1
+            counts["fetched"] += len(features)
+            with conn:
+                for feature in features:
+                    counts[self._upsert(conn, feature, fields, pass_started)] += 1
+                offset += len(features)
+                self._set_meta(conn, next_offset=offset)
+            logger.info("Parcel index: offset %d (%d this page)", offset, len(features))
+            if not features or not more:
+                complete = True
+                break
+
+        if complete:
+            with conn:
+                stale = [r[0] for r in conn.execute(
+                    "SELECT id FROM parcels WHERE seen < ?", (pass_started,)
+                ).fetchall()]
+                for row_id in stale:
+                    self._delete(conn, row_id)
+                counts["deleted"] = len(stale)
+                conn.execute("DELETE FROM index_meta WHERE key IN ('pass_started', 'next_offset')")
+                self._set_meta(conn, last_full_refresh=time.time())
+
+        counts["complete"] = complete
+        logger.info("Parcel index refresh: %s", counts)
+        return counts
+
+    def _upsert(self, conn: sqlite3.Connection, feature: dict, fields: frozenset, seen: float) -> str:
+        attrs = {k: v for k, v in feature.get("attributes", {}).items() if k in fields}
+        pin = _clean_pin(attrs.get("PIN") or "")
+        if not pin:
+            return "unchanged"
+        rings = (feature.get("geometry") or {}).get("rings") or None
+        attrs_json = json.dumps(attrs, sort_keys=True, separators=(",", ":"))
+        rings_json = json.dumps(rings, separators=(",", ":")) if rings else None
+        digest = hashlib.sha1((attrs_json + (rings_json or "")).encode()).hexdigest()
+
+        row = conn.execute("SELECT id, digest FROM parcels WHERE pin = ?", (pin,)).fetchone()
+        if row is not None and row[1] == digest:
+            conn.execute("UPDATE parcels SET seen = ? WHERE id = ?", (seen, row[0]))
+            return "unchanged"
+
+        if row is None:
+            row_id = conn.execute(
+                "INSERT INTO parcels (pin, attrs, rings, digest, seen) VALUES (?, ?, ?, ?, ?)",
+                (pin, attrs_json, rings_json, digest, seen),
+            ).lastrowid
+            outcome = "inserted"
+        else:
+            row_id = row[0]
+            conn.execute(
+                "UPDATE parcels SET attrs = ?, rings = ?, digest = ?, seen = ? WHERE id = ?",
+                (attrs_json, rings_json, digest, seen, row_id),
+            )
+            conn.execute("DELETE FROM parcels_rtree WHERE id = ?", (row_id,))
+            conn.execute("DELETE FROM parcels_fts WHERE rowid = ?", (row_id,))
+            outcome = "updated"
+
+        if rings:
+            xs = [pt[0] for ring in rings for pt in ring]
+            ys = [pt[1] for ring in rings for pt in ring]
+            conn.execute(
+                "INSERT INTO parcels_rtree (id, minx, maxx, miny, maxy) VALUES (?, ?, ?, ?, ?)",
+                (row_id, min(xs), max(xs), min(ys), max(ys)),
+            )
+        conn.execute(
+            "INSERT INTO parcels_fts (rowid, owner, address, subdivision, descr) VALUES (?, ?, ?, ?, ?)",
+            (
+                row_id,
+                " ".join(str(attrs.get(k) or "") for k in ("OWNAM1", "OWNAM2", "NAMECO")),
+                " ".join(str(attrs.get(k) or "") for k in ("STRNUM", "LOCATE", "CITY")),
+                str(attrs.get("SUBDIV") or ""),
+                str(attrs.get("DESCR") or ""),
+            ),
+        )
+        return outcome
+
+    @staticmethod
+    def _delete(conn: sqlite3.Connection, row_id: int) -> None:
+        conn.execute("DELETE FROM parcels WHERE id = ?", (row_id,))
+        conn.execute("DELETE FROM parcels_rtree WHERE id = ?", (row_id,))
+        conn.execute("DELETE FROM parcels_fts WHERE rowid = ?", (row_id,))
+
+    @staticmethod
+    def _set_meta(conn: sqlite3.Connection, **values: Any) -> None:
+        conn.executemany(
+            "INSERT OR REPLACE INTO index_meta (key, value) VALUES (?, ?)",
+            [(k, str(v)) for k, v in values.items()],
+        )
+
+
+# ----------------------------------------------------------------------
+# Helpers
+# ----------------------------------------------------------------------
+
+def _fetch_remote_page(offset: int, count: int) -> Tuple[List[dict], bool]:
+    """One page of the GCGIS parcel layer, ordered by PIN for stable offsets."""
+    from data_fetchers import http_client
+    from data_fetchers.gcgis_fetcher import PARCEL_FIELDS, PARCEL_URL
+
+    params = {
+        "where": "1=1",
+        "outFields": ",".join(PARCEL_FIELDS),
+        "returnGeometry": "true",
+        "outSR": "4326",
+        "orderByFields": "PIN",
+        "resultOffset": offset,
+        "resultRecordCount": count,
+        "f": "json",
+    }
+    resp = http_client.get(PARCEL_URL, params=params, timeout=60)
+    resp.raise_for_status()
+    data = resp.json()
+    if "error" in data:
+        raise ValueError(f"GCGIS error: {data['error'].get('message', data['error'])}")
+    features = data.get("features", [])
+    # The server may cap the page below *count*; exceededTransferLimit says more remain
+    more = bool(data.get("exceededTransferLimit", len(features) >= count))
+    return features, more
+
+
+def _clean_pin(pin: str) -> str:
+    return str(pin).strip().upper().replace("-", "").replace(" ", "")
+
+
+def _to_feature(row: Tuple[str, Optional[str]]) -> dict:
+    attrs, rings = row
+    attr = json.loads(attrs)
+    if rings:
+        attr["_geometry"] = {"type": "Polygon", "coordinates": json.loads(rings)}
+    return attr
+
+
+def _point_in_rings(x: float, y: float, rings: List[List[List[float]]]) -> bool:
+    """Even-odd test across all rings, so ESRI holes are excluded."""
+    inside = False
+    for ring in rings:
+        n = len(ring)
+        for i in range(n):
+            x1, y1 = ring[i][0], ring[i][1]
+            x2, y2 = ring[i - 1][0], ring[i - 1][1]
+            if (y1 > y) != (y2 > y) and x < (x2 - x1) * (y - y1) / (y2 - y1) + x1:
+                inside = not inside
+    return inside
+
+
+_index: Optional[ParcelIndex] = None
+_index_lock = threading.Lock()
+
+
+def get_parcel_index() -> Optional[ParcelIndex]:
+    """Return the process-wide parcel index, or None when not configured or empty."""
+    global _index
+    path = config.PARCEL_INDEX_DB
+    if not path or not os.path.exists(path):
+        return None
+    with _index_lock:
+        if _index is None:
+            try:
+                _index = ParcelIndex(path)
+            except sqlite3.Error as exc:
+                logger.warning("Parcel index %s unavailable: %s", path, exc)
+                return None
+    return _index if _index.is_ready() else None
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Greenville County parcel index")
+    parser.add_argument("command", choices=["refresh", "stats"])
+    parser.add_argument("--db", default=config.PARCEL_INDEX_DB, help="SQLite path (PARCEL_INDEX_DB)")
+    parser.add_argument("--page-size", type=int, default=None)
+    parser.add_argument("--max-pages", type=int, default=None, help="stop early; the next run resumes")
+    parser.add_argument("--restart", action="store_true", help="discard an interrupted pass")
+    args = parser.parse_args()
+    if not args.db:
+        parser.error("set PARCEL_INDEX_DB or pass --db")
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    index = ParcelIndex(args.db)
+    if args.command == "refresh":
+        print(json.dumps(index.refresh(args.page_size, args.max_pages, args.restart), indent=2))
+    print(json.dumps(index.stats(), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,177 @@
+"""TTL + LRU cache for upstream JSON responses, with optional SQLite persistence.
+
+Values are stored as serialized JSON so the memory bound is measured in
+bytes and every hit returns a fresh object that callers may mutate freely.
+When ``db_path`` is set, entries are also written to a SQLite table so they
+survive restarts; the in-memory LRU stays the first lookup tier.
+"""
+
+import json
+import logging
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional
+
+from config import config
+
+logger = logging.getLogger(__name__)
+
+
+class ResponseCache:
+    """Thread-safe, size-bounded TTL cache keyed on normalized query parts."""
+
+    def __init__(
+        self,
+        ttl_seconds: float,
+        max_entries: int = 2000,
+        max_bytes: int = 64 * 1024 * 1024,
+        db_path: Optional[str] = None,
+    ):
+        """
+        Args:
+            ttl_seconds: Lifetime of each entry.
+            max_entries: Maximum number of in-memory entries.
+            max_bytes: Maximum total size of in-memory serialized values.
+            db_path: Optional SQLite file for a persistent second tier.
+        """
+        self.ttl = float(ttl_seconds)
+        self.max_entries = int(max_entries)
+        self.max_bytes = int(max_bytes)
+        self._mem: "OrderedDict[str, tuple]" = OrderedDict()  # key -> (expires, raw JSON)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+        self._db: Optional[sqlite3.Connection] = None
+        if db_path:
+            try:
+                self._db = sqlite3.connect(db_path, check_same_thread=False)
+                self._db.execute(
+                    "CREATE TABLE IF NOT EXISTS response_cache "
+                    "(key TEXT PRIMARY KEY, value TEXT NOT NULL, expires REAL NOT NULL)"
+                )
+                self._db.execute("DELETE FROM response_cache WHERE expires < ?", (time.time(),))
+                self._db.commit()
+            except sqlite3.Error as exc:
+                logger.warning("Response cache DB unavailable (%s); using memory only", exc)
+                self._db = None
+
+    @staticmethod
+    def make_key(namespace: str, *parts: Any) -> str:
+        return namespace + "|" + json.dumps(parts, sort_keys=True, separators=(",", ":"), default=str)
+
+    # ------------------------------------------------------------------
+    # Get / Set
+    # ------------------------------------------------------------------
+
+    def get(self, key: str) -> Optional[Any]:
+        """Return the cached value for *key*, or None if missing or expired."""
+        now = time.time()
+        with self._lock:
+            entry = self._mem.get(key)
+            if entry is not None:
+                expires, raw = entry
+                if expires >= now:
+                    self._mem.move_to_end(key)
+                    self.hits += 1
+                    return json.loads(raw)
+                self._drop(key)
+
+            if self._db is not None:
+                row = self._db.execute(
+                    "SELECT value, expires FROM response_cache WHERE key = ?", (key,)
+                ).fetchone()
+                if row is not None and row[1] >= now:
+                    self._store(key, row[0], row[1])
+                    self.hits += 1
+                    return json.loads(row[0])
+
+            self.misses += 1
+            return None
+
+    def set(self, key: str, value: Any) -> None:
+        raw = json.dumps(value, separators=(",", ":"))
+        expires = time.time() + self.ttl
+        with self._lock:
+            self._store(key, raw, expires)
+            if self._db is not None:
+                try:
+                    self._db.execute(
+                        "INSERT OR REPLACE INTO response_cache (key, value, expires) VALUES (?, ?, ?)",
+                        (key, raw, expires),
+                    )
+                    self._db.commit()
+                except sqlite3.Error as exc:
+                    logger.warning("Response cache DB write failed: %s", exc)
+
+    def get_or_fetch(self, key: str, fetch: Callable[[], Any]) -> Any:
+        """Return the cached value or call *fetch*, cache and return its result.
+
+        Exceptions from *fetch* propagate and nothing is cached.
+        """
+        cached = self.get(key)
+        if cached is not None:
+            return cached
+        value = fetch()
+        self.set(key, value)
+        return value
+
+    def clear(self) -> None:
+        with self._lock:
+            self._mem.clear()
+            self._bytes = 0
+            if self._db is not None:
+                self._db.execute("DELETE FROM response_cache")
+                self._db.commit()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "entries": len(self._mem),
+                "bytes": self._bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "persistent": self._db is not None,
+            }
+
+    # ------------------------------------------------------------------
+    # Internals (caller holds the lock)
+    # ------------------------------------------------------------------
+
+    def _store(self, key: str, raw: str, expires: float) -> None:
+        if key in self._mem:
+            self._drop(key)
+        if len(raw) > self.max_bytes:
+            return
+        self._mem[key] = (expires, raw)
+        self._bytes += len(raw)
+        while len(self._mem) > self.max_entries or self._bytes > self.max_bytes:
+            oldest = next(iter(self._mem))
+            self._drop(oldest)
+
+    def _drop(self, key: str) -> None:
+        _, raw = self._mem.pop(key)
+        self._bytes -= len(raw)
+
+
+_gcgis_cache: Optional[ResponseCache] = None
+_gcgis_lock = threading.Lock()
+
+
+def get_gcgis_cache() -> Optional[ResponseCache]:
+    """Return the process-wide GCGIS response cache, or None when disabled."""
+    global _gcgis_cache
+    if not config.GCGIS_CACHE_ENABLED:
+        return None
+    with _gcgis_lock:
+        if _gcgis_cache is None:
+            _gcgis_cache = ResponseCache(
+                ttl_seconds=config.GCGIS_CACHE_TTL_S,
+                max_entries=config.GCGIS_CACHE_MAX_ENTRIES,
+                max_bytes=int(config.GCGIS_CACHE_MAX_MB * 1024 * 1024),
+                db_path=config.GCGIS_CACHE_DB or None,
+            )
+    return _gcgis_cache
@@ -5,11 +5,21 @@ Usage:
 """
 
 import argparse
+import hashlib
+import io
+import json
 import logging
+import threading
+from collections import OrderedDict
 from pathlib import Path
 from typing import Dict, List, Optional
 
-import pandas as pd
+import numpy as np
+import xlsxwriter
+from xlsxwriter.utility import quote_sheetname, xl_col_to_name
+
+from config import config
+from metrics import span
 
 logger = logging.getLogger(__name__)
 
@@ -86,123 +96,445 @@ BID_SECTIONS: Dict[str, List[dict]] = {
 }
 
 
+COLUMNS = ["Item", "Description", "Unit", "Qty", "Unit Price", "Amount"]
+FIRST_ITEM_ROW = 3  # title on row 0, header on row 2
+
+
+def _add_formats(workbook) -> Dict[str, object]:
+    return {
+        "header": workbook.add_format({
+            "bold": True, "bg_color": "#2F5496", "font_color": "#FFFFFF",
+            "border": 1, "font_size": 11, "text_wrap": True,
+        }),
+        "currency": workbook.add_format({"num_format": "$#,##0.00", "border": 1}),
+        "qty": workbook.add_format({"num_format": "#,##0.00", "border": 1}),
+        "text": workbook.add_format({"border": 1, "text_wrap": True}),
+        "total": workbook.add_format({
+            "bold": True, "num_format": "$#,##0.00", "border": 1,
+            "bg_color": "#D6E4F0",
+        }),
+        "title": workbook.add_format({
+            "bold": True, "font_size": 14, "font_color": "#2F5496",
+        }),
+    }
+
+
+def _section_arrays(section_lists: List[List[dict]]) -> tuple:
+    """Qty, unit price and amount for every item of every section in one pass.
+
+    Args:
+        section_lists: Item lists, one per section (any number of scenarios
+            flattened together).
+
+    Returns:
+        Tuple of (qty, price, amount) flat arrays, per-section totals, and
+        the start offset of each section in the flat arrays.
+    """
+    counts = np.fromiter((len(items) for items in section_lists), dtype=np.int64, count=len(section_lists))
+    n = int(counts.sum())
+    qty = np.fromiter((float(i.get("Qty") or 0) for items in section_lists for i in items), np.float64, n)
+    price = np.fromiter((float(i.get("Unit Price") or 0) for items in section_lists for i in items), np.float64, n)
+    amount = qty * price
+    section_index = np.repeat(np.arange(counts.size), counts)
+    totals = np.bincount(section_index, weights=amount, minlength=counts.size)
+    starts = np.cumsum(counts) - counts
+    return qty, price, amount, totals, starts
+
+
+def _write_section(
+    workbook, fmt: Dict, sheet_name: str, title: str, items: List[dict],
+    qty: np.ndarray, price: np.ndarray, amount: np.ndarray, total: float,
+) -> str:
+    """Stream one section sheet, top to bottom, with live Amount/total formulas.
+
+    Returns:
+        Reference to the section-total cell, for the summary sheets.
+    """
+    ws = workbook.add_worksheet(sheet_name)
+    ws.set_column(0, 0, 8)
+    ws.set_column(1, 1, 35)
+    ws.set_column(2, 2, 8)
+    ws.set_column(3, 3, 12)
+    ws.set_column(4, 5, 16)
+
+    ws.write_string(0, 0, title, fmt["title"])
+    ws.write_row(2, 0, COLUMNS, fmt["header"])
+
+    row = FIRST_ITEM_ROW
+    for item, q, p, a in zip(items, qty.tolist(), price.tolist(), amount.tolist()):
+        excel_row = row + 1
+        ws.write_string(row, 0, str(item.get("Item", "")), fmt["text"])
+        ws.write_string(row, 1, str(item.get("Description", "")), fmt["text"])
+        ws.write_string(row, 2, str(item.get("Unit", "")), fmt["text"])
+        ws.write_number(row, 3, q, fmt["qty"])
+        ws.write_number(row, 4, p, fmt["currency"])
+        ws.write_formula(row, 5, f"=D{excel_row}*E{excel_row}", fmt["currency"], a)
+        row += 1
+
+    ws.write_string(row, 4, "Section Total:", fmt["total"])
+    if items:
+        formula = f"=SUM(F{FIRST_ITEM_ROW + 1}:F{row})"
+        ws.write_formula(row, 5, formula, fmt["total"], float(total))
+    else:
+        ws.write_number(row, 5, 0, fmt["total"])
+    return f"{quote_sheetname(sheet_name)}!F{row + 1}"
+
+
+def _write_workbook(workbook, project_name: str, sections: Dict[str, List[dict]]) -> None:
+    """Write the section sheets and the Summary sheet, then close *workbook*."""
+    try:
+        fmt = _add_formats(workbook)
+        qty, price, amount, totals, starts = _section_arrays(list(sections.values()))
+
+        summary_rows = []
+        for k, (section_name, items) in enumerate(sections.items()):
+            # Truncate sheet name to 31 chars (Excel limit)
+            sheet_name = section_name[:31]
+            rows = slice(starts[k], starts[k] + len(items))
+            ref = _write_section(
+                workbook, fmt, sheet_name, f"{project_name} — {section_name}", items,
+                qty[rows], price[rows], amount[rows], totals[k],
+            )
+            summary_rows.append((section_name, len(items), float(totals[k]), ref))
+
+        # Summary sheet
+        ws_sum = workbook.add_worksheet("Summary")
+        ws_sum.set_column(0, 0, 25)
+        ws_sum.set_column(1, 1, 14)
+        ws_sum.set_column(2, 2, 18)
+        ws_sum.write_string(0, 0, f"{project_name} — Bid Summary", fmt["title"])
+        ws_sum.write_row(2, 0, ["Section", "Line Items", "Section Total"], fmt["header"])
+
+        row = FIRST_ITEM_ROW
+        for section_name, count, total, ref in summary_rows:
+            ws_sum.write_string(row, 0, section_name, fmt["text"])
+            ws_sum.write_number(row, 1, count, fmt["qty"])
+            ws_sum.write_formula(row, 2, f"={ref}", fmt["currency"], total)
+            row += 1
+
+        ws_sum.write_string(row, 1, "Grand Total:", fmt["total"])
+        if summary_rows:
+            ws_sum.write_formula(row, 2, f"=SUM(C{FIRST_ITEM_ROW + 1}:C{row})", fmt["total"], float(totals.sum()))
+        else:
+            ws_sum.write_number(row, 2, 0, fmt["total"])
+    finally:
+        workbook.close()
+
+
+# ---------------------------------------------------------------------------
+# Multi-scenario workbooks
+# ---------------------------------------------------------------------------
+
+_INVALID_SHEET_CHARS = str.maketrans({c: "_" for c in "[]:*?/\\"})
+
+
+def _unique_sheet_name(name: str, used: set) -> str:
+    """Excel-safe sheet name (31 chars, no []:*?/\\), unique in *used*."""
+    base = name.translate(_INVALID_SHEET_CHARS).strip("'")[:31] or "Sheet"
+    candidate, n = base, 2
+    while candidate.lower() in used:
+        suffix = f" ({n})"
+        candidate = base[: 31 - len(suffix)] + suffix
+        n += 1
+    used.add(candidate.lower())
+    return candidate
+
+
+def _write_scenarios(
+    workbook, project_name: str, scenarios: List[Dict], default_sections: Dict[str, List[dict]],
+) -> None:
+    """Comparison + Delta sheets, then one sheet per section per scenario.
+
+    The first scenario is the baseline for the Delta sheet; scenarios
+    without ``sections`` use *default_sections*, so every scenario prices
+    the same item codes.  Every summary cell is a formula into the section
+    sheets; row positions are known up front, so the summary sheets are
+    streamed before the section sheets.
+    """
+    try:
+        fmt = _add_formats(workbook)
+        names = [str(sc.get("name") or f"Scenario {i + 1}") for i, sc in enumerate(scenarios)]
+        section_sets = [sc.get("sections") or default_sections for sc in scenarios]
+
+        # One vectorized pass over every item of every scenario
+        flat = [(s, name, items) for s, secs in enumerate(section_sets) for name, items in secs.items()]
+        qty, price, amount, totals, starts = _section_arrays([items for _, _, items in flat])
+
+        used = {"comparison", "delta"}
+        sheets = {}
+        for k, (s, section_name, items) in enumerate(flat):
+            sheets[(s, section_name)] = (k, _unique_sheet_name(f"{names[s]} - {section_name}", used))
+
+        section_order = list(dict.fromkeys(section_name for _, section_name, _ in flat))
+        grand = np.zeros(len(scenarios))
+        np.add.at(grand, [s for s, _, _ in flat], totals)
+
+        def total_ref(s: int, section_name: str) -> Optional[str]:
+            if (s, section_name) not in sheets:
+                return None
+            k, sheet = sheets[(s, section_name)]
+            return f"{quote_sheetname(sheet)}!F{FIRST_ITEM_ROW + len(flat[k][2]) + 1}"
+
+        # Comparison: section totals side by side
+        ws = workbook.add_worksheet("Comparison")
+        ws.set_column(0, 0, 25)
+        ws.set_column(1, len(scenarios), 18)
+        ws.write_string(0, 0, f"{project_name} — Scenario Comparison", fmt["title"])
+        ws.write_row(2, 0, ["Section"] + names, fmt["header"])
+        row = FIRST_ITEM_ROW
+        for section_name in section_order:
+            ws.write_string(row, 0, section_name, fmt["text"])
+            for s in range(len(scenarios)):
+                ref = total_ref(s, section_name)
+                if ref is None:
+                    ws.write_number(row, s + 1, 0, fmt["currency"])
+                else:
+                    k, _ = sheets[(s, section_name)]
+                    ws.write_formula(row, s + 1, f"={ref}", fmt["currency"], float(totals[k]))
+            row += 1
+        ws.write_string(row, 0, "Grand Total:", fmt["total"])
+        for s in range(len(scenarios)):
+            col = xl_col_to_name(s + 1)
+            if section_order:
+                formula = f"=SUM({col}{FIRST_ITEM_ROW + 1}:{col}{row})"
+                ws.write_formula(row, s + 1, formula, fmt["total"], float(grand[s]))
+            else:
+                ws.write_number(row, s + 1, 0, fmt["total"])
+        grand_row = row + 1
+
+        # Delta: every line item against the baseline scenario
+        ws = workbook.add_worksheet("Delta")
+        others = list(range(1, len(scenarios)))
+        ws.set_column(0, 0, 18)
+        ws.set_column(1, 1, 8)
+        ws.set_column(2, 2, 35)
+        ws.set_column(3, 4 + 2 * len(others), 16)
+        ws.write_string(0, 0, f"{project_name} — Change vs {names[0]}", fmt["title"])
+        header = ["Section", "Item", "Description", f"{names[0]} Qty", f"{names[0]} Amount"]
+        for s in others:
+            header += [f"{names[s]} Δ Qty", f"{names[s]} Δ Amount"]
+        ws.write_row(2, 0, header, fmt["header"])
+
+        # Item rows keyed on (section, item code), in first-seen order
+        positions: Dict[tuple, Dict[int, int]] = {}
+        labels: Dict[tuple, dict] = {}
+        for k, (s, section_name, items) in enumerate(flat):
+            for j, item in enumerate(items):
+                key = (section_name, str(item.get("Item", "")))
+                positions.setdefault(key, {}).setdefault(s, int(starts[k]) + j)
+                labels.setdefault(key, item)
+
+        def cell(s: int, key: tuple, col: str) -> tuple:
+            """(cell reference or None, cached value) for a scenario's Qty/Amount."""
+            idx = positions[key].get(s)
+            if idx is None:
+                return None, 0.0
+            k, sheet = sheets[(s, key[0])]
+            row_no = FIRST_ITEM_ROW + (idx - int(starts[k])) + 1
+            values = qty if col == "D" else amount
+            return f"{quote_sheetname(sheet)}!{col}{row_no}", float(values[idx])
+
+        def write_delta(row: int, col: int, new: tuple, base: tuple, cell_fmt) -> None:
+            (ref, value), (base_ref, base_value) = new, base
+            if ref is None and base_ref is None:
+                ws.write_number(row, col, 0, cell_fmt)
+            else:
+                formula = f"={ref or 0}-{base_ref}" if base_ref else f"={ref}"
+                ws.write_formula(row, col, formula, cell_fmt, value - base_value)
+
+        row = FIRST_ITEM_ROW
+        for key, item in labels.items():
+            ws.write_string(row, 0, key[0], fmt["text"])
+            ws.write_string(row, 1, key[1], fmt["text"])
+            ws.write_string(row, 2, str(item.get("Description", "")), fmt["text"])
+            base_q, base_a = cell(0, key, "D"), cell(0, key, "F")
+            write_delta(row, 3, base_q, (None, 0.0), fmt["qty"])
+            write_delta(row, 4, base_a, (None, 0.0), fmt["currency"])
+            for n, s in enumerate(others):
+                write_delta(row, 5 + 2 * n, cell(s, key, "D"), base_q, fmt["qty"])
+                write_delta(row, 6 + 2 * n, cell(s, key, "F"), base_a, fmt["currency"])
+            row += 1
+        ws.write_string(row, 3, "Grand Total:", fmt["total"])
+        ws.write_formula(row, 4, f"=Comparison!B{grand_row}", fmt["total"], float(grand[0]))
+        for n, s in enumerate(others):
+            col = xl_col_to_name(s + 1)
+            ws.write_formula(
+                row, 6 + 2 * n, f"=Comparison!{col}{grand_row}-Comparison!B{grand_row}",
+                fmt["total"], float(grand[s] - grand[0]),
+            )
+
+        # Section sheets
+        for k, (s, section_name, items) in enumerate(flat):
+            rows = slice(starts[k], starts[k] + len(items))
+            _write_section(
+                workbook, fmt, sheets[(s, section_name)][1],
+                f"{project_name} — {names[s]} — {section_name}", items,
+                qty[rows], price[rows], amount[rows], totals[k],
+            )
+    finally:
+        workbook.close()
+
+
 def generate_workbook(
     output_path: str = "TSC_Liberty_Bid_Estimate.xlsx",
     project_name: str = "TSC Liberty",
     sections: Optional[Dict[str, List[dict]]] = None,
+    scenarios: Optional[List[Dict]] = None,
 ) -> Path:
     """Create an Excel workbook with formatted bid estimate sheets.
 
+    Rows are streamed straight into xlsxwriter in ``constant_memory`` mode.
+    Amounts, section totals and the Summary sheet are live formulas (with
+    cached values), so the workbook recalculates when a quantity or unit
+    price is edited.
+
     Args:
         output_path: Destination file path.
         project_name: Name shown in headers.
         sections: Override the default BID_SECTIONS dict.
+        scenarios: Instead of *sections*, a list of ``{"name", "sections"}``
+            layouts or phases; the workbook then has a Comparison sheet, a
+            Delta sheet (against the first scenario) and one sheet per
+            section per scenario.  *sections* is then the default for
+            scenarios that do not carry their own.
 
     Returns:
         Path to the generated workbook.
     """
-    sections = sections or BID_SECTIONS
     out = Path(output_path)
     out.parent.mkdir(parents=True, exist_ok=True)
 
-    with pd.ExcelWriter(str(out), engine="xlsxwriter") as writer:
-        workbook = writer.book
+    workbook = xlsxwriter.Workbook(str(out), {"constant_memory": True})
+    with span("workbook"):
+        if scenarios:
+            _write_scenarios(workbook, project_name, scenarios, sections or BID_SECTIONS)
+        else:
+            _write_workbook(workbook, project_name, sections or BID_SECTIONS)
+    logger.info("Workbook saved to %s", out)
+    return out
 
-        # Shared formats
-        header_fmt = workbook.add_format({
-            "bold": True, "bg_color": "#2F5496", "font_color": "#FFFFFF",
-            "border": 1, "font_size": 11, "text_wrap": True,
-        })
-        currency_fmt = workbook.add_format({"num_format": "$#,##0.00", "border": 1})
-        qty_fmt = workbook.add_format({"num_format": "#,##0.00", "border": 1})
-        text_fmt = workbook.add_format({"border": 1, "text_wrap": True})
-        total_fmt = workbook.add_format({
-            "bold": True, "num_format": "$#,##0.00", "border": 1,
-            "bg_color": "#D6E4F0",
-        })
-        title_fmt = workbook.add_format({
-            "bold": True, "font_size": 14, "font_color": "#2F5496",
-        })
 
-        all_rows: List[dict] = []
+def workbook_bytes(
+    project_name: str = "TSC Liberty",
+    sections: Optional[Dict[str, List[dict]]] = None,
+    scenarios: Optional[List[Dict]] = None,
+) -> bytes:
+    """Same workbook as :func:`generate_workbook`, built in memory.
 
-        for section_name, items in sections.items():
-            # Truncate sheet name to 31 chars (Excel limit)
-            sheet_name = section_name[:31]
-            df = pd.DataFrame(items)
-            df["Amount"] = df["Qty"] * df["Unit Price"]
-            df.to_excel(writer, sheet_name=sheet_name, startrow=2, index=False)
-
-            ws = writer.sheets[sheet_name]
-            ws.write(0, 0, f"{project_name} — {section_name}", title_fmt)
-
-            # Apply header format
-            for col_idx, col_name in enumerate(df.columns):
-                ws.write(2, col_idx, col_name, header_fmt)
-
-            # Apply cell formats
-            for row_idx in range(len(df)):
-                excel_row = row_idx + 3
-                ws.write(excel_row, 0, df.iloc[row_idx]["Item"], text_fmt)
-                ws.write(excel_row, 1, df.iloc[row_idx]["Description"], text_fmt)
-                ws.write(excel_row, 2, df.iloc[row_idx]["Unit"], text_fmt)
-                ws.write(excel_row, 3, df.iloc[row_idx]["Qty"], qty_fmt)
-                ws.write(excel_row, 4, df.iloc[row_idx]["Unit Price"], currency_fmt)
-                ws.write(excel_row, 5, df.iloc[row_idx]["Amount"], currency_fmt)
-
-            # Section total
-            total_row = len(df) + 3
-            ws.write(total_row, 4, "Section Total:", total_fmt)
-            ws.write(total_row, 5, df["Amount"].sum(), total_fmt)
-
-            # Column widths
-            ws.set_column(0, 0, 8)
-            ws.set_column(1, 1, 35)
-            ws.set_column(2, 2, 8)
-            ws.set_column(3, 3, 12)
-            ws.set_column(4, 5, 16)
-
-            for item in items:
-                row = dict(item)
-                row["Section"] = section_name
-                row["Amount"] = row["Qty"] * row["Unit Price"]
-                all_rows.append(row)
+    xlsxwriter's ``in_memory`` mode assembles the file in a ``BytesIO``
+    without the temp files that ``constant_memory`` streams through.
+    """
+    buf = io.BytesIO()
+    workbook = xlsxwriter.Workbook(buf, {"in_memory": True})
+    with span("workbook"):
+        if scenarios:
+            _write_scenarios(workbook, project_name, scenarios, sections or BID_SECTIONS)
+        else:
+            _write_workbook(workbook, project_name, sections or BID_SECTIONS)
+    return buf.getvalue()
 
-        # Summary sheet
-        summary_data = []
-        for section_name, items in sections.items():
-            df_sec = pd.DataFrame(items)
-            df_sec["Amount"] = df_sec["Qty"] * df_sec["Unit Price"]
-            summary_data.append({
-                "Section": section_name,
-                "Line Items": len(items),
-                "Section Total": df_sec["Amount"].sum(),
-            })
-
-        sdf = pd.DataFrame(summary_data)
-        sdf.to_excel(writer, sheet_name="Summary", startrow=2, index=False)
-        ws_sum = writer.sheets["Summary"]
-        ws_sum.write(0, 0, f"{project_name} — Bid Summary", title_fmt)
-
-        for col_idx, col_name in enumerate(sdf.columns):
-            ws_sum.write(2, col_idx, col_name, header_fmt)
-
-        for row_idx in range(len(sdf)):
-            excel_row = row_idx + 3
-            ws_sum.write(excel_row, 0, sdf.iloc[row_idx]["Section"], text_fmt)
-            ws_sum.write(excel_row, 1, sdf.iloc[row_idx]["Line Items"], qty_fmt)
-            ws_sum.write(excel_row, 2, sdf.iloc[row_idx]["Section Total"], currency_fmt)
-
-        grand_total_row = len(sdf) + 3
-        ws_sum.write(grand_total_row, 1, "Grand Total:", total_fmt)
-        ws_sum.write(grand_total_row, 2, sdf["Section Total"].sum(), total_fmt)
 
-        ws_sum.set_column(0, 0, 25)
-        ws_sum.set_column(1, 1, 14)
-        ws_sum.set_column(2, 2, 18)
+# ---------------------------------------------------------------------------
+# Content-addressed workbook cache
+# ---------------------------------------------------------------------------
 
-    logger.info("Workbook saved to %s", out)
-    return out
+def _canonical(value):
+    """Normalise numbers (1 == 1.0) and item-key order; keep section order."""
+    if isinstance(value, dict):
+        if _ordered(value):
+            return [[str(k), _canonical(v)] for k, v in value.items()]
+        return {str(k): _canonical(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_canonical(v) for v in value]
+    if isinstance(value, bool) or value is None or isinstance(value, str):
+        return value
+    if isinstance(value, (int, float)):
+        return float(value)
+    return str(value)
+
+
+def _ordered(value: dict) -> bool:
+    """Sections dicts (name -> item list) are ordered; item dicts are not."""
+    return bool(value) and all(isinstance(v, list) for v in value.values())
+
+
+def workbook_key(
+    project_name: str,
+    sections: Optional[Dict[str, List[dict]]] = None,
+    scenarios: Optional[List[Dict]] = None,
+) -> str:
+    """SHA-256 of the canonicalized project name, sections and scenarios.
+
+    *sections* is part of the key even with scenarios, as the default for
+    scenarios without their own.
+    """
+    payload = [project_name, _canonical(sections or BID_SECTIONS), _canonical(scenarios) if scenarios else None]
+    raw = json.dumps(payload, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class WorkbookCache:
+    """Thread-safe LRU of generated workbook bytes, bounded by count and size."""
+
+    def __init__(self, max_entries: int = 64, max_bytes: int = 32 * 1024 * 1024):
+        self.max_entries = int(max_entries)
+        self.max_bytes = int(max_bytes)
+        self._mem: "OrderedDict[str, bytes]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get_or_build(
+        self,
+        project_name: str,
+        sections: Optional[Dict[str, List[dict]]] = None,
+        scenarios: Optional[List[Dict]] = None,
+    ) -> tuple:
+        """Return ``(key, workbook bytes)``, building and caching on a miss."""
+        key = workbook_key(project_name, sections, scenarios)
+        with self._lock:
+            data = self._mem.get(key)
+            if data is not None:
+                self._mem.move_to_end(key)
+                self.hits += 1
+                return key, data
+            self.misses += 1
+
+        data = workbook_bytes(project_name, sections, scenarios)
+        with self._lock:
+            if key not in self._mem and len(data) <= self.max_bytes:
+                self._mem[key] = data
+                self._bytes += len(data)
+                while len(self._mem) > self.max_entries or self._bytes > self.max_bytes:
+                    _, dropped = self._mem.popitem(last=False)
+                    self._bytes -= len(dropped)
+        return key, data
+
+    def clear(self) -> None:
+        with self._lock:
+            self._mem.clear()
+            self._bytes = 0
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"entries": len(self._mem), "bytes": self._bytes, "hits": self.hits, "misses": self.misses}
+
+
+_cache: Optional[WorkbookCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_workbook_cache() -> WorkbookCache:
+    """Return the process-wide workbook cache (``ESTIMATE_CACHE_*`` limits)."""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = WorkbookCache(
+                max_entries=config.ESTIMATE_CACHE_MAX_ENTRIES,
+                max_bytes=int(config.ESTIMATE_CACHE_MAX_MB * 1024 * 1024),
+            )
+    return _cache
 
 
 # ---------------------------------------------------------------------------
@@ -0,0 +1,15 @@
+"""Gunicorn hooks (loaded automatically from the working directory).
+
+Server settings stay on the command line in the Procfile / nixpacks.toml.
+"""
+
+
+def post_fork(server, worker):
+    """Warm up heavy imports in each worker right after the fork.
+
+    Under ``--preload`` the app was imported in the master; starting the
+    warm-up thread here (not at import time) keeps it out of the master.
+    """
+    from lazy_modules import registry
+
+    registry.start_warm_up()
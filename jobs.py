@@ -0,0 +1,155 @@
+"""Background jobs for long-running requests (DEM download + terrain analysis).
+
+The app runs a single gunicorn worker with two request threads, so a slow
+OpenTopography download handled inline blocks every other request.  Routes
+can instead hand the work to :class:`JobManager`: the POST returns a job id
+immediately, a bounded thread pool runs the work, and the result is kept in
+an in-memory store until ``JOBS_RESULT_TTL_S`` after the job finishes.
+Clients poll ``GET /api/jobs/<id>``.
+
+The store lives in the worker process, which is fine for the single-worker
+deployment in the Procfile; with several workers a job is only visible from
+the worker that accepted it.
+"""
+
+import logging
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+
+from config import config
+
+logger = logging.getLogger(__name__)
+
+
+class JobQueueFull(RuntimeError):
+    """Raised when the number of queued + running jobs is at the limit."""
+
+
+class Job:
+    """One unit of background work and its outcome."""
+
+    def __init__(self, kind: str, params: Optional[Dict] = None):
+        self.id = uuid.uuid4().hex[:12]
+        self.kind = kind
+        self.params = params or {}
+        self.status = "queued"
+        self.created = time.time()
+        self.started: Optional[float] = None
+        self.finished: Optional[float] = None
+        self.result: Any = None
+        self.error: Optional[str] = None
+        self.error_type: Optional[str] = None
+
+    @property
+    def is_finished(self) -> bool:
+        return self.status in ("done", "failed")
+
+    def to_dict(self, include_result: bool = True) -> Dict:
+        out = {
+            "job_id": self.id,
+            "kind": self.kind,
+            "status": self.status,
+            "created": self.created,
+            "started": self.started,
+            "finished": self.finished,
+            "elapsed_s": round((self.finished or time.time()) - (self.started or self.created), 2),
+            "error": self.error,
+            "error_type": self.error_type,
+        }
+        if include_result and self.status == "done":
+            out["result"] = self.result
+        return out
+
+
+class JobManager:
+    """Bounded background executor plus a TTL result store."""
+
+    def __init__(
+        self,
+        max_workers: Optional[int] = None,
+        max_pending: Optional[int] = None,
+        ttl_seconds: Optional[float] = None,
+    ):
+        """
+        Args:
+            max_workers: Jobs running at once (``JOBS_MAX_WORKERS``).
+            max_pending: Extra jobs allowed to wait (``JOBS_MAX_PENDING``);
+                beyond that :meth:`submit` raises :class:`JobQueueFull`.
+            ttl_seconds: How long finished jobs are kept (``JOBS_RESULT_TTL_S``).
+        """
+        self.max_workers = max_workers or config.JOBS_MAX_WORKERS
+        self.max_pending = config.JOBS_MAX_PENDING if max_pending is None else max_pending
+        self.ttl = float(config.JOBS_RESULT_TTL_S if ttl_seconds is None else ttl_seconds)
+        self._executor = ThreadPoolExecutor(self.max_workers, thread_name_prefix="job")
+        self._jobs: "OrderedDict[str, Job]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def submit(self, kind: str, fn: Callable[..., Any], *args, params: Optional[Dict] = None, **kwargs) -> Job:
+        """Queue ``fn(*args, **kwargs)`` and return its job without waiting.
+
+        Raises:
+            JobQueueFull: If ``max_workers + max_pending`` jobs are already active.
+        """
+        job = Job(kind, params)
+        with self._lock:
+            self._purge()
+            active = sum(1 for j in self._jobs.values() if not j.is_finished)
+            if active >= self.max_workers + self.max_pending:
+                raise JobQueueFull(f"{active} jobs already queued or running; try again shortly")
+            self._jobs[job.id] = job
+        self._executor.submit(self._run, job, fn, args, kwargs)
+        logger.info("Job %s (%s) queued", job.id, kind)
+        return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        with self._lock:
+            self._purge()
+            return self._jobs.get(job_id)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            self._purge()
+            jobs = list(self._jobs.values())
+        counts: Dict[str, int] = {}
+        for job in jobs:
+            counts[job.status] = counts.get(job.status, 0) + 1
+        return {"max_workers": self.max_workers, "max_pending": self.max_pending, "ttl_s": self.ttl, **counts}
+
+    def _run(self, job: Job, fn: Callable[..., Any], args: tuple, kwargs: dict) -> None:
+        job.status, job.started = "running", time.time()
+        try:
+            job.result = fn(*args, **kwargs)
+            job.status = "done"
+        except Exception as exc:
+            if isinstance(exc, ValueError):
+                logger.error("Job %s (%s) failed: %s", job.id, job.kind, exc)
+            else:
+                logger.exception("Job %s (%s) failed", job.id, job.kind)
+            job.error, job.error_type, job.status = str(exc), type(exc).__name__, "failed"
+        finally:
+            job.finished = time.time()
+            logger.info("Job %s (%s) %s in %.1fs", job.id, job.kind, job.status, job.finished - job.started)
+
+    def _purge(self) -> None:
+        """Drop finished jobs older than the TTL (caller holds the lock)."""
+        cutoff = time.time() - self.ttl
+        expired = [jid for jid, j in self._jobs.items() if j.is_finished and j.finished < cutoff]
+        for jid in expired:
+            del self._jobs[jid]
+
+
+_manager: Optional[JobManager] = None
+_manager_lock = threading.Lock()
+
+
+def get_job_manager() -> JobManager:
+    """Return the process-wide job manager."""
+    global _manager
+    with _manager_lock:
+        if _manager is None:
+            _manager = JobManager()
+    return _manager
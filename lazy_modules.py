@@ -0,0 +1,164 @@
+"""Lazy module registry with import timing and background warm-up.
+
+Route handlers reach their heavy dependencies (numpy/scipy through the
+terrain analysis, shapely, xlsxwriter, requests through the GCGIS fetcher)
+through :data:`registry` instead of importing them at module level, so
+importing ``app`` stays cheap.  Each first import is timed and reported by
+``/api/debug``.
+
+Warm-up imports every registered module on a daemon thread.  It is started
+per process (the owning PID is recorded), never at import time: with
+gunicorn ``--preload`` the app is imported in the master, and a thread
+started there would not survive the fork (or could fork mid-import while
+holding the import lock).  ``gunicorn.conf.py`` starts it in ``post_fork``;
+elsewhere the first request does.
+"""
+
+import importlib
+import logging
+import os
+import threading
+import time
+from types import ModuleType
+from typing import Dict, Iterable, Optional
+
+from config import config
+
+logger = logging.getLogger(__name__)
+
+
+class LazyModule:
+    """Attribute access imports the target module on first use."""
+
+    def __init__(self, registry: "ModuleRegistry", alias: str):
+        self._registry = registry
+        self._alias = alias
+
+    def __getattr__(self, attr: str):
+        return getattr(self._registry.load(self._alias), attr)
+
+    def __repr__(self) -> str:
+        return f"<LazyModule {self._alias}>"
+
+
+class ModuleRegistry:
+    """Named modules imported on demand, with per-module import times."""
+
+    def __init__(self):
+        self._paths: Dict[str, str] = {}
+        self._modules: Dict[str, ModuleType] = {}
+        self._import_ms: Dict[str, float] = {}
+        self._errors: Dict[str, str] = {}
+        self._lock = threading.RLock()
+        self._warm_pid: Optional[int] = None
+        self._warm_thread: Optional[threading.Thread] = None
+        self._warm_ms: Optional[float] = None
+
+    def register(self, alias: str, module_path: str) -> LazyModule:
+        """Register *module_path* under *alias* and return a lazy proxy."""
+        self._paths[alias] = module_path
+        return LazyModule(self, alias)
+
+    def load(self, alias: str) -> ModuleType:
+        """Import (once) and return the module registered as *alias*.
+
+        Raises:
+            KeyError: If *alias* is not registered.
+            ImportError: Propagated from the import; the error is recorded.
+        """
+        module = self._modules.get(alias)
+        if module is not None:
+            return module
+        path = self._paths[alias]
+        with self._lock:
+            module = self._modules.get(alias)
+            if module is not None:
+                return module
+            started = time.perf_counter()
+            try:
+                module = importlib.import_module(path)
+            except Exception as exc:
+                self._errors[alias] = f"{type(exc).__name__}: {exc}"
+                raise
+            self._import_ms[alias] = (time.perf_counter() - started) * 1000.0
+            self._errors.pop(alias, None)
+            self._modules[alias] = module
+        logger.debug("Imported %s (%s) in %.1f ms", alias, path, self._import_ms[alias])
+        return module
+
+    def is_loaded(self, alias: str) -> bool:
+        return alias in self._modules
+
+    # ------------------------------------------------------------------
+    # Warm-up
+    # ------------------------------------------------------------------
+
+    def warm_up(self, aliases: Optional[Iterable[str]] = None) -> None:
+        """Import *aliases* (default: all registered) in order, logging failures."""
+        started = time.perf_counter()
+        for alias in list(aliases or self._paths):
+            try:
+                self.load(alias)
+            except Exception as exc:
+                logger.warning("Warm-up import of %s failed: %s", alias, exc)
+        self._warm_ms = (time.perf_counter() - started) * 1000.0
+        logger.info("Module warm-up finished in %.0f ms", self._warm_ms)
+
+    def start_warm_up(self, aliases: Optional[Iterable[str]] = None) -> bool:
+        """Start :meth:`warm_up` on a daemon thread, once per process.
+
+        Returns:
+            True if a thread was started by this call.
+        """
+        if not config.WARMUP_ENABLED:
+            return False
+        pid = os.getpid()
+        if self._warm_pid == pid:
+            return False
+        with self._lock:
+            if self._warm_pid == pid:
+                return False
+            self._warm_pid = pid
+            self._warm_ms = None
+            self._warm_thread = threading.Thread(
+                target=self.warm_up, args=(aliases,), name="module-warmup", daemon=True,
+            )
+        self._warm_thread.start()
+        return True
+
+    def stats(self) -> Dict:
+        warming = self._warm_thread is not None and self._warm_thread.is_alive() and self._warm_pid == os.getpid()
+        return {
+            "modules": {
+                alias: {
+                    "module": path,
+                    "loaded": alias in self._modules,
+                    "import_ms": round(self._import_ms[alias], 1) if alias in self._import_ms else None,
+                    "error": self._errors.get(alias),
+                }
+                for alias, path in self._paths.items()
+            },
+            "warm_up": {
+                "enabled": config.WARMUP_ENABLED,
+                "running": warming,
+                "elapsed_ms": round(self._warm_ms, 1) if self._warm_ms is not None else None,
+            },
+        }
+
+
+registry = ModuleRegistry()
+
+# Warm-up order: shared heavy libraries first, then the modules built on them
+numpy = registry.register("numpy", "numpy")
+scipy_ndimage = registry.register("scipy.ndimage", "scipy.ndimage")
+shapely = registry.register("shapely", "shapely")
+http_client = registry.register("http_client", "data_fetchers.http_client")
+gcgis = registry.register("gcgis", "data_fetchers.gcgis_fetcher")
+elevation = registry.register("elevation", "data_fetchers.elevation_fetcher")
+terrain = registry.register("terrain", "analysis.terrain_analysis")
+rasterize = registry.register("rasterize", "analysis.rasterize")
+jobs = registry.register("jobs", "jobs")
+batch = registry.register("batch", "batch_analysis")
+takeoff = registry.register("takeoff", "takeoff")
+proforma = registry.register("proforma", "proforma")
+estimate_workbook = registry.register("estimate_workbook", "estimate_workbook")
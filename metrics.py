@@ -0,0 +1,228 @@
+"""Timing spans and latency histograms for the request hot paths.
+
+Three histogram families are kept per process:
+
+* ``stage``    — pipeline stages wrapped in :func:`span` (parcel fetch, DEM
+  fetch and parse, slope, buildable, pad, cut/fill, workbook, serialize).
+* ``upstream`` — every ``http_client`` call, labelled by host.
+* ``http``     — whole requests, labelled by Flask endpoint and method.
+
+Each series has fixed Prometheus buckets (for ``/api/metrics``) plus a small
+window of recent samples for p50/p95/p99.  Spans opened while a request is
+being handled are also collected per request, so the app can return them in
+a ``Server-Timing`` header.  Background jobs have no request and only feed
+the histograms.
+
+Standard library only: the app imports this module eagerly.
+"""
+
+import contextvars
+import logging
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from config import config
+
+logger = logging.getLogger(__name__)
+
+METRIC_PREFIX = "landtakeoffs"
+
+# Upper bounds in seconds
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+QUANTILES = (0.5, 0.95, 0.99)
+RECENT_SAMPLES = 1024
+
+FAMILIES = {
+    "stage": ("stage",),
+    "upstream": ("host",),
+    "http": ("endpoint", "method"),
+}
+FAMILY_HELP = {
+    "stage": "Duration of an analysis or export pipeline stage.",
+    "upstream": "Duration of an upstream HTTP call.",
+    "http": "Duration of an HTTP request handled by the app.",
+}
+ERROR_HELP = {
+    "upstream": "Failed upstream HTTP calls (exceptions and 5xx).",
+    "http": "Requests answered with a 5xx or ended by an unhandled exception.",
+}
+
+
+class Histogram:
+    """Cumulative bucket counts plus a window of recent samples for quantiles."""
+
+    def __init__(self):
+        self.buckets = [0] * len(BUCKETS)
+        self.count = 0
+        self.sum = 0.0
+        self.errors = 0
+        self.recent: deque = deque(maxlen=RECENT_SAMPLES)
+
+    def observe(self, seconds: float, failed: bool = False) -> None:
+        self.count += 1
+        self.sum += seconds
+        if failed:
+            self.errors += 1
+        self.recent.append(seconds)
+        for i, bound in enumerate(BUCKETS):
+            if seconds <= bound:
+                self.buckets[i] += 1
+                break
+
+    def quantiles(self) -> Dict[float, float]:
+        """Nearest-rank quantiles over the recent window (0.0 when empty)."""
+        samples = sorted(self.recent)
+        if not samples:
+            return {q: 0.0 for q in QUANTILES}
+        last = len(samples) - 1
+        return {q: samples[min(last, int(round(q * last)))] for q in QUANTILES}
+
+
+class MetricsRegistry:
+    """Thread-safe histograms keyed on (family, label values)."""
+
+    def __init__(self):
+        self._series: Dict[str, Dict[Tuple[str, ...], Histogram]] = {name: {} for name in FAMILIES}
+        self._lock = threading.Lock()
+
+    def observe(self, family: str, labels: Tuple[str, ...], seconds: float, failed: bool = False) -> None:
+        with self._lock:
+            series = self._series[family]
+            hist = series.get(labels)
+            if hist is None:
+                hist = series[labels] = Histogram()
+            hist.observe(seconds, failed)
+
+    def snapshot(self) -> Dict[str, Dict[str, dict]]:
+        """JSON-ready count / mean / p50 / p95 / p99 (ms) per series."""
+        out: Dict[str, Dict[str, dict]] = {}
+        with self._lock:
+            for family, series in self._series.items():
+                out[family] = {}
+                for labels, hist in sorted(series.items()):
+                    q = hist.quantiles()
+                    out[family]["/".join(labels)] = {
+                        "count": hist.count,
+                        "errors": hist.errors,
+                        "mean_ms": round(hist.sum / hist.count * 1000, 2) if hist.count else 0.0,
+                        **{f"p{int(k * 100)}_ms": round(v * 1000, 2) for k, v in q.items()},
+                    }
+        return out
+
+    def render_prometheus(self) -> str:
+        """Prometheus text exposition (format 0.0.4)."""
+        lines: List[str] = []
+        with self._lock:
+            for family, series in self._series.items():
+                label_names = FAMILIES[family]
+                hist_name = f"{METRIC_PREFIX}_{family}_duration_seconds"
+                summary_name = f"{METRIC_PREFIX}_{family}_latency_seconds"
+                lines += [f"# HELP {hist_name} {FAMILY_HELP[family]}", f"# TYPE {hist_name} histogram"]
+                for labels, hist in sorted(series.items()):
+                    base = _labels(label_names, labels)
+                    cumulative = 0
+                    for bound, n in zip(BUCKETS, hist.buckets):
+                        cumulative += n
+                        lines.append(f'{hist_name}_bucket{{{base},le="{bound:g}"}} {cumulative}')
+                    lines.append(f'{hist_name}_bucket{{{base},le="+Inf"}} {hist.count}')
+                    lines.append(f"{hist_name}_sum{{{base}}} {hist.sum:.6f}")
+                    lines.append(f"{hist_name}_count{{{base}}} {hist.count}")
+
+                lines += [
+                    f"# HELP {summary_name} {FAMILY_HELP[family]} Quantiles over the last {RECENT_SAMPLES} calls.",
+                    f"# TYPE {summary_name} summary",
+                ]
+                for labels, hist in sorted(series.items()):
+                    base = _labels(label_names, labels)
+                    for q, value in hist.quantiles().items():
+                        lines.append(f'{summary_name}{{{base},quantile="{q:g}"}} {value:.6f}')
+                    lines.append(f"{summary_name}_sum{{{base}}} {hist.sum:.6f}")
+                    lines.append(f"{summary_name}_count{{{base}}} {hist.count}")
+
+            for family, help_text in ERROR_HELP.items():
+                errors_name = f"{METRIC_PREFIX}_{family}_errors_total"
+                lines += [f"# HELP {errors_name} {help_text}", f"# TYPE {errors_name} counter"]
+                for labels, hist in sorted(self._series[family].items()):
+                    lines.append(f"{errors_name}{{{_labels(FAMILIES[family], labels)}}} {hist.errors}")
+        return "\n".join(lines) + "\n"
+
+    def clear(self) -> None:
+        with self._lock:
+            for series in self._series.values():
+                series.clear()
+
+
+def _labels(names: Tuple[str, ...], values: Tuple[str, ...]) -> str:
+    def escape(value: str) -> str:
+        return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+    return ",".join(f'{name}="{escape(value)}"' for name, value in zip(names, values))
+
+
+registry = MetricsRegistry()
+
+# Per-request timings: list of (name, description, seconds) or None outside a request
+_request_timings: contextvars.ContextVar[Optional[List[Tuple[str, str, float]]]] = contextvars.ContextVar(
+    "request_timings", default=None,
+)
+
+
+# ---------------------------------------------------------------------------
+# Recording
+# ---------------------------------------------------------------------------
+
+@contextmanager
+def span(stage: str) -> Iterator[None]:
+    """Time the enclosed block as pipeline *stage* (also usable as a decorator)."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        registry.observe("stage", (stage,), elapsed)
+        timings = _request_timings.get()
+        if timings is not None:
+            timings.append((stage, "", elapsed))
+
+
+def observe_upstream(host: str, seconds: float, failed: bool = False) -> None:
+    """Record one upstream HTTP call (called from ``http_client``)."""
+    registry.observe("upstream", (host,), seconds, failed)
+    timings = _request_timings.get()
+    if timings is not None:
+        timings.append(("upstream", host, seconds))
+
+
+def begin_request() -> None:
+    """Start collecting spans for the current request."""
+    _request_timings.set([])
+
+
+def end_request(endpoint: str, method: str, seconds: float, failed: bool = False) -> Optional[str]:
+    """Record the request and return its ``Server-Timing`` value (if enabled)."""
+    registry.observe("http", (endpoint, method), seconds, failed)
+    timings = _request_timings.get()
+    _request_timings.set(None)
+    if not config.SERVER_TIMING_ENABLED or timings is None:
+        return None
+    return server_timing(timings, seconds)
+
+
+def server_timing(timings: List[Tuple[str, str, float]], total_seconds: float) -> str:
+    """Format spans as a ``Server-Timing`` header, merging repeats of a name."""
+    merged: Dict[Tuple[str, str], List[float]] = {}
+    for name, desc, seconds in timings:
+        entry = merged.setdefault((name, desc), [0.0, 0])
+        entry[0] += seconds
+        entry[1] += 1
+    parts = []
+    for (name, desc), (seconds, calls) in merged.items():
+        label = desc if calls == 1 else f"{desc} x{calls}".strip()
+        part = f"{name};dur={seconds * 1000:.1f}"
+        if label:
+            part += f';desc="{label}"'
+        parts.append(part)
+    parts.append(f"total;dur={total_seconds * 1000:.1f}")
+    return ", ".join(parts)
@@ -0,0 +1,329 @@
+"""Residential development proforma, vectorized over scenarios.
+
+``calculate`` is the model behind ``/api/residential-proforma/calculate``.
+Every input may be a scalar or an array; inputs broadcast together, so one
+call evaluates a whole grid of scenarios.  Breakeven is closed-form: all
+construction interest is drawn by the end of development, and each sales
+month then adds the same net revenue, so the first month with
+non-negative cumulative cash is ``development_months + ceil(deficit /
+net_monthly)`` when that falls inside the sales period (0 otherwise).
+
+``sweep`` evaluates every combination of input ranges and returns the
+metric grids plus sensitivity tables and tornado-chart data.
+"""
+
+import logging
+from typing import Dict, List, Optional, Sequence, Union
+
+import numpy as np
+
+from config import config
+
+logger = logging.getLogger(__name__)
+
+# Inputs and their defaults, as read by the calculate endpoint
+INPUT_DEFAULTS = {
+    "acres": 10.0,
+    "lot_count": 50,
+    "lot_price": 75_000.0,
+    "land_cost_per_acre": 50_000.0,
+    "earthwork": 0.0,
+    "erosion_control": 0.0,
+    "storm_drainage": 0.0,
+    "sanitary_sewer": 0.0,
+    "water": 0.0,
+    "paving_concrete": 0.0,
+    "striping_signage": 0.0,
+    "fencing_misc": 0.0,
+    "engineering": 0.0,
+    "permits": 0.0,
+    "legal": 0.0,
+    "marketing": 0.0,
+    "sales_commission_pct": 5.0,
+    "construction_loan_rate": 7.5,
+    "development_months": 12,
+    "sales_months": 18,
+    "lots_per_month": 3.0,
+}
+
+# Inputs truncated to whole numbers, as int() does in the endpoint
+INTEGER_INPUTS = ("lot_count", "development_months", "sales_months")
+
+HARD_COST_INPUTS = (
+    "earthwork", "erosion_control", "storm_drainage", "sanitary_sewer",
+    "water", "paving_concrete", "striping_signage", "fencing_misc",
+)
+SOFT_COST_INPUTS = ("engineering", "permits", "legal", "marketing")
+
+# Default sweep / tornado variables ("timeline" = development + sales months)
+SWEEP_INPUTS = ("lot_price", "lot_count", "construction_loan_rate", "lots_per_month",
+                "development_months", "sales_months")
+
+METRICS = (
+    "land_cost", "hard_costs", "soft_costs", "construction_interest", "total_cost",
+    "gross_revenue", "sales_commissions", "net_revenue", "gross_profit", "profit_margin",
+    "cost_per_lot", "profit_per_lot", "roi", "months_to_breakeven", "total_months",
+)
+# Metrics where the smallest value is the best scenario (0 breakeven = never)
+LOWER_IS_BETTER = frozenset({
+    "land_cost", "hard_costs", "soft_costs", "construction_interest", "total_cost",
+    "sales_commissions", "cost_per_lot", "months_to_breakeven", "total_months",
+})
+
+ArrayLike = Union[float, int, np.ndarray, Sequence[float]]
+
+
+def _inputs(params: Dict) -> Dict[str, np.ndarray]:
+    """Fill defaults, convert to float arrays and truncate the integer inputs."""
+    unknown = set(params) - set(INPUT_DEFAULTS)
+    if unknown:
+        raise ValueError(f"Unknown proforma inputs: {', '.join(sorted(unknown))}")
+    out = {}
+    for name, default in INPUT_DEFAULTS.items():
+        value = params.get(name)
+        arr = np.asarray(default if value is None else value, dtype=np.float64)
+        out[name] = np.trunc(arr) if name in INTEGER_INPUTS else arr
+    return out
+
+
+def calculate(**params: ArrayLike) -> Dict[str, np.ndarray]:
+    """Evaluate the proforma for every scenario in the broadcast inputs.
+
+    Args:
+        **params: Any of :data:`INPUT_DEFAULTS`; scalars or arrays.
+
+    Returns:
+        Dict of :data:`METRICS`, each an array of the broadcast shape.
+
+    Raises:
+        ValueError: On unknown input names or non-broadcastable shapes.
+    """
+    p = _inputs(params)
+    lot_count, lot_price = p["lot_count"], p["lot_price"]
+    dev_months, sales_months = p["development_months"], p["sales_months"]
+    commission = p["sales_commission_pct"] / 100.0
+
+    land_cost = p["acres"] * p["land_cost_per_acre"]
+    hard_costs = sum(p[name] for name in HARD_COST_INPUTS)
+    soft_costs = sum(p[name] for name in SOFT_COST_INPUTS)
+    development_cost = land_cost + hard_costs + soft_costs
+
+    # Interest on the average (half) loan balance over the development period
+    interest = development_cost / 2 * (p["construction_loan_rate"] / 100.0) * (dev_months / 12.0)
+    total_cost = development_cost + interest
+
+    gross_revenue = lot_count * lot_price
+    sales_commissions = gross_revenue * commission
+    net_revenue = gross_revenue - sales_commissions
+    gross_profit = net_revenue - total_cost
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        profit_margin = np.where(net_revenue > 0, gross_profit / net_revenue * 100, 0.0)
+        cost_per_lot = np.where(lot_count > 0, total_cost / lot_count, 0.0)
+        profit_per_lot = np.where(lot_count > 0, gross_profit / lot_count, 0.0)
+        roi = np.where(total_cost > 0, gross_profit / total_cost * 100, 0.0)
+
+        # Closed-form breakeven: first sales month k with k * net_monthly >= deficit
+        deficit = development_cost + np.where(dev_months > 0, interest, 0.0)
+        net_monthly = p["lots_per_month"] * lot_price * (1 - commission)
+        k = np.maximum(1.0, np.ceil(deficit / net_monthly - 1e-9))
+        reached = (net_monthly > 0) & (k <= sales_months)
+        breakeven = np.where(reached, dev_months + k, 0.0)
+
+    shape = np.broadcast(*p.values()).shape
+    result = {
+        "land_cost": land_cost,
+        "hard_costs": hard_costs,
+        "soft_costs": soft_costs,
+        "construction_interest": interest,
+        "total_cost": total_cost,
+        "gross_revenue": gross_revenue,
+        "sales_commissions": sales_commissions,
+        "net_revenue": net_revenue,
+        "gross_profit": gross_profit,
+        "profit_margin": profit_margin,
+        "cost_per_lot": cost_per_lot,
+        "profit_per_lot": profit_per_lot,
+        "roi": roi,
+        "months_to_breakeven": breakeven.astype(np.int64),
+        "total_months": (dev_months + sales_months).astype(np.int64),
+    }
+    return {name: np.broadcast_to(value, shape) for name, value in result.items()}
+
+
+# ---------------------------------------------------------------------------
+# Sweeps
+# ---------------------------------------------------------------------------
+
+def axis_values(spec) -> np.ndarray:
+    """Sweep axis from a list of values or ``{"start", "stop", "steps"}``."""
+    if isinstance(spec, dict):
+        steps = int(spec.get("steps", 5))
+        if steps < 1:
+            raise ValueError("steps must be at least 1")
+        values = np.linspace(float(spec["start"]), float(spec["stop"]), steps)
+    else:
+        values = np.atleast_1d(np.asarray(spec, dtype=np.float64))
+    if values.ndim != 1 or values.size == 0:
+        raise ValueError("sweep axes must be non-empty 1-D ranges")
+    return values
+
+
+def _json(values: np.ndarray, digits: int = 2) -> List:
+    return np.round(values, digits).tolist()
+
+
+def sweep(
+    base: Optional[Dict] = None,
+    axes: Optional[Dict] = None,
+    metrics: Sequence[str] = ("gross_profit", "profit_margin", "roi", "months_to_breakeven"),
+    tornado: Optional[Dict] = None,
+    tornado_pct: float = 10.0,
+    table: Optional[Sequence[str]] = None,
+    max_scenarios: Optional[int] = None,
+) -> Dict:
+    """Evaluate every combination of *axes* around the *base* inputs.
+
+    Args:
+        base: Fixed inputs (defaults from :data:`INPUT_DEFAULTS`).
+        axes: Input name -> list of values or ``{"start", "stop", "steps"}``.
+            ``"timeline"`` scales development and sales months together
+            (values are multipliers of the base months).
+        metrics: Metrics returned on the full grid.  The first one picks the
+            ``best`` scenario: highest value, or lowest for
+            :data:`LOWER_IS_BETTER` metrics.
+        tornado: Input name -> ``[low, high]``.  By default every swept axis
+            uses its own range and, with no axes, the :data:`SWEEP_INPUTS`
+            use ``base * (1 -/+ tornado_pct / 100)``.
+        tornado_pct: Default swing for tornado inputs without a range.
+        table: Two swept axes for the 2-D sensitivity table (default: the
+            first two).
+        max_scenarios: Grid size limit (``PROFORMA_SWEEP_MAX_SCENARIOS``).
+
+    Returns:
+        JSON-ready dict with ``axes``, ``shape``, ``grid`` (metric ->
+        nested lists), ``summary``, ``best``, ``sensitivity`` and ``tornado``.
+
+    Raises:
+        ValueError: For unknown inputs or metrics, or a grid over the limit.
+    """
+    base = {k: v for k, v in (base or {}).items() if v is not None}
+    axes = axes or {}
+    max_scenarios = max_scenarios or config.PROFORMA_SWEEP_MAX_SCENARIOS
+    unknown = [m for m in metrics if m not in METRICS]
+    if unknown:
+        raise ValueError(f"Unknown metrics: {', '.join(unknown)}")
+    base_inputs = {k: float(v) for k, v in _inputs(base).items()}
+
+    names = list(axes)
+    values = [axis_values(axes[name]) for name in names]
+    shape = tuple(v.size for v in values)
+    total = int(np.prod(shape)) if shape else 1
+    if total > max_scenarios:
+        raise ValueError(f"Sweep has {total} scenarios; the limit is {max_scenarios}")
+
+    def grid_inputs(overrides: Dict[str, np.ndarray]) -> Dict[str, np.ndarray]:
+        params = dict(base_inputs)
+        for name, value in overrides.items():
+            if name == "timeline":
+                params["development_months"] = base_inputs["development_months"] * value
+                params["sales_months"] = base_inputs["sales_months"] * value
+            else:
+                params[name] = value
+        return params
+
+    # Full grid: axis i varies along dimension i
+    overrides = {}
+    for i, (name, vals) in enumerate(zip(names, values)):
+        view = [1] * len(shape)
+        view[i] = vals.size
+        overrides[name] = vals.reshape(view)
+    results = calculate(**grid_inputs(overrides))
+
+    primary = metrics[0] if metrics else "gross_profit"
+    best = _best_index(primary, results[primary])
+    best_idx = np.unravel_index(best, shape) if shape else ()
+    out = {
+        "scenarios": total,
+        "axes": {name: _json(vals, 4) for name, vals in zip(names, values)},
+        "shape": list(shape),
+        "grid": {m: _json(results[m]) for m in metrics},
+        "summary": {
+            m: {
+                "min": round(float(results[m].min()), 2),
+                "max": round(float(results[m].max()), 2),
+                "mean": round(float(results[m].mean()), 2),
+            }
+            for m in metrics
+        },
+        "best": {
+            "metric": primary,
+            "direction": "min" if primary in LOWER_IS_BETTER else "max",
+            "inputs": {name: float(vals[j]) for name, vals, j in zip(names, values, best_idx)},
+            "value": round(float(results[primary].reshape(-1)[best]), 2),
+        },
+        "base": {m: round(float(v), 2) for m, v in calculate(**base_inputs).items()},
+    }
+
+    # 1-D sensitivity per axis and a 2-D table, other inputs at base
+    sensitivity = {
+        name: {m: _json(calculate(**grid_inputs({name: vals}))[m]) for m in metrics}
+        for name, vals in zip(names, values)
+    }
+    pair = list(table or names[:2])
+    if len(pair) == 2 and all(n in axes for n in pair):
+        a, b = (values[names.index(n)] for n in pair)
+        two_d = calculate(**grid_inputs({pair[0]: a[:, None], pair[1]: b[None, :]}))
+        sensitivity["table"] = {"rows": pair[0], "columns": pair[1], "values": _json(two_d[primary])}
+    out["sensitivity"] = sensitivity
+    out["tornado"] = _tornado(base_inputs, grid_inputs, names, values, tornado, tornado_pct, primary)
+    return out
+
+
+def _best_index(metric: str, values: np.ndarray) -> int:
+    """Flat index of the best scenario for *metric* (see :data:`LOWER_IS_BETTER`)."""
+    values = np.asarray(values, dtype=np.float64).reshape(-1)
+    if metric not in LOWER_IS_BETTER:
+        return int(np.argmax(values))
+    if metric == "months_to_breakeven":
+        values = np.where(values > 0, values, np.inf)
+    return int(np.argmin(values))
+
+
+def _tornado(base_inputs, grid_inputs, names, values, ranges, pct, metric) -> List[Dict]:
+    """Low/high metric per input with the rest at base, largest swing first."""
+    if ranges:
+        lows_highs = {name: (float(lo), float(hi)) for name, (lo, hi) in ranges.items()}
+    elif names:
+        lows_highs = {name: (float(v.min()), float(v.max())) for name, v in zip(names, values)}
+    else:
+        lows_highs = {
+            name: (base_inputs[name] * (1 - pct / 100.0), base_inputs[name] * (1 + pct / 100.0))
+            for name in SWEEP_INPUTS
+        }
+
+    base_value = float(calculate(**base_inputs)[metric])
+    order = list(lows_highs)
+    n = len(order)
+    # One pass: rows 2i / 2i+1 move input i to its low / high value
+    overrides: Dict[str, np.ndarray] = {}
+    for i, name in enumerate(order):
+        base_val = 1.0 if name == "timeline" else base_inputs[name]
+        column = np.full(2 * n, base_val)
+        column[2 * i], column[2 * i + 1] = lows_highs[name]
+        overrides[name] = column
+    swings = calculate(**grid_inputs(overrides))[metric]
+
+    bars = []
+    for i, name in enumerate(order):
+        low, high = float(swings[2 * i]), float(swings[2 * i + 1])
+        bars.append({
+            "input": name,
+            "low_input": lows_highs[name][0],
+            "high_input": lows_highs[name][1],
+            "low": round(low, 2),
+            "high": round(high, 2),
+            "swing": round(abs(high - low), 2),
+        })
+    bars.sort(key=lambda bar: bar["swing"], reverse=True)
+    return [{"metric": metric, "base": round(base_value, 2), **bar} for bar in bars]
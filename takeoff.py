@@ -0,0 +1,368 @@
+"""Quantity takeoff: site parameters -> ``Qty`` for every estimate line item.
+
+This is the server-side version of the "Calculate Full Estimate" rules of
+thumb in ``static/unified.html`` (``autoEstimate``), so that
+``/api/analyze`` can return a priced estimate and many scenarios can be
+priced at once.  Where the analysis knows better than the rule of thumb it
+takes over: road length and lot count come from a lot layout when one is
+given, and mass earthwork / haul come from the terrain cut-fill volumes.
+
+Every numeric input may be a scalar or an array; inputs are broadcast
+together and each item quantity is an array with one entry per scenario.
+"""
+
+import copy
+import inspect
+import logging
+from typing import Dict, List, Optional, Union
+
+import numpy as np
+
+from config import config
+from unit_prices import DEFAULT_SECTIONS
+
+logger = logging.getLogger(__name__)
+
+ArrayLike = Union[float, int, bool, np.ndarray, List]
+
+SQFT_PER_ACRE = 43_560.0
+
+# Share of gross site area, as LAND_ALLOC in the estimate pages
+LAND_ALLOC = {"roads": 0.18, "open_space": 0.10, "stormwater": 0.05, "buffers": 0.03}
+NET_DEVELOPABLE_PCT = 1.0 - sum(LAND_ALLOC.values())
+
+# Rules of thumb, calibrated in the estimate pages against Pennington Ridge
+RULES = {
+    "road_lf_per_lot": 110.0,
+    "pave_width_ft": 24.0,
+    "paving_efficiency": 0.82,
+    "curb_coverage": 0.72,
+    "topsoil_in": 6.0,
+    "disturbed_pct": 0.85,
+    "cut_fill_cy_per_lot": 350.0,
+    "intersection_spacing_lf": 1200.0,
+    "storm_pipe_pct_of_road": 0.50,
+    "inlet_spacing_lf": 300.0,
+    "storm_mh_spacing_lf": 400.0,
+    "sewer_mh_spacing_lf": 350.0,
+    "pond_excavation_cy_per_ac": 2000.0,
+    "pond_grading_sy_per_ac": 1500.0,
+    "sidewalk_width_ft": 4.0,
+    "mobilization_pct": 0.04,
+    "bonds_pct": 0.02,
+}
+
+# Fraction of storm pipe by size (15", 18", 24") for the typical pipe size
+PIPE_SPLITS = {15: (0.70, 0.25), 18: (0.45, 0.45), 24: (0.20, 0.40)}
+
+# Items priced as a percentage of the direct cost rather than by quantity
+PERCENT_ITEMS = {"FM-3": "mobilization_pct", "FM-4": "bonds_pct"}
+
+
+def _round(values: np.ndarray) -> np.ndarray:
+    """Round half up, as ``Math.round`` does in the estimate pages."""
+    return np.floor(np.asarray(values, dtype=np.float64) + 0.5)
+
+
+def compute_quantities(
+    acres: ArrayLike,
+    lot_size_sf: ArrayLike = 10_000,
+    lots: Optional[ArrayLike] = None,
+    road_lf: Optional[ArrayLike] = None,
+    cut_cy: Optional[ArrayLike] = None,
+    fill_cy: Optional[ArrayLike] = None,
+    public_sewer: ArrayLike = True,
+    sidewalk_sides: ArrayLike = 2,
+    curb: ArrayLike = True,
+    has_pond: ArrayLike = True,
+    avg_pipe_in: ArrayLike = 18,
+    hydrant_spacing_ft: Optional[ArrayLike] = None,
+) -> Dict[str, np.ndarray]:
+    """Quantities for every item code, vectorized over scenarios.
+
+    Args:
+        acres: Gross site area in acres.
+        lot_size_sf: Target lot size in sq ft (also used as the pad area).
+        lots: Lot count; defaults to the net-developable area / lot size.
+        road_lf: Total street centreline length; defaults to
+            ``lots * RULES["road_lf_per_lot"]``.
+        cut_cy / fill_cy: Terrain cut and fill volumes.  When neither is
+            given, mass earthwork falls back to ``cut_fill_cy_per_lot``
+            and there is no haul.
+        public_sewer: Gravity sewer to a public main (else septic, no SS items).
+        sidewalk_sides: Sidewalk on 0, 1 or 2 sides of each street.
+        curb: Curb & gutter on the streets.
+        has_pond: Detention pond required.
+        avg_pipe_in: Typical storm pipe size (15, 18 or 24 inches).
+        hydrant_spacing_ft: Hydrant spacing (``FIRE_HYDRANT_SPACING_FT``).
+
+    Returns:
+        Dict mapping item code to a float array of quantities, one per
+        scenario (shape of the broadcast inputs, at least 1-D).
+
+    Raises:
+        ValueError: If ``acres`` is missing or an input is outside its range
+            (see :data:`POSITIVE_PARAMS` and :data:`NON_NEGATIVE_PARAMS`).
+    """
+    if acres is None:
+        raise ValueError("acres is required")
+    if hydrant_spacing_ft is None:
+        hydrant_spacing_ft = config.FIRE_HYDRANT_SPACING_FT
+    _check_ranges({
+        "acres": acres, "lot_size_sf": lot_size_sf, "lots": lots, "road_lf": road_lf,
+        "cut_cy": cut_cy, "fill_cy": fill_cy, "sidewalk_sides": sidewalk_sides,
+        "hydrant_spacing_ft": hydrant_spacing_ft,
+    })
+    nan = np.nan
+    (acres, lot_size_sf, lots, road_lf, cut_cy, fill_cy, public_sewer, sidewalk_sides,
+     curb, has_pond, avg_pipe_in, hydrant_spacing_ft) = np.broadcast_arrays(*[
+        np.atleast_1d(np.asarray(nan if v is None else v, dtype=np.float64))
+        for v in (acres, lot_size_sf, lots, road_lf, cut_cy, fill_cy, public_sewer,
+                  sidewalk_sides, curb, has_pond, avg_pipe_in, hydrant_spacing_ft)
+    ])
+    r = RULES
+    sewer, curb, pond = public_sewer > 0, curb > 0, has_pond > 0
+
+    # Lots and roads
+    default_lots = np.floor(acres * NET_DEVELOPABLE_PCT * SQFT_PER_ACRE / lot_size_sf)
+    lots = np.where(np.isnan(lots), default_lots, lots)
+    road_lf = np.where(np.isnan(road_lf), lots * r["road_lf_per_lot"], road_lf)
+    road_sy = _round(road_lf * r["pave_width_ft"] / 9.0 * r["paving_efficiency"])
+    intersections = np.maximum(1, _round(road_lf / r["intersection_spacing_lf"]))
+    sidewalk_sf = road_lf * r["sidewalk_width_ft"] * sidewalk_sides
+
+    # Site areas and earthwork
+    disturbed_ac = _round(acres * r["disturbed_pct"] * 10) / 10
+    pad_sy = _round(lots * lot_size_sf / 9.0)
+    topsoil_cy = _round(disturbed_ac * SQFT_PER_ACRE * (r["topsoil_in"] / 12.0) / 27.0)
+    no_terrain = np.isnan(cut_cy) & np.isnan(fill_cy)
+    cut, fill = np.nan_to_num(cut_cy), np.nan_to_num(fill_cy)
+    mass_cy = np.where(no_terrain, _round(lots * r["cut_fill_cy_per_lot"]), np.maximum(cut, fill))
+    haul_cy = _round(np.abs(cut - fill))
+
+    # Perimeter, treating the site as a 2:1 rectangle
+    site_width = np.sqrt(acres * SQFT_PER_ACRE / 2.0)
+    perimeter_lf = _round(site_width * 3.0 * 2.0)
+
+    # Storm drainage and pond
+    storm_lf = _round(road_lf * r["storm_pipe_pct_of_road"])
+    inlets = np.maximum(4, _round(road_lf / r["inlet_spacing_lf"]))
+    storm_mh = np.maximum(2, _round(storm_lf / r["storm_mh_spacing_lf"]))
+    split15 = np.select([avg_pipe_in <= 15, avg_pipe_in <= 18], [PIPE_SPLITS[15][0], PIPE_SPLITS[18][0]], PIPE_SPLITS[24][0])
+    split18 = np.select([avg_pipe_in <= 15, avg_pipe_in <= 18], [PIPE_SPLITS[15][1], PIPE_SPLITS[18][1]], PIPE_SPLITS[24][1])
+    pond_ac = acres * LAND_ALLOC["stormwater"]
+    pond_cy = np.where(pond, _round(pond_ac * r["pond_excavation_cy_per_ac"]), 0.0)
+    pond_sy = np.where(pond, _round(pond_ac * r["pond_grading_sy_per_ac"]), 0.0)
+    pond_fence = _round(np.sqrt(pond_ac * SQFT_PER_ACRE) * 4)
+    pond_perimeter = np.where(pond, _round(np.sqrt(pond_cy * 27 / 5) * 4), 0.0)
+    matting_sy = _round((pond_perimeter + perimeter_lf * 0.15) * 3)
+
+    # Utilities
+    hydrants = np.maximum(2, _round(road_lf / hydrant_spacing_ft))
+    sewer_mh = np.maximum(2, _round(road_lf / r["sewer_mh_spacing_lf"]))
+
+    qty = {
+        "EW-1": disturbed_ac,
+        "EW-2": mass_cy,
+        "EW-3": topsoil_cy,
+        "EW-4": topsoil_cy,
+        "EW-5": road_sy + pad_sy,
+        "EW-6": road_sy,
+        "EW-7": haul_cy,
+        "EC-1": np.maximum(2, intersections),
+        "EC-2": perimeter_lf,
+        "EC-3": inlets,
+        "EC-4": matting_sy,
+        "EC-5": disturbed_ac,
+        "EC-6": disturbed_ac,
+        "SD-1": _round(storm_lf * split15),
+        "SD-2": _round(storm_lf * split18),
+        "SD-3": _round(storm_lf * (1.0 - split15 - split18)),
+        "SD-4": inlets,
+        "SD-5": storm_mh,
+        "SD-6": np.where(pond, 3.0, 1.0),
+        "SD-7": np.where(pond, 1.0, 0.0),
+        "SD-8": pond_cy,
+        "SD-9": pond_sy,
+        "SS-1": np.where(sewer, road_lf, 0.0),
+        "SS-2": np.where(sewer, sewer_mh, 0.0),
+        "SS-3": np.where(sewer, lots, 0.0),
+        "SS-4": np.where(sewer, 1.0, 0.0),
+        "W-1": road_lf,
+        "W-2": hydrants,
+        "W-3": hydrants + intersections + 1,
+        "W-4": np.ones_like(road_lf),
+        "W-5": lots,
+        "PC-1": road_sy,
+        "PC-2": road_sy,
+        "PC-3": np.where(curb, road_lf * 2 * r["curb_coverage"], 0.0),
+        "PC-4": sidewalk_sf,
+        "PC-5": np.maximum(2, intersections * 4),
+        "PC-6": lots,
+        "ST-1": road_lf,
+        "ST-2": intersections * 2,
+        "ST-3": intersections,
+        "ST-4": intersections * 2 + np.ceil(lots / 8) + 2,
+        "FM-1": np.where(pond, pond_fence, 0.0),
+        "FM-2": np.where(pond, 2.0, 0.0),
+        "FM-3": np.ones_like(road_lf),
+        "FM-4": np.ones_like(road_lf),
+    }
+    # Whole units, as setQty() does in the estimate pages
+    return {code: _round(q) for code, q in qty.items()}
+
+
+QUANTITY_PARAMS = tuple(inspect.signature(compute_quantities).parameters)
+ESTIMATE_PARAMS = QUANTITY_PARAMS + ("sections", "layout")
+
+# Inputs that, when given, must be finite and > 0 / >= 0 in every scenario
+POSITIVE_PARAMS = ("acres", "lot_size_sf", "hydrant_spacing_ft")
+NON_NEGATIVE_PARAMS = ("lots", "road_lf", "cut_cy", "fill_cy", "sidewalk_sides")
+
+
+def _check_ranges(params: Dict) -> None:
+    for name in POSITIVE_PARAMS + NON_NEGATIVE_PARAMS:
+        value = params.get(name)
+        if value is None:
+            continue
+        positive = name in POSITIVE_PARAMS
+        try:
+            values = np.asarray(value, dtype=np.float64)
+        except (TypeError, ValueError):
+            values = np.array(np.nan)
+        ok = np.isfinite(values) & (values > 0 if positive else values >= 0)
+        if not ok.all():
+            raise ValueError(f"{name} must be a {'positive' if positive else 'non-negative'} number")
+
+
+def validate_params(params: Dict) -> None:
+    """Check :func:`estimate` keyword arguments before any work is done.
+
+    Raises:
+        ValueError: For unknown keys or out-of-range values (see
+            :data:`POSITIVE_PARAMS` and :data:`NON_NEGATIVE_PARAMS`).
+    """
+    unknown = sorted(set(params) - set(ESTIMATE_PARAMS))
+    if unknown:
+        raise ValueError(f"Unknown estimate parameter(s): {', '.join(unknown)}")
+    _check_ranges(params)
+
+
+def layout_inputs(layout: Dict) -> Dict[str, float]:
+    """``compute_quantities`` keyword arguments from a lot layout summary.
+
+    Accepts the ``layout`` dict from ``LotLayoutGenerator.optimize_lot_count``
+    (or ``PackedLayout.summary()``).
+    """
+    out = {}
+    if layout.get("lot_count"):
+        out["lots"] = float(layout["lot_count"])
+    if layout.get("street_length_ft"):
+        out["road_lf"] = float(layout["street_length_ft"])
+    return out
+
+
+# ---------------------------------------------------------------------------
+# Pricing
+# ---------------------------------------------------------------------------
+
+def _price_vector(sections: Dict[str, List[Dict]]) -> tuple:
+    """Item codes and unit prices in section order, skipping percentage items."""
+    codes, prices = [], []
+    for items in sections.values():
+        for item in items:
+            if item["Item"] not in PERCENT_ITEMS:
+                codes.append(item["Item"])
+                prices.append(float(item.get("Unit Price") or 0.0))
+    return codes, np.asarray(prices)
+
+
+def scenario_costs(quantities: Dict[str, np.ndarray], sections: Optional[Dict] = None) -> Dict[str, np.ndarray]:
+    """Direct cost, percentage items and grand total for every scenario.
+
+    One matrix product over (items x scenarios); items missing from
+    *quantities* count as zero.
+    """
+    sections = sections or DEFAULT_SECTIONS
+    codes, prices = _price_vector(sections)
+    n = np.broadcast(*quantities.values()).shape if quantities else (1,)
+    zeros = np.zeros(n)
+    qty = np.stack([np.broadcast_to(quantities.get(code, zeros), n) for code in codes])
+    direct = np.tensordot(prices, qty, axes=1)
+    costs = {"direct": direct}
+    for code, rule in PERCENT_ITEMS.items():
+        costs[code] = _round(direct * RULES[rule])
+    costs["total"] = direct + sum(costs[code] for code in PERCENT_ITEMS)
+    return costs
+
+
+def priced_sections(
+    quantities: Dict[str, np.ndarray],
+    scenario: int = 0,
+    sections: Optional[Dict] = None,
+    costs: Optional[Dict[str, np.ndarray]] = None,
+) -> Dict[str, List[Dict]]:
+    """Copy of *sections* with ``Qty`` filled in from one scenario.
+
+    Mobilization (FM-3) and bonds (FM-4) get their unit price set to a
+    percentage of the direct cost, as the estimate pages do.  *costs* is
+    the :func:`scenario_costs` result when the caller already has it.
+    """
+    if costs is None:
+        costs = scenario_costs(quantities, sections)
+    sections = copy.deepcopy(sections or DEFAULT_SECTIONS)
+    for items in sections.values():
+        for item in items:
+            code = item["Item"]
+            if code in quantities:
+                item["Qty"] = float(np.atleast_1d(quantities[code])[scenario])
+            if code in PERCENT_ITEMS:
+                item["Qty"] = 1
+                item["Unit Price"] = float(costs[code][scenario])
+    return sections
+
+
+def estimate(
+    sections: Optional[Dict] = None,
+    layout: Optional[Dict] = None,
+    **params,
+) -> Dict:
+    """Single-scenario takeoff, priced sections and totals (JSON-ready).
+
+    Args:
+        sections: Unit-price sections (default ``DEFAULT_SECTIONS``).
+        layout: Optional lot layout summary (see :func:`layout_inputs`);
+            explicit ``lots`` / ``road_lf`` params take precedence.
+        **params: Keyword arguments for :func:`compute_quantities`.
+    """
+    params = {**layout_inputs(layout or {}), **{k: v for k, v in params.items() if v is not None}}
+    return summarize(compute_quantities(**params), sections)
+
+
+def summarize(quantities: Dict[str, np.ndarray], sections: Optional[Dict] = None) -> Dict:
+    """JSON-ready priced sections and totals for single-scenario *quantities*."""
+    costs = scenario_costs(quantities, sections)
+    priced = priced_sections(quantities, 0, sections, costs=costs)
+    lots = float(quantities["W-5"][0])
+    total = float(costs["total"][0])
+    return {
+        "sections": priced,
+        "direct_cost": round(float(costs["direct"][0]), 2),
+        "total_cost": round(total, 2),
+        "lots": int(lots),
+        "cost_per_lot": round(total / lots, 2) if lots else None,
+        "road_lf": float(quantities["W-1"][0]),
+    }
+
+
+def summarize_scenarios(quantities: Dict[str, np.ndarray], sections: Optional[Dict] = None) -> Dict:
+    """JSON-ready quantity and cost arrays (nested lists) for many scenarios."""
+    costs = scenario_costs(quantities, sections)
+    return {
+        "scenarios": int(costs["total"].size),
+        "shape": list(costs["total"].shape),
+        "quantities": {code: q.tolist() for code, q in quantities.items()},
+        "direct_cost": np.round(costs["direct"], 2).tolist(),
+        "total_cost": np.round(costs["total"], 2).tolist(),
+        "cost_per_lot": np.round(costs["total"] / np.maximum(quantities["W-5"], 1), 2).tolist(),
+    }
@@ -0,0 +1,79 @@
+"""Built-in GeoTIFF decoder: round trips and truncated files."""
+
+import struct
+import zlib
+
+import numpy as np
+import pytest
+
+from data_fetchers import elevation_fetcher
+from data_fetchers.elevation_fetcher import ElevationFetcher
+from data_fetchers.geotiff import decode_geotiff
+
+ELEVATION = np.arange(400, dtype=np.int16).reshape(20, 20)
+
+
+def _strip_tiff(arr: np.ndarray, compression: int = 1, predictor: int = 1, byte_count: int = None) -> bytes:
+    """Little-endian, single-strip int16 TIFF."""
+    height, width = arr.shape
+    pixels = arr.astype("<i2")
+    if predictor == 2:
+        pixels = np.diff(pixels, axis=1, prepend=0).astype("<i2")
+    payload = pixels.tobytes()
+    if compression == 8:
+        payload = zlib.compress(payload)
+
+    tags = [
+        (256, 3, width), (257, 3, height), (258, 3, 16), (259, 3, compression),
+        (273, 4, None), (277, 3, 1), (278, 3, height),
+        (279, 4, len(payload) if byte_count is None else byte_count),
+        (317, 3, predictor), (339, 3, 2),
+    ]
+    data_offset = 8 + 2 + 12 * len(tags) + 4
+    ifd = struct.pack("<H", len(tags))
+    for tag, field_type, value in tags:
+        value = data_offset if value is None else value
+        packed = struct.pack("<HH", value, 0) if field_type == 3 else struct.pack("<I", value)
+        ifd += struct.pack("<HHI", tag, field_type, 1) + packed
+    ifd += struct.pack("<I", 0)
+    return b"II*\x00" + struct.pack("<I", 8) + ifd + payload
+
+
+LAYOUTS = [(1, 1), (8, 1), (8, 2)]
+
+
+@pytest.fixture
+def minimal_parser(monkeypatch, tmp_path):
+    monkeypatch.setattr(elevation_fetcher, "HAS_RASTERIO", False)
+    monkeypatch.setattr(elevation_fetcher.config, "DEM_TEMP_DIR", str(tmp_path))
+    return ElevationFetcher()
+
+
+@pytest.mark.parametrize("compression,predictor", LAYOUTS)
+def test_round_trip(compression, predictor):
+    elevation, profile = decode_geotiff(_strip_tiff(ELEVATION, compression, predictor))
+    assert (elevation == ELEVATION).all()
+    assert (profile["width"], profile["height"]) == (20, 20)
+
+
+@pytest.mark.parametrize("compression,predictor", LAYOUTS)
+def test_truncated_file_reports_decoder_error(minimal_parser, tmp_path, compression, predictor):
+    path = tmp_path / "dem.tif"
+    path.write_bytes(_strip_tiff(ELEVATION, compression, predictor)[:-50])
+    with pytest.raises(RuntimeError, match="Invalid block 0"):
+        minimal_parser._parse_geotiff_file(str(path), 0, 0, 1, 1)
+
+
+def test_short_strip_reports_decoder_error(minimal_parser, tmp_path):
+    path = tmp_path / "dem.tif"
+    path.write_bytes(_strip_tiff(ELEVATION, byte_count=100))
+    with pytest.raises(RuntimeError, match="Insufficient pixel data"):
+        minimal_parser._parse_geotiff_file(str(path), 0, 0, 1, 1)
+
+
+def test_decoder_releases_buffer_on_error():
+    buf = bytearray(_strip_tiff(ELEVATION)[:-50])
+    with pytest.raises(RuntimeError) as excinfo:
+        decode_geotiff(buf)
+    assert excinfo.value.__traceback__ is not None
+    buf.extend(b"\x00")  # resizing fails while a view is still exported
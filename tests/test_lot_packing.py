@@ -0,0 +1,31 @@
+"""Street-spine lot packing: streets serve the packed lots and stay on site."""
+
+import shapely
+from shapely.geometry import Polygon, box
+
+from analysis.lot_packing import LotPackingOptimizer
+
+SQUARE = box(0, 0, 1000, 1000)
+U_SHAPE = Polygon([(0, 0), (1200, 0), (1200, 1000), (800, 1000), (800, 400), (400, 400), (400, 1000), (0, 1000)])
+
+
+def _pack(site):
+    optimizer = LotPackingOptimizer(site, row_width=50, setbacks=(25, 10, 25), min_lot_acres=0.25, max_lot_acres=2)
+    return optimizer, optimizer.optimize(0.5, rotations=1, time_budget_s=30)
+
+
+def test_streets_run_along_the_lots():
+    optimizer, layout = _pack(SQUARE)
+    assert layout.lot_count > 0
+    # Every lot fronts on a returned street centreline, half a ROW away
+    fronting = shapely.dwithin(layout.lots[:, None], layout.streets[None, :], optimizer.row / 2 + 1e-6)
+    assert fronting.any(axis=1).all()
+    assert fronting.any(axis=0).all()
+    assert abs(layout.street_length_ft - shapely.length(layout.streets).sum()) < 1e-6
+
+
+def test_streets_stay_on_site():
+    for site in (SQUARE, U_SHAPE):
+        _, layout = _pack(site)
+        assert layout.streets.size
+        assert shapely.covered_by(layout.streets, site.buffer(1e-6)).all()
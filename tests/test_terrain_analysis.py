@@ -0,0 +1,14 @@
+"""TerrainAnalyzer input handling."""
+
+import numpy as np
+
+from analysis.terrain_analysis import TerrainAnalyzer
+
+
+def test_nodata_does_not_mutate_memmap_input(tmp_path):
+    dem = np.lib.format.open_memmap(tmp_path / "dem.npy", mode="w+", dtype="float32", shape=(10, 10))
+    dem[:] = 5.0
+    dem[0, 0] = -9999.0
+    analyzer = TerrainAnalyzer(dem, cell_size=1.0, nodata=-9999.0, dtype="float32")
+    assert np.isnan(analyzer.elevation[0, 0])
+    assert dem[0, 0] == -9999.0